@@ -0,0 +1,58 @@
+"""Load time of the JSON and the binary LatticeJSON format (.ljb).
+
+python benchmarks/bench_load.py -n 100000
+"""
+
+import argparse
+import gc
+import os
+import tempfile
+import time
+
+from bench_serialize import synthetic_latticejson
+
+from latticejson import binary, io
+
+
+def measure(function, *args):
+    gc.collect()
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=100_000, help="Number of elements.")
+    args = parser.parse_args()
+
+    latticejson = synthetic_latticejson(args.n)
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, "lattice.json")
+        ljb_path = os.path.join(directory, "lattice.ljb")
+        save_json = measure(io.save, latticejson, json_path)
+        save_ljb = measure(io.save, latticejson, ljb_path)
+        del latticejson
+
+        results = [
+            ("json", "save", save_json),
+            ("ljb", "save", save_ljb),
+            ("json", "load", measure(io.load, json_path, None, False)),
+            ("ljb", "load", measure(io.load, ljb_path, None, False)),
+            ("json", "load + validate", measure(io.load, json_path)),
+            ("ljb", "load + validate", measure(io.load, ljb_path)),
+            ("ljb", "open (mmap)", measure(binary.open, ljb_path)),
+        ]
+        sizes = {
+            x: os.path.getsize(p) / 2**20
+            for x, p in [("json", json_path), ("ljb", ljb_path)]
+        }
+
+    print(f"{'format':<8}{'operation':<18}{'time [s]':>10}")
+    for format_, operation, duration in results:
+        print(f"{format_:<8}{operation:<18}{duration:>10.3f}")
+    print(", ".join(f"{x}: {size:.1f} MiB" for x, size in sizes.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Peak memory and wall time of the tree-building and the inline parsing mode.
+
+Each mode runs in a fresh subprocess, so that the peak resident set sizes (RSS) can be
+compared.
+
+    python benchmarks/bench_parse.py -n 100000
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+
+def synthetic_elegant(n_elements):
+    """Return an elegant lattice file with `n_elements` element definitions."""
+    lines = ["% 0.1 sto l_quad"]
+    for i in range(0, n_elements, 4):
+        lines += [
+            f'q{i}: KQUAD, L="l_quad 2 *", K1={1 + i * 1e-6}',
+            f"d{i + 1}: DRIFT, L=0.5",
+            f"b{i + 2}: CSBEND, L=1.2, ANGLE=0.01, E1=0.005, E2=0.005",
+            f"d{i + 3}: DRIFT, L=0.25",
+        ]
+    lines += [
+        f"c{j}: LINE=({', '.join(f'q{i}, d{i + 1}, b{i + 2}, d{i + 3}' for i in range(j, min(j + 100, n_elements), 4))})"
+        for j in range(0, n_elements, 100)
+    ]
+    lines.append(
+        f"ring: LINE=({', '.join(f'c{j}' for j in range(0, n_elements, 100))})"
+    )
+    return "\n".join(lines)
+
+
+def synthetic_madx(n_elements):
+    """Return a MADX lattice file with `n_elements` element definitions."""
+    lines = ["l_quad = 0.1;"]
+    for i in range(0, n_elements, 4):
+        lines += [
+            f"q{i}: QUADRUPOLE, L=2 * l_quad, K1={1 + i * 1e-6};",
+            f"d{i + 1}: DRIFT, L=0.5;",
+            f"b{i + 2}: SBEND, L=1.2, ANGLE=0.01, E1=0.005, E2=0.005;",
+            f"d{i + 3}: DRIFT, L=0.25;",
+        ]
+    lines += [
+        f"c{j}: LINE=({', '.join(f'q{i}, d{i + 1}, b{i + 2}, d{i + 3}' for i in range(j, min(j + 100, n_elements), 4))});"
+        for j in range(0, n_elements, 100)
+    ]
+    lines.append(
+        f"ring: LINE=({', '.join(f'c{j}' for j in range(0, n_elements, 100))});"
+    )
+    return "\n".join(lines)
+
+
+def measure(language, n_elements, build_tree):
+    from latticejson import parse
+
+    generate = synthetic_elegant if language == "lte" else synthetic_madx
+    parse_function = parse.parse_elegant if language == "lte" else parse.parse_madx
+    string = generate(n_elements)
+    parse_function("")  # load the parser before measuring
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    parse_function(string, build_tree=build_tree)
+    duration = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return dict(time=duration, rss=(peak - baseline) / 1024)  # ru_maxrss is in KiB
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=100_000, help="Number of elements.")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child is not None:
+        language, mode = args.child
+        print(json.dumps(measure(language, args.n, mode == "tree")))
+        return
+
+    print(f"{'format':<8}{'mode':<8}{'time [s]':>10}{'peak RSS increase [MiB]':>26}")
+    for language in "lte", "madx":
+        for mode in "tree", "inline":
+            command = [sys.executable, __file__, "-n", str(args.n), "--child"]
+            output = subprocess.run(
+                [*command, language, mode], check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output)
+            print(
+                f"{language:<8}{mode:<8}{result['time']:>10.2f}{result['rss']:>26.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Peak memory and wall time of building the output string versus streaming it.
+
+Each mode runs in a fresh subprocess, so that the peak resident set sizes (RSS) can be
+compared.
+
+    python benchmarks/bench_serialize.py -n 1000000
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def synthetic_latticejson(n_elements, n_cells=100):
+    """Return a LatticeJSON dict with `n_elements` distinct elements."""
+    elements = {
+        f"e{i}": ["Quadrupole", {"length": 0.2, "k1": 1 + i * 1e-6}]
+        for i in range(n_elements)
+    }
+    per_cell = n_elements // n_cells
+    lattices = {
+        f"c{j}": [f"e{i}" for i in range(j * per_cell, (j + 1) * per_cell)]
+        for j in range(n_cells)
+    }
+    lattices["ring"] = list(lattices)
+    return dict(
+        version="2.0", title="", root="ring", elements=elements, lattices=lattices
+    )
+
+
+def measure(output_format, n_elements, stream):
+    from latticejson import io
+
+    latticejson = synthetic_latticejson(n_elements)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f"lattice.{output_format}")
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        if stream:
+            io.save(latticejson, path, output_format)
+        else:
+            with open(path, "w") as file:
+                file.write(io.save_string(latticejson, output_format))
+        duration = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        size = os.path.getsize(path)
+    return dict(time=duration, rss=(peak - baseline) / 1024, size=size / 2**20)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=100_000, help="Number of elements.")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child is not None:
+        output_format, mode = args.child
+        print(json.dumps(measure(output_format, args.n, mode == "stream")))
+        return
+
+    print(
+        f"{'format':<8}{'mode':<8}{'time [s]':>10}{'output [MiB]':>14}"
+        f"{'peak RSS increase [MiB]':>26}"
+    )
+    for output_format in "json", "lte", "madx":
+        for mode in "string", "stream":
+            command = [sys.executable, __file__, "-n", str(args.n), "--child"]
+            output = subprocess.run(
+                [*command, output_format, mode],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            result = json.loads(output)
+            print(
+                f"{output_format:<8}{mode:<8}{result['time']:>10.2f}"
+                f"{result['size']:>14.1f}{result['rss']:>26.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Cold and warm startup time of the LatticeJSON library and CLI.
+
+Cold runs start with an empty grammar cache, warm runs with a populated one.
+
+    python benchmarks/bench_startup.py --repeat 20
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+COMMANDS = {
+    "import latticejson": ["-c", "import latticejson"],
+    "latticejson --version": [
+        "-c",
+        "from latticejson.cli import cli; cli()",
+        "--version",
+    ],
+    "first parse_elegant": [
+        "-c",
+        "from latticejson.parse import parse_elegant; parse_elegant('d: drift, l=1')",
+    ],
+}
+
+
+def run(args, cache_dir):
+    env = dict(os.environ, LATTICEJSON_CACHE_DIR=cache_dir)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], env=env, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    repeat = parser.parse_args().repeat
+
+    print(f"{'command':<24}{'cold [ms]':>12}{'warm [ms]':>12}")
+    for name, args in COMMANDS.items():
+        cold = []
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory() as cache_dir:
+                cold.append(run(args, cache_dir))
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            run(args, cache_dir)  # populate cache
+            warm = [run(args, cache_dir) for _ in range(repeat)]
+
+        cold, warm = (1e3 * statistics.median(x) for x in (cold, warm))
+        print(f"{name:<24}{cold:>12.1f}{warm:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Wall time of the lattice traversal utilities on synthetic lattices.
+
+The deep lattice nests `--depth` lattices into each other, the wide lattice contains
+`--width` elements in 1000 cells.
+
+    python benchmarks/bench_traversal.py --depth 10000 --width 1000000
+"""
+
+import argparse
+import time
+import warnings
+
+from latticejson.utils import (
+    flattened_element_sequence,
+    remove_unused,
+    sort_lattices,
+    topological_order,
+    tree,
+)
+
+
+def deep_lattice(depth):
+    """Return a LatticeJSON dict with `depth` nested lattices."""
+    lattices = {"l0": ["d"]}
+    lattices.update({f"l{i}": [f"l{i - 1}", "q"] for i in range(1, depth)})
+    return dict(
+        root=f"l{depth - 1}",
+        elements={"d": ["Drift", {"length": 1.0}], "q": ["Quadrupole", {}]},
+        lattices=lattices,
+    )
+
+
+def wide_lattice(width, n_cells=1000):
+    """Return a LatticeJSON dict with `width` elements in `n_cells` cells."""
+    per_cell = width // n_cells
+    elements = {f"e{i}": ["Drift", {"length": 0.1}] for i in range(width)}
+    lattices = {
+        f"c{j}": [f"e{i}" for i in range(j * per_cell, (j + 1) * per_cell)]
+        for j in range(n_cells)
+    }
+    lattices["ring"] = list(lattices)
+    return dict(root="ring", elements=elements, lattices=lattices)
+
+
+def measure(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--depth", type=int, default=10_000)
+    parser.add_argument("--width", type=int, default=1_000_000)
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    benchmarks = {
+        "flatten": lambda data: sum(1 for _ in flattened_element_sequence(data)),
+        "topological_order": topological_order,
+        "sort_lattices": sort_lattices,
+        "remove_unused": remove_unused,
+    }
+    print(f"{'lattice':<10}{'function':<20}{'time [s]':>10}")
+    for name, data in ("deep", deep_lattice(args.depth)), (
+        "wide",
+        wide_lattice(args.width),
+    ):
+        for function_name, function in benchmarks.items():
+            print(f"{name:<10}{function_name:<20}{measure(function, data):>10.3f}")
+    # the output of tree grows quadratically with the depth, so only the wide lattice
+    print(f"{'wide':<10}{'tree':<20}{measure(tree, wide_lattice(args.width)):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
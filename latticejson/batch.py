@@ -0,0 +1,56 @@
+"""Run many conversion, validation or format jobs within a single process.
+
+This avoids paying the import and setup costs (grammar loading, schema compilation)
+once per file when processing many lattice files.
+"""
+
+import json
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from . import io
+from .format import dump_json
+
+ACTIONS = "convert", "validate", "format"
+
+
+def read_manifest(lines: Iterable[str]) -> Iterator[dict]:
+    """Read the jobs of a manifest in the JSON lines format. Blank lines are skipped.
+
+    :param lines: Lines of the manifest, e.g. an open file.
+    :return: Iterator over the jobs.
+    """
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+
+def run_job(job: dict, cache=None) -> str:
+    """Run a single job and return a log message.
+
+    :param job dict: Job with the keys "input" (required), "output", "format", "from",
+        "validate" and "action". The action defaults to "convert" if an output is given
+        and to "validate" otherwise.
+    :param cache: Conversion cache for the input files, see `io.load_string`.
+    :raises ValueError: Is raised for unknown actions.
+    :return: Log message
+    :rtype: str
+    """
+    input_ = job["input"]
+    output = job.get("output")
+    action = job.get("action", "validate" if output is None else "convert")
+    if action == "convert":
+        latticejson = io.load(
+            input_, job.get("from"), job.get("validate", True), cache, compact=True
+        )
+        io.save(latticejson, output, job.get("format"))
+        return f"converted {input_} to {output}"
+    elif action == "validate":
+        io.load(input_, job.get("from"), cache=cache, compact=True)
+        return f"validated {input_}"
+    elif action == "format":
+        latticejson = json.loads(Path(input_).read_text())
+        with io.atomic_open(output or input_) as file:
+            dump_json(latticejson, file)
+        return f"reformatted {input_}"
+    raise ValueError(f"Unknown action '{action}', expected one of {ACTIONS}.")
@@ -0,0 +1,375 @@
+"""Compact binary LatticeJSON format (.ljb).
+
+A file consists of aligned data blocks followed by a small JSON table of contents and
+a 16 byte trailer with the offset and size of the table of contents:
+
+- All names are interned in one string table.
+- Elements are grouped by type, each attribute is a typed column (float64, int64 or
+  JSON for other values) with a mask of the elements which define it.
+- Lattices are int32 arrays of string table indices. A repetition `Repeat(count,
+  items)` is stored as the tokens -1, count, len(items), items...
+
+`open` memory-maps a file and only decodes the parts which are accessed.
+"""
+
+import builtins
+import json
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+from typing import IO, Union
+
+from .utils import Repeat, unique_children
+
+MAGIC = b"LJB\x00"
+FORMAT_VERSION = 1
+_TRAILER = struct.Struct("<QQ")
+_ALIGNMENT = 8
+_REPEAT = -1
+_SEPARATOR = "\x00"
+_MISSING = object()
+_INT64_MIN, _INT64_MAX = -(2**63), 2**63 - 1
+
+
+def dumps(latticejson: dict) -> bytes:
+    """Serialize a LatticeJSON dict to the binary format.
+
+    :param latticejson dict: A LatticeJSON-compliant dictionary.
+    :raises ValueError: Is raised if a name contains a null character.
+    """
+    writer = _Writer()
+    strings = {}
+
+    def intern(string):
+        return strings.setdefault(string, len(strings))
+
+    elements = latticejson["elements"]
+    groups = {}
+    for name, (type_, _) in elements.items():
+        groups.setdefault(type_, []).append(name)
+    grouped = {name: i for i, name in enumerate(x for y in groups.values() for x in y)}
+    element_groups = []
+    for type_, names in groups.items():
+        columns = {}
+        for row, name in enumerate(names):
+            for key, value in elements[name][1].items():
+                column = columns.get(key)
+                if column is None:
+                    column = columns[key] = len(names) * [_MISSING]
+                column[row] = value
+
+        element_groups.append(
+            dict(
+                type=type_,
+                names=writer.add(array("i", map(intern, names))),
+                columns=[writer.add_column(k, v) for k, v in columns.items()],
+            )
+        )
+
+    lattices = latticejson["lattices"]
+    tokens = array("i")
+    offsets = array("q", [0])
+    for children in lattices.values():
+        _encode_children(children, tokens, intern)
+        offsets.append(len(tokens))
+
+    lattice_names = array("i", map(intern, lattices))
+    if any(_SEPARATOR in string for string in strings):
+        raise ValueError("Names must not contain null characters.")
+
+    header = {k: v for k, v in latticejson.items() if k not in {"elements", "lattices"}}
+    contents = dict(
+        keys=list(latticejson),
+        header=header,
+        strings=writer.add(_SEPARATOR.join(strings).encode()),
+        element_groups=element_groups,
+        element_order=writer.add(array("i", map(grouped.__getitem__, elements))),
+        lattice_names=writer.add(lattice_names),
+        lattice_offsets=writer.add(offsets),
+        lattice_tokens=writer.add(tokens),
+    )
+    return writer.finish(contents)
+
+
+def dump(latticejson: dict, file: IO[bytes]):
+    """Serialize a LatticeJSON dict to the binary file object `file`."""
+    file.write(dumps(latticejson))
+
+
+def loads(data: Union[bytes, bytearray, memoryview]) -> dict:
+    """Deserialize a binary LatticeJSON file to a LatticeJSON dict.
+
+    :raises ValueError: Is raised if `data` is not a binary LatticeJSON file.
+    """
+    lattice = BinaryLattice(data)
+    return {key: lattice[key] for key in lattice}
+
+
+def load(path) -> dict:
+    """Deserialize the binary LatticeJSON file at `path` to a LatticeJSON dict."""
+    with builtins.open(path, "rb") as file:
+        return loads(file.read())
+
+
+def open(path) -> "BinaryLattice":
+    """Memory-map the binary LatticeJSON file at `path`.
+
+    Nothing but the table of contents is read until the elements or lattices are
+    accessed. The file stays mapped as long as the returned object is alive.
+    """
+    with builtins.open(path, "rb") as file:
+        return BinaryLattice(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+class BinaryLattice(Mapping):
+    """Read-only LatticeJSON dict backed by binary data, decoded on first access.
+
+    :param data: Content of a binary LatticeJSON file, e.g. a memory map.
+    :raises ValueError: Is raised if `data` is not a binary LatticeJSON file.
+    """
+
+    def __init__(self, data):
+        self._data = memoryview(data)
+        if bytes(self._data[: len(MAGIC)]) != MAGIC:
+            raise ValueError("Not a binary LatticeJSON file.")
+
+        (version,) = struct.unpack_from("<I", self._data, len(MAGIC))
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Unsupported binary LatticeJSON version {version}.")
+
+        offset, size = _TRAILER.unpack_from(self._data, len(self._data) - _TRAILER.size)
+        self._contents = json.loads(bytes(self._data[offset : offset + size]))
+        self._keys = self._contents["keys"]
+        self._decoded = {}
+
+    def __getitem__(self, key):
+        if key in self._contents["header"]:
+            return self._contents["header"][key]
+
+        value = self._decoded.get(key)
+        if value is None:
+            if key == "elements":
+                value = self._decode_elements()
+            elif key == "lattices":
+                value = self._decode_lattices()
+            else:
+                raise KeyError(key)
+            self._decoded[key] = value
+        return value
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    @property
+    def strings(self):
+        """The string table."""
+        strings = self._decoded.get("strings")
+        if strings is None:
+            data = self._bytes(self._contents["strings"])
+            strings = data.decode().split(_SEPARATOR) if data else [""]
+            self._decoded["strings"] = strings
+        return strings
+
+    def validate(self):
+        """Validate the lattice without decoding all elements.
+
+        The attribute columns of an element type have a single type each, so the
+        schema is checked for a few representative elements per type: one with all
+        attributes set to their minimum, one with the maximum and one with only the
+        attributes every element of the type defines.
+        """
+        from .validate import (
+            validate_defined_objects,
+            validate_syntax,
+            validate_version,
+        )
+
+        header = self._contents["header"]
+        validate_version(header)
+        element_names = set()
+        representatives = {}
+        for group in self._contents["element_groups"]:
+            element_names.update(
+                self.strings[i] for i in self._array(group["names"], "i")
+            )
+            low, high, common = {}, {}, {}
+            json_values = []
+            for key, kind, mask_block, data_block in group["columns"]:
+                mask = self._bytes(mask_block)
+                if kind == "j":
+                    values = json.loads(self._bytes(data_block))
+                    json_values += ((key, value) for value in values)
+                    values = values[:1]
+                else:
+                    values = self._array(data_block, kind)
+                    if mask.count(0) > 0:
+                        values = [value for value, m in zip(values, mask) if m]
+                    values = min(values), max(values)
+                low[key], high[key] = values[0], values[-1]
+                if mask.count(0) == 0:
+                    common[key] = low[key]
+
+            type_ = group["type"]
+            examples = [low, high, common, *({**common, k: v} for k, v in json_values)]
+            for i, attributes in enumerate(examples):
+                representatives[f"{type_}:{i}"] = [type_, attributes]
+
+        lattices = self._unique_children()
+        validate_syntax({**header, "elements": representatives, "lattices": lattices})
+        validate_defined_objects(dict(elements=element_names, lattices=lattices))
+
+    def _unique_children(self):
+        strings = self.strings
+        names = [strings[i] for i in self._array(self._contents["lattice_names"], "i")]
+        offsets = self._array(self._contents["lattice_offsets"], "q")
+        tokens = self._array(self._contents["lattice_tokens"], "i")
+        lattices = {}
+        for name, start, end in zip(names, offsets, offsets[1:]):
+            part = tokens[start:end]
+            if _REPEAT in part:
+                children = _decode_children(iter(part), end - start, strings)
+                lattices[name] = list(dict.fromkeys(unique_children(children)))
+            else:
+                lattices[name] = [strings[i] for i in dict.fromkeys(part)]
+        return lattices
+
+    def _bytes(self, block):
+        offset, size = block
+        return bytes(self._data[offset : offset + size])
+
+    def _array(self, block, typecode):
+        values = array(typecode)
+        values.frombytes(self._data[block[0] : block[0] + block[1]])
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
+    def _decode_elements(self):
+        strings = self.strings
+        names = []
+        values = []
+        for group in self._contents["element_groups"]:
+            type_ = group["type"]
+            group_names = [strings[i] for i in self._array(group["names"], "i")]
+            n_rows = len(group_names)
+            keys, complete, partial = [], [], []
+            for key, kind, mask_block, data_block in group["columns"]:
+                if kind == "j":
+                    column = json.loads(self._bytes(data_block))
+                else:
+                    column = self._array(data_block, kind).tolist()
+                mask = self._bytes(mask_block)
+                if mask.count(0) == 0:
+                    keys.append(key)
+                    complete.append(column)
+                else:
+                    partial.append((key, kind, mask, column))
+
+            # fill the dicts column by column: building them from row tuples would
+            # allocate several short-lived containers per element, and each
+            # allocation counts towards the next run of the garbage collector
+            attributes = [dict.fromkeys(keys) for _ in range(n_rows)]
+            for key, column in zip(keys, complete):
+                for row_attributes, value in zip(attributes, column):
+                    row_attributes[key] = value
+            for key, kind, mask, column in partial:
+                present = (row for row in range(n_rows) if mask[row])
+                if kind == "j":  # the JSON column only contains present values
+                    column = iter(column)
+                    for row in present:
+                        attributes[row][key] = next(column)
+                else:
+                    for row in present:
+                        attributes[row][key] = column[row]
+
+            names += group_names
+            values += [[type_, row_attributes] for row_attributes in attributes]
+
+        order = self._array(self._contents["element_order"], "i")
+        return dict(zip(map(names.__getitem__, order), map(values.__getitem__, order)))
+
+    def _decode_lattices(self):
+        strings = self.strings
+        names = [strings[i] for i in self._array(self._contents["lattice_names"], "i")]
+        offsets = self._array(self._contents["lattice_offsets"], "q")
+        tokens = self._array(self._contents["lattice_tokens"], "i")
+        lattices = {}
+        for name, start, end in zip(names, offsets, offsets[1:]):
+            part = tokens[start:end]
+            if _REPEAT in part:
+                lattices[name] = _decode_children(iter(part), end - start, strings)
+            else:
+                lattices[name] = [strings[i] for i in part]
+        return lattices
+
+
+class _Writer:
+    def __init__(self):
+        self.buffer = bytearray(MAGIC + struct.pack("<I", FORMAT_VERSION))
+
+    def add(self, data):
+        """Append an aligned block and return its (offset, size)."""
+        if isinstance(data, array):
+            if sys.byteorder == "big":
+                data = array(data.typecode, data)
+                data.byteswap()
+            data = data.tobytes()
+        self.buffer += bytes(-len(self.buffer) % _ALIGNMENT)
+        offset = len(self.buffer)
+        self.buffer += data
+        return offset, len(data)
+
+    def add_column(self, key, column):
+        present = [value is not _MISSING for value in column]
+        values = [value for value in column if value is not _MISSING]
+        if any(
+            type(value) is int and not _INT64_MIN <= value <= _INT64_MAX
+            for value in values
+        ):
+            kind = "j"  # JSON keeps integers of arbitrary size exactly
+        elif all(type(value) is int for value in values):
+            kind = "q"
+        elif all(type(value) in {int, float} for value in values):
+            kind = "d"
+        else:
+            kind = "j"
+
+        if kind == "j":
+            data = json.dumps(values).encode()
+        else:
+            data = array(kind, (0 if value is _MISSING else value for value in column))
+        return key, kind, self.add(bytes(present)), self.add(data)
+
+    def finish(self, contents):
+        offset, size = self.add(json.dumps(contents).encode())
+        self.buffer += _TRAILER.pack(offset, size)
+        return bytes(self.buffer)
+
+
+def _encode_children(children, tokens, intern):
+    for child in children:
+        if isinstance(child, Repeat):
+            tokens.extend((_REPEAT, child.count, len(child.items)))
+            _encode_children(child.items, tokens, intern)
+        else:
+            tokens.append(intern(child))
+
+
+def _decode_children(tokens, n_tokens, strings):
+    # inverse of _encode_children, `n_tokens` is the number of items to decode
+    children = []
+    for _ in range(n_tokens):
+        token = next(tokens, None)
+        if token is None:
+            break
+        if token == _REPEAT:
+            count, n_items = next(tokens), next(tokens)
+            children.append(Repeat(count, _decode_children(tokens, n_items, strings)))
+        else:
+            children.append(strings[token])
+    return children
@@ -0,0 +1,269 @@
+"""Content-addressed on-disk cache for converted lattice files."""
+
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Union
+
+from .__about__ import __version__
+
+BASE_DIR = Path(__file__).resolve().parent
+CACHE_DIR = Path(
+    os.environ.get("LATTICEJSON_CACHE_DIR")
+    or Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "latticejson"
+)
+DEFAULT_MAX_SIZE = 256 * 2**20  # bytes
+EVICT_TO = 0.9  # fraction of the maximum size which is kept by an eviction
+SUFFIX = ".pickle"
+
+
+class ConversionCache:
+    """Stores the results of `io.load_string` on disk.
+
+    The entries are keyed by the hash of the source text, the input format, the
+    library version and the hashes of `map.json` and `schema.json`, so they never have
+    to be invalidated manually. The least recently used entries are evicted once the
+    total size of the cache exceeds `max_size`, until it is below `EVICT_TO` of it.
+    The total size is tracked by the instance, so that writes only scan the cache
+    directory when it may be exceeded.
+
+    :param directory: Cache directory, defaults to `CACHE_DIR / "conversions"`.
+    :type directory: Union[str, Path], optional
+    :param max_size int: Maximum size of the cache in bytes.
+    """
+
+    def __init__(self, directory: Union[str, Path] = None, max_size=DEFAULT_MAX_SIZE):
+        self.directory = Path(directory or CACHE_DIR / "conversions")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._size = None  # estimated total size, None until the directory is scanned
+
+    def key(
+        self,
+        string: Union[str, bytes],
+        input_format: str,
+        validate: bool,
+        compact: bool = False,
+    ) -> str:
+        """Return the cache key of a lattice file."""
+        if isinstance(string, str):
+            string = string.encode()
+        header = f"{_salt()}:{input_format}:{validate:d}:{compact:d}:".encode()
+        return hashlib.sha256(header + string).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached LatticeJSON dict for `key` or None on a cache miss."""
+        path = self.directory / f"{key}{SUFFIX}"
+        try:
+            with path.open("rb") as file:
+                latticejson = pickle.load(file)
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:  # unpickling a corrupt entry can raise almost anything
+            self.misses += 1
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            return None
+
+        self.hits += 1
+        return latticejson
+
+    def set(self, key: str, latticejson: dict):
+        """Store a LatticeJSON dict and evict old entries if the cache is full."""
+        from .io import atomic_open
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with atomic_open(self.directory / f"{key}{SUFFIX}", "wb") as file:
+            pickle.dump(latticejson, file, protocol=pickle.HIGHEST_PROTOCOL)
+            size = file.tell()
+        # overwritten entries and other processes make this an estimate, which is
+        # corrected by the scan of the next eviction
+        if self._size is not None:
+            self._size += size
+        if self._size is None or self._size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries if the cache exceeds `max_size`."""
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_mtime)
+        size = sum(stat.st_size for _, stat in entries)
+        if size > self.max_size:
+            for path, stat in entries:
+                if size <= EVICT_TO * self.max_size:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:  # removed by another process
+                    pass
+                size -= stat.st_size
+        self._size = size
+
+    def clear(self):
+        """Remove all entries of the cache."""
+        for path, _ in self._entries():
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        self._size = 0
+
+    def stats(self) -> dict:
+        """Return the hit/miss statistics of this instance and the size of the cache."""
+        entries = list(self._entries())
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            entries=len(entries),
+            size=sum(stat.st_size for _, stat in entries),
+            max_size=self.max_size,
+            directory=str(self.directory),
+        )
+
+    def _entries(self):
+        try:
+            paths = list(self.directory.glob(f"*{SUFFIX}"))
+        except FileNotFoundError:
+            return
+
+        for path in paths:
+            try:
+                yield path, path.stat()
+            except FileNotFoundError:
+                pass
+
+
+class MemoryCache:
+    """Stores the results of `io.load_string` in memory, e.g. within a server.
+
+    Has the same interface as `ConversionCache` and is safe to use from several
+    threads. The cached dicts are shared between all callers and must not be modified.
+
+    :param max_entries int: Maximum number of entries, the least recently used entries
+        are evicted first.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(
+        self,
+        string: Union[str, bytes],
+        input_format: str,
+        validate: bool,
+        compact: bool = False,
+    ) -> str:
+        """Return the cache key of a lattice file."""
+        if isinstance(string, str):
+            string = string.encode()
+        header = f"{input_format}:{validate:d}:{compact:d}:".encode()
+        return hashlib.sha256(header + string).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached LatticeJSON dict for `key` or None on a cache miss."""
+        with self._lock:
+            latticejson = self._entries.get(key)
+            if latticejson is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return latticejson
+
+    def set(self, key: str, latticejson: dict):
+        """Store a LatticeJSON dict and evict old entries if the cache is full."""
+        with self._lock:
+            self._entries[key] = latticejson
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove all entries of the cache."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return the hit/miss statistics and the number of entries."""
+        with self._lock:
+            return dict(
+                hits=self.hits,
+                misses=self.misses,
+                entries=len(self._entries),
+                max_entries=self.max_entries,
+            )
+
+
+class IdentityCache:
+    """Memoizes results per object identity, e.g. per LatticeJSON dict.
+
+    Each entry holds a reference to its object, so that the id cannot be reused by
+    another object while the entry exists. The entries become stale when the object
+    is modified in place. The least recently used entries are evicted first. Safe to
+    use from several threads.
+
+    :param max_entries int: Maximum number of entries.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, obj, key, compute):
+        """Return the result for `obj` and `key`, call `compute()` on a cache miss."""
+        cache_key = id(obj), key
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[0] is obj:
+                self._entries.move_to_end(cache_key)
+                return entry[1]
+
+        result = compute()
+        with self._lock:
+            self._entries[cache_key] = obj, result
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        """Remove all entries of the cache."""
+        with self._lock:
+            self._entries.clear()
+
+
+_default_cache = None
+
+
+def default_cache() -> ConversionCache:
+    """Return the shared cache instance used by `io.load(..., cache=True)`."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ConversionCache()
+    return _default_cache
+
+
+_salt_value = None
+
+
+def _salt():
+    global _salt_value
+    if _salt_value is None:
+        hash_ = hashlib.sha256(__version__.encode())
+        for name in "map.json", "schema.json":
+            hash_.update((BASE_DIR / name).read_bytes())
+        _salt_value = hash_.hexdigest()
+    return _salt_value
@@ -1,28 +1,51 @@
 import itertools
 import json
+import os
 import sys
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
 
 import click
 
-from . import __version__, io, parse
+from . import __version__
 from .format import format_json
 from .migrate import MAX_VERSION
-from .migrate import migrate as _migrate
-from .validate import parse_version, schema, validate_file
+from .validate import schema
 
-FORMATS = "json", "lte", "madx"
+# Heavy modules (io, parse, ...) are imported within the commands which need them,
+# so that each command only pays for what it uses.
+
+FORMATS = "json", "lte", "madx", "ljb"
 
 
 @click.group(context_settings=dict(max_content_width=120))
 @click.version_option(
     message=(f"LatticeJSON CLI, version {__version__}\n{schema['title']}")
 )
-def cli():
-    pass
+@click.option(
+    "--no-server",
+    is_flag=True,
+    envvar="LATTICEJSON_NO_SERVER",
+    help="Run all jobs in this process, even if a server is running, see 'serve'.",
+)
+@click.pass_context
+def cli(ctx, no_server):
+    ctx.meta["latticejson.no_server"] = no_server
+
+
+JOBS_OPTION = click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=0),
+    default=1,
+    show_default=True,
+    help="Number of parallel processes. Use 0 for one process per CPU.",
+)
 
 
 @cli.command()
+@click.argument("files", nargs=-1, type=click.Path(exists=True))
 @click.option(
     "--file",
     type=click.File("r"),
@@ -32,9 +55,8 @@ def cli():
 @click.option(
     "--from",
     "from_",
-    required=True,
     type=click.Choice(FORMATS, case_sensitive=False),
-    help="Source format",
+    help="Source format [default: use file extension, required for stdin]",
 )
 @click.option(
     "--to",
@@ -42,20 +64,160 @@ def cli():
     type=click.Choice(FORMATS, case_sensitive=False),
     help="Destination format",
 )
+@click.option(
+    "--output-dir",
+    "-o",
+    type=click.Path(file_okay=False),
+    help="Write converted FILES to this directory instead of stdout.",
+)
 @click.option(
     "--validate/--no-validate", default=True, help="Whether to validate the input file."
 )
-def convert(file, from_, to, validate):
-    """Convert stdin or FILE to another lattice file format."""
-    with file:
-        data = file.read()
-    click.echo(io.save_string(io.load_string(data, from_, validate), to))
+@click.option(
+    "--cache/--no-cache", default=False, help="Whether to use the conversion cache."
+)
+@click.option(
+    "--watch",
+    is_flag=True,
+    help="Keep converting FILES whenever they change, requires '--output-dir'.",
+)
+@JOBS_OPTION
+def convert(files, file, from_, to, output_dir, validate, cache, watch, jobs):
+    """Convert stdin or FILES to another lattice file format.
+
+    FILES may contain directories, which are searched recursively for lattice files.
+    With '--watch', elegant and MADX files are parsed incrementally, so that only
+    the edited statements are parsed again.
+    """
+    if not files:
+        from . import io
+
+        if from_ is None:
+            raise click.UsageError("Option '--from' is required when reading stdin.")
+
+        with file:
+            data = file.buffer.read() if from_ == "ljb" else file.read()
+        latticejson = io.load_string(data, from_, validate, cache, compact=True)
+        if to == "ljb":
+            io.dump(latticejson, click.get_binary_stream("stdout"), to)
+            return
+
+        io.dump(latticejson, click.get_text_stream("stdout"), to)
+        click.echo()
+        return
+
+    suffixes = [from_] if from_ is not None else [x for x in FORMATS if x != to]
+    tasks = []
+    inputs = {}  # input of each output, to detect outputs which overwrite each other
+    for root in map(Path, files):
+        if root.is_dir():
+            paths = sorted(p for x in suffixes for p in root.rglob(f"*.{x}"))
+            relative = [path.relative_to(root) for path in paths]
+        else:
+            paths, relative = [root], [Path(root.name)]
+
+        for path, relative_path in zip(paths, relative):
+            if output_dir is None:
+                output = None
+            else:
+                output = Path(output_dir, relative_path).with_suffix(f".{to}")
+                other = inputs.setdefault(output, path)
+                if other != path:
+                    raise click.UsageError(
+                        f"'{other}' and '{path}' would both be converted to '{output}'."
+                    )
+            tasks.append((path, output, from_, to, validate, cache))
+
+    if output_dir is None and (len(tasks) != 1 or Path(files[0]).is_dir()):
+        raise click.UsageError("Option '--output-dir' is required for multiple files.")
+
+    if watch:
+        if output_dir is None:
+            raise click.UsageError("Option '--output-dir' is required for '--watch'.")
+        _watch(tasks)
+        return
+
+    if output_dir is not None and jobs == 1 and not cache:
+        with _connect() as client:
+            if client is not None:
+                _convert_remote(client, tasks)
+                return
+
+    for message in _parallel_map(_convert_file, tasks, jobs):
+        if output_dir is None:
+            click.echo(message, nl=not isinstance(message, bytes))
+        else:
+            click.secho(message, bold=True)
+
+
+def _watch(tasks):
+    from . import io
+    from .incremental import IncrementalParser, watch_files
+
+    tasks = {task[0]: task for task in tasks}
+    parsers = {}
+    click.secho("Watching for changes, press Ctrl+C to stop.", bold=True)
+    try:
+        for paths in watch_files(tasks):
+            for path in paths:
+                path, output, from_, to, validate, _ = tasks[path]
+                input_format = from_ or path.suffix[1:]
+                try:
+                    if input_format in {"lte", "madx"}:
+                        parser = parsers.get(path)
+                        if parser is None:
+                            parser = parsers[path] = IncrementalParser(input_format)
+                        latticejson = parser.load(path.read_text(), validate, True)
+                    else:
+                        latticejson = io.load(path, from_, validate, compact=True)
+                    output.parent.mkdir(parents=True, exist_ok=True)
+                    io.save(latticejson, output, to)
+                except Exception as error:
+                    click.secho(f"failed {path}: {error}", fg="red", err=True)
+                else:
+                    click.secho(f"converted {path} to {output}", bold=True)
+    except KeyboardInterrupt:
+        pass
+
+
+def _convert_file(task):
+    from . import io
+
+    path, output, from_, to, validate, cache = task
+    latticejson = io.load(path, from_, validate, cache, compact=True)
+    if output is None:
+        return io.save_string(latticejson, to)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    io.save(latticejson, output, to)
+    return f"converted {path} to {output}"
+
+
+def _convert_remote(client, tasks):
+    jobs = []
+    for path, output, from_, to, validate, _ in tasks:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        job = dict(input=str(path), output=str(output), format=to, validate=validate)
+        jobs.append({"action": "convert", "from": from_, **job})
+    n_failed = _run_jobs(jobs, client, bold=True)
+    if n_failed > 0:
+        raise click.ClickException(f"{n_failed} file(s) failed.")
 
 
 @cli.command()
 @click.argument("file", type=click.Path(exists=True))
 def validate(file):
     """Validate a LatticeJSON lattice file."""
+    with _connect() as client:
+        if client is not None:
+            job = {"action": "validate", "input": file, "from": "json"}
+            response = client.request(job)
+            if not response["ok"]:
+                raise click.ClickException(response["error"])
+            return
+
+    from .validate import validate_file
+
     validate_file(file)
 
 
@@ -67,18 +229,22 @@ def validate(file):
     is_flag=True,
     help="Don't write the files back, just output the formatted files.",
 )
-def autoformat(files, dry_run):
+@JOBS_OPTION
+def autoformat(files, dry_run, jobs):
     """Format a LatticeJSON file."""
-    for path in itertools.chain.from_iterable(
-        path.rglob("*.json") if path.is_dir() else (path,) for path in map(Path, files)
-    ):
-        latticejson = json.loads(path.read_text())
-        formatted = format_json(latticejson)
+    paths = _json_files(files)
+    formatter = partial(_autoformat_file, dry_run=dry_run)
+    for path, formatted in zip(paths, _parallel_map(formatter, paths, jobs)):
         click.secho(f"reformatted {path}", bold=True)
         if dry_run:
             click.echo(formatted)
-        else:
-            path.write_text(formatted)
+
+
+def _autoformat_file(path, dry_run):
+    data = json.loads(path.read_text())
+    if dry_run:
+        return format_json(data)
+    _write_json(path, data)
 
 
 @cli.command()
@@ -92,20 +258,293 @@ def autoformat(files, dry_run):
     is_flag=True,
     help="Don't write the files back, just output the formatted files.",
 )
-def migrate(files, final, dry_run):
+@JOBS_OPTION
+def migrate(files, final, dry_run, jobs):
     """Migrate old LatticeJSON files to newer versions."""
-    for path in itertools.chain.from_iterable(
-        path.rglob("*.json") if path.is_dir() else (path,) for path in map(Path, files)
-    ):
-        data = json.loads(path.read_text())
-        initial = parse_version(data["version"]).major
-        latticejson = _migrate(data, initial, final)
-        formatted = format_json(latticejson)
+    paths = _json_files(files)
+    migrator = partial(_migrate_file, final=final, dry_run=dry_run)
+    for path, (initial, formatted) in zip(paths, _parallel_map(migrator, paths, jobs)):
         click.secho(f"Migrated {path} from version {initial} to {final}", bold=True)
         if dry_run:
             click.echo(formatted)
+
+
+def _migrate_file(path, final, dry_run):
+    from .migrate import migrate as _migrate
+    from .validate import parse_version
+
+    data = json.loads(path.read_text())
+    initial = parse_version(data["version"]).major
+    data = _migrate(data, initial, final)
+    if dry_run:
+        return initial, format_json(data)
+    _write_json(path, data)
+    return initial, None
+
+
+def _json_files(files):
+    return list(
+        itertools.chain.from_iterable(
+            sorted(path.rglob("*.json")) if path.is_dir() else (path,)
+            for path in map(Path, files)
+        )
+    )
+
+
+def _write_json(path, data):
+    from .format import dump_json
+    from .io import atomic_open
+
+    with atomic_open(path) as file:
+        dump_json(data, file)
+
+
+def _parallel_map(function, items, jobs):
+    """Like `map`, but distributes the calls over `jobs` processes.
+
+    The results are yielded in the order of `items`. The worker processes are only
+    started if more than one job and more than one item is given.
+    """
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+
+    if jobs == 1 or len(items) < 2:
+        yield from map(function, items)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    jobs = min(jobs, len(items))
+    chunksize = max(1, len(items) // (4 * jobs))
+    with ProcessPoolExecutor(jobs) as executor:
+        yield from executor.map(function, items, chunksize=chunksize)
+
+
+@cli.command()
+@click.argument("manifest", type=click.File("r"), default="-")
+def batch(manifest):
+    """Run all jobs listed in MANIFEST (defaults to stdin) in a single process.
+
+    Each line of the manifest is a JSON object with the keys "input", "output",
+    "format" (output format), "from" (input format), "validate" and "action", where
+    action is one of "convert", "validate" or "format". Only "input" is required: jobs
+    with an "output" default to "convert", all others to "validate".
+    """
+    from .batch import read_manifest
+
+    with manifest, _connect() as client:
+        n_failed = _run_jobs(read_manifest(manifest), client)
+
+    if n_failed > 0:
+        raise click.ClickException(f"{n_failed} job(s) failed.")
+
+
+def _run_jobs(jobs, client=None, **style):
+    """Run batch jobs, on the server if `client` is given, and log the results.
+
+    :return: Number of failed jobs.
+    """
+    if client is None:
+        results = map(_run_local_job, jobs)
+    else:
+        results = (
+            (job, response.get("message"), response.get("error"))
+            for job, response in client.map(jobs)
+        )
+
+    n_failed = 0
+    for job, message, error in results:
+        if error is None:
+            click.secho(message, **style)
         else:
-            path.write_text(formatted)
+            n_failed += 1
+            click.secho(f"failed {job.get('input')}: {error}", fg="red", err=True)
+    return n_failed
+
+
+def _run_local_job(job):
+    from .batch import run_job
+
+    try:
+        return job, run_job(job), None
+    except Exception as error:
+        return job, None, error
+
+
+@cli.command()
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False),
+    help="Path of the socket [default: $LATTICEJSON_SOCKET or in the cache directory]",
+)
+@click.option(
+    "--workers",
+    "-w",
+    type=click.IntRange(min=1),
+    help="Number of worker threads [default: number of CPUs]",
+)
+@click.option("--stop", is_flag=True, help="Stop the server listening on the socket.")
+def serve(socket_path, workers, stop):
+    """Run a server which keeps parsers, validator and converted files in memory.
+
+    While the server runs, 'convert' (with '--output-dir'), 'validate' and 'batch'
+    forward their jobs to it, which saves the startup costs of each invocation. They
+    run locally if the server has another version of latticejson, with '--no-server'
+    (or $LATTICEJSON_NO_SERVER set) and, for 'convert', with '--jobs' or '--cache'. Other
+    clients can connect to the Unix domain socket and send one JSON object per line,
+    like the lines of a 'batch' manifest. The action "load" returns the LatticeJSON
+    dict. Each job is answered by one JSON object per line.
+    """
+    from .server import Server, connect
+
+    if stop:
+        client = connect(socket_path)
+        if client is None:
+            raise click.ClickException("No server is running.")
+        with client:
+            client.request(dict(action="stop"))
+        return
+
+    try:
+        server = Server(socket_path, workers)
+    except RuntimeError as error:
+        raise click.ClickException(str(error))
+
+    click.secho(f"Listening on {server.path}, press Ctrl+C to stop.", bold=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+@contextmanager
+def _connect():
+    """Yield a client of the running server, see 'serve', or None.
+
+    None is yielded with '--no-server' or if the server has another version.
+    """
+    from .server import connect
+
+    if click.get_current_context().meta.get("latticejson.no_server"):
+        yield None
+        return
+
+    client = connect()
+    if client is not None:
+        message = client.request({"action": "ping"}).get("message")
+        if message != f"latticejson {__version__}":
+            message = message or "an unknown version"
+            client.close()
+            client = None
+            click.secho(
+                f"Not using the server, it runs {message} instead of {__version__}.",
+                fg="yellow",
+                err=True,
+            )
+    try:
+        yield client
+    finally:
+        if client is not None:
+            client.close()
+
+
+@cli.command()
+@click.argument("base", type=click.Path(exists=True))
+@click.argument("overrides", type=click.File("r"))
+@click.option(
+    "--to",
+    type=click.Choice(("lte", "madx"), case_sensitive=False),
+    default="lte",
+    show_default=True,
+    help="Format of the variants",
+)
+@click.option(
+    "--output-dir",
+    "-o",
+    required=True,
+    type=click.Path(file_okay=False),
+    help="Directory to write the variants to.",
+)
+@click.option(
+    "--validate/--no-validate", default=True, help="Whether to validate the base file."
+)
+@JOBS_OPTION
+def scan(base, overrides, to, output_dir, validate, jobs):
+    """Write one variant of BASE per row of the OVERRIDES CSV table.
+
+    The header of OVERRIDES has one "element.attribute" column per overridden
+    attribute and an optional "name" column with the file names of the variants.
+    """
+    from . import io
+    from .scan import read_csv, write_variants
+
+    latticejson = io.load(base, validate=validate, compact=True)
+    try:
+        with overrides:
+            columns, rows, names = read_csv(overrides)
+        paths = write_variants(latticejson, columns, rows, output_dir, to, names, jobs)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    click.secho(f"wrote {len(paths)} variant(s) to {output_dir}", bold=True)
+
+
+@cli.command()
+@click.argument("file_a", type=click.Path(exists=True))
+@click.argument("file_b", type=click.Path(exists=True))
+@click.option(
+    "--json", "as_json", is_flag=True, help="Print the differences as JSON object."
+)
+@click.option(
+    "--validate/--no-validate", default=True, help="Whether to validate the files."
+)
+def diff(file_a, file_b, as_json, validate):
+    """Print the structural differences between FILE_A and FILE_B.
+
+    The files may have any supported format. Exits with status 1 if they differ.
+    """
+    from . import io
+    from .diff import diff
+
+    differences = diff(
+        io.load(file_a, validate=validate, compact=True),
+        io.load(file_b, validate=validate, compact=True),
+    )
+    if as_json:
+        click.echo(json.dumps(differences.to_dict(), indent=2))
+    elif differences:
+        click.echo(differences.format())
+    if differences:
+        sys.exit(1)
+
+
+@cli.group()
+def cache():
+    """Inspect or clear the conversion cache."""
+    pass
+
+
+@cache.command()
+def info():
+    """Print location, number of entries and size of the conversion cache."""
+    from .cache import ConversionCache
+
+    stats = ConversionCache().stats()
+    click.echo(f"directory: {stats['directory']}")
+    click.echo(f"entries:   {stats['entries']}")
+    click.echo(f"size:      {stats['size'] / 2 ** 20:.1f} MiB")
+    click.echo(f"max size:  {stats['max_size'] / 2 ** 20:.1f} MiB")
+
+
+@cache.command()
+def clear():
+    """Remove all entries from the conversion cache."""
+    from .cache import ConversionCache
+
+    conversion_cache = ConversionCache()
+    n_entries = conversion_cache.stats()["entries"]
+    conversion_cache.clear()
+    click.echo(f"Removed {n_entries} entries from {conversion_cache.directory}.")
 
 
 @cli.group()
@@ -125,6 +564,7 @@ def utils():
 )
 def tree(file, lattice, format_):
     """Print tree of elements for a given LatticeJSON file."""
+    from . import io
     from .utils import tree
 
     data = io.load(file, format_, validate)
@@ -140,6 +580,7 @@ def tree(file, lattice, format_):
 )
 def remove_unused(file, lattice, warn_unused, validate):
     """Remove unused objects from a LatticeJSON file."""
+    from . import io
     from .utils import remove_unused
 
     data = remove_unused(io.load(file, validate=validate), lattice, warn_unused)
@@ -157,6 +598,8 @@ def debug():
 @click.option("--transform", "-t", is_flag=True, help="Print transformed tree.")
 def parse_elegant(file, transform):
     """Print parse tree of elegant lattice file."""
+    from . import parse
+
     text = Path(file).read_text()
     if transform:
         click.echo(format_json(parse.parse_elegant(text)))
@@ -169,6 +612,8 @@ def parse_elegant(file, transform):
 @click.option("--transform", "-t", is_flag=True, help="Print transformed tree.")
 def parse_madx(file, transform):
     """Print parse tree of madx lattice file."""
+    from . import parse
+
     text = Path(file).read_text()
     if transform:
         click.echo(format_json(parse.parse_madx(text)))
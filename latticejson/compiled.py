@@ -0,0 +1,159 @@
+"""Flattened lattice backed by NumPy arrays.
+
+NumPy is an optional dependency: `pip install latticejson[numpy]`.
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .cache import IdentityCache
+from .utils import Repeat, topological_order
+from .validate import schema
+
+ELEMENT_TYPES: Tuple[str, ...] = tuple(
+    name for name in schema["definitions"] if name not in {"Lattice", "Element"}
+)
+TYPE_CODES: Dict[str, int] = {name: code for code, name in enumerate(ELEMENT_TYPES)}
+UNKNOWN_TYPE = -1
+CACHE_SIZE = 8
+_CACHE = IdentityCache(CACHE_SIZE)
+
+
+class CompiledLattice:
+    """Flattened lattice as arrays.
+
+    :param names: Element names, `indices` point into this list.
+    :type names: List[str]
+    :param indices: Element indices (int32) in beam order.
+    :param type_codes: Type code (int8) of each element, see `ELEMENT_TYPES`.
+    :param columns: Attribute values (float64) of each element, NaN if missing.
+    :type columns: Dict[str, numpy.ndarray]
+    """
+
+    def __init__(self, names: List[str], indices, type_codes, columns):
+        self.names = names
+        self.indices = indices
+        self.type_codes = type_codes
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __repr__(self):
+        return f"<{type(self).__name__}: {len(self)} elements, length {self.length}>"
+
+    def column(self, attribute: str, fill_value: float = np.nan) -> np.ndarray:
+        """Return the values of `attribute` for every element in beam order.
+
+        :param str attribute: LatticeJSON attribute name
+        :param float fill_value: Value used for missing attributes.
+        """
+        column = self.columns.get(attribute)
+        if column is None:
+            return np.full(len(self), fill_value)
+
+        values = column[self.indices]
+        if not np.isnan(fill_value):
+            values[np.isnan(values)] = fill_value
+        return values
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """Lengths of the elements in beam order."""
+        return self.column("length", 0.0)
+
+    @property
+    def positions(self) -> np.ndarray:
+        """Start positions of the elements followed by the end of the lattice."""
+        positions = np.zeros(len(self) + 1)
+        np.cumsum(self.lengths, out=positions[1:])
+        return positions
+
+    @property
+    def length(self) -> float:
+        """Total length of the lattice."""
+        return float(self.lengths.sum())
+
+    @property
+    def types(self) -> np.ndarray:
+        """Type codes of the elements in beam order."""
+        return self.type_codes[self.indices]
+
+    def mask(self, element_type: str) -> np.ndarray:
+        """Return a boolean mask of the elements of type `element_type`."""
+        return self.types == TYPE_CODES.get(element_type, UNKNOWN_TYPE)
+
+    def element_names(self) -> List[str]:
+        """Return the element names in beam order."""
+        return [self.names[i] for i in self.indices.tolist()]
+
+
+def compile_lattice(latticejson: dict, root: str = None, cache=True) -> CompiledLattice:
+    """Flatten the lattice `root` into arrays.
+
+    Each sub-lattice is only flattened once, no matter how often it is used. The
+    result is cached per LatticeJSON dict and root. Pass `cache=False` or call
+    `clear_cache` when the dict was modified in place.
+
+    :param dict latticejson: LatticeJSON dict
+    :param str root: Name of the lattice to flatten, defaults to the root lattice.
+    :param bool cache: Whether to use the cache.
+    """
+    if root is None:
+        root = latticejson["root"]
+
+    if not cache:
+        return _compile(latticejson, root)
+    return _CACHE.get(latticejson, root, lambda: _compile(latticejson, root))
+
+
+def clear_cache():
+    """Remove all compiled lattices from the cache."""
+    _CACHE.clear()
+
+
+def _compile(latticejson, root):
+    elements = latticejson["elements"]
+    lattices = latticejson["lattices"]
+    names = list(elements)
+    element_index = {name: index for index, name in enumerate(names)}
+    type_codes = np.array(
+        [TYPE_CODES.get(type_, UNKNOWN_TYPE) for type_, _ in elements.values()],
+        dtype=np.int8,
+    )
+
+    columns = {}
+    for index, (_, attributes) in enumerate(elements.values()):
+        for key, value in attributes.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                column = columns.get(key)
+                if column is None:
+                    column = columns[key] = np.full(len(names), np.nan)
+                column[index] = value
+
+    flattened = {}  # memoized index arrays of the sub-lattices
+    for name in topological_order(latticejson, root):
+        flattened[name] = _index_array(lattices[name], element_index, flattened)
+
+    return CompiledLattice(names, flattened[root], type_codes, columns)
+
+
+def _index_array(children, element_index, flattened):
+    parts, run = [], []
+    for child in children:
+        if not isinstance(child, Repeat) and child not in flattened:
+            run.append(element_index[child])
+            continue
+
+        if run:
+            parts.append(np.array(run, dtype=np.int32))
+            run = []
+        if isinstance(child, Repeat):
+            items = _index_array(child.items, element_index, flattened)
+            parts.append(np.tile(items, child.count))
+        else:
+            parts.append(flattened[child])
+    if run:
+        parts.append(np.array(run, dtype=np.int32))
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
@@ -1,11 +1,12 @@
 import json
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterator, List
 from warnings import warn
 
 from .exceptions import UnknownAttributeWarning, UnknownElementTypeWarning
+from .format import LIST_CHUNK_SIZE
 from .parse import parse_elegant, parse_madx
-from .utils import sort_lattices
+from .utils import expand_repetitions, format_children, sort_lattices
 from .validate import schema_version
 
 NAME_MAP = json.loads((Path(__file__).parent / "map.json").read_text())["map"]
@@ -15,7 +16,7 @@ TO_MADX = {x: y[1][0] for x, *y in NAME_MAP}
 FROM_MADX = {y: x for x, *tup in NAME_MAP for y in tup[1]}
 
 
-def from_elegant(string):
+def from_elegant(string, compact=False):
     """Convert an elegant lattice file to a LatticeJSON dict.
 
     :param str string: input lattice file as string
@@ -23,12 +24,14 @@ def from_elegant(string):
     :type str, optional
     :param description: description of the lattice
     :type str, optional
+    :param bool compact: Keep repetitions like `500*(cell)` as `utils.Repeat` items
+        instead of expanding them. Such dicts are not JSON serializable.
     :return: dict in LatticeJSON format
     """
-    return _map_names(parse_elegant(string), FROM_ELEGANT)
+    return _map_names(parse_elegant(string), FROM_ELEGANT, compact)
 
 
-def from_madx(string):
+def from_madx(string, compact=False):
     """Convert a MADX lattice file to a LatticeJSON dict.
 
     :param str string: input lattice file as string
@@ -36,12 +39,13 @@ def from_madx(string):
     :type str, optional
     :param description: description of the lattice
     :type str, optional
+    :param bool compact: Keep repetitions as `utils.Repeat` items, see `from_elegant`.
     :return: dict in LatticeJSON format
     """
-    return _map_names(parse_madx(string), FROM_MADX)
+    return _map_names(parse_madx(string), FROM_MADX, compact)
 
 
-def _map_names(lattice_data: dict, name_map: dict):
+def _map_names(lattice_data: dict, name_map: dict, compact=False):
     elements = {}
     for name, (other_type, other_attributes) in lattice_data["elements"].items():
         latticejson_type = name_map.get(other_type)
@@ -62,13 +66,14 @@ def _map_names(lattice_data: dict, name_map: dict):
     lattices = lattice_data["lattices"]
     root = lattice_data.get("root", tuple(lattices.keys())[-1])
     title = lattice_data.get("title", "")
-    return dict(
+    latticejson = dict(
         version=str(schema_version),
         title=title,
         root=root,
         elements=elements,
         lattices=lattices,
     )
+    return latticejson if compact else expand_repetitions(latticejson)
 
 
 def to_elegant(latticejson: dict) -> str:
@@ -77,23 +82,27 @@ def to_elegant(latticejson: dict) -> str:
     :param lattice_dict dict: dict in LatticeJSON format
     :return: string with in elegant lattice file format
     """
+    return "".join(iter_elegant(latticejson))
+
+
+def iter_elegant(latticejson: dict) -> Iterator[str]:
+    """Yield the elegant lattice file of a LatticeJSON dict in chunks.
+
+    :param lattice_dict dict: dict in LatticeJSON format
+    """
     elements = latticejson["elements"]
-    lattices = latticejson["lattices"]
 
-    strings = [f"! TITLE: {latticejson['title']}"]
-    element_template = "{}: {}, {}".format
+    yield f"! TITLE: {latticejson['title']}\n"
     # TODO: check if equivalent type exists in elegant
     for name, (type_, attributes) in elements.items():
-        attrs = ", ".join(f"{TO_ELEGANT[k]}={v}" for k, v in attributes.items())
-        elegant_type = TO_ELEGANT[type_]
-        strings.append(element_template(name, elegant_type, attrs))
+        yield _elegant_element(name, type_, attributes)
 
-    lattice_template = "{}: line=({})".format
     for name, children in sort_lattices(latticejson).items():
-        strings.append(lattice_template(name, ", ".join(children)))
+        yield f"{name}: line=("
+        yield from _iter_arrangement(children)
+        yield ")\n"
 
-    strings.append(f"USE, {latticejson['root']}\n")
-    return "\n".join(strings)
+    yield f"USE, {latticejson['root']}\n"
 
 
 def to_madx(latticejson: dict) -> str:
@@ -102,20 +111,40 @@ def to_madx(latticejson: dict) -> str:
     :param lattice_dict dict: dict in LatticeJSON format
     :return: string with in elegant lattice file format
     """
+    return "".join(iter_madx(latticejson))
+
+
+def iter_madx(latticejson: dict) -> Iterator[str]:
+    """Yield the MADX lattice file of a LatticeJSON dict in chunks.
+
+    :param lattice_dict dict: dict in LatticeJSON format
+    """
     elements = latticejson["elements"]
-    lattices = latticejson["lattices"]
 
-    strings = [f"TITLE, \"{latticejson['title']}\";"]
-    element_template = "{}: {}, {};".format
+    yield f"TITLE, \"{latticejson['title']}\";\n"
     # TODO: check if equivalent type exists in madx
     for name, (type_, attributes) in elements.items():
-        attrs = ", ".join(f"{TO_MADX[k]}={v}" for k, v in attributes.items())
-        elegant_type = TO_MADX[type_]
-        strings.append(element_template(name, elegant_type, attrs))
+        yield _madx_element(name, type_, attributes)
 
-    lattice_template = "{}: line=({});".format
     for name, children in sort_lattices(latticejson).items():
-        strings.append(lattice_template(name, ", ".join(children)))
+        yield f"{name}: line=("
+        yield from _iter_arrangement(children)
+        yield ");\n"
+
+    yield f"USE, SEQUENCE={latticejson['root']};\n"
+
+
+def _elegant_element(name, type_, attributes):
+    attrs = ", ".join(f"{TO_ELEGANT[k]}={v}" for k, v in attributes.items())
+    return f"{name}: {TO_ELEGANT[type_]}, {attrs}\n"
+
+
+def _madx_element(name, type_, attributes):
+    attrs = ", ".join(f"{TO_MADX[k]}={v}" for k, v in attributes.items())
+    return f"{name}: {TO_MADX[type_]}, {attrs};\n"
+
 
-    strings.append(f"USE, SEQUENCE={latticejson['root']};\n")
-    return "\n".join(strings)
+def _iter_arrangement(children):
+    for start in range(0, len(children), LIST_CHUNK_SIZE):
+        separator = ", " if start > 0 else ""
+        yield separator + format_children(children[start : start + LIST_CHUNK_SIZE])
@@ -0,0 +1,339 @@
+"""Dependency graph of the expressions which define variables and element attributes.
+
+MADX deferred expressions (`:=`) and expressions of elegant lattice files (quoted RPN
+strings and `sto` variables) are kept as compiled expressions instead of being reduced
+to plain numbers. Changing a variable then re-evaluates only the variables and element
+attributes which depend on it, without parsing the lattice file again.
+"""
+
+import math
+import operator
+from collections import defaultdict
+from typing import Dict, Tuple
+
+from lark import Transformer, v_args
+
+from .convert import FROM_ELEGANT, FROM_MADX, _map_names
+from .exceptions import UndefinedVariableError
+from .expression import (
+    ARRAY,
+    BINARY,
+    CONST,
+    FUNCTION_ALIASES,
+    LOAD,
+    UNARY,
+    Expression,
+    compile_rpn,
+)
+from .parse import ElegantTransformer, InlineParser, MADXTransformer
+
+_EVALUATION_ERRORS = ArithmeticError, TypeError, ValueError, UndefinedVariableError
+
+
+class ExpressionGraph:
+    """Dependency graph between variables and element attributes.
+
+    :param dict latticejson: LatticeJSON dict, which is updated in place.
+    :param dict variables: Values of all variables by lowercase name.
+    :param variable_expressions: Expressions of the deferred variables.
+    :type variable_expressions: Dict[str, Expression]
+    :param attribute_expressions: Expressions by (element name, attribute name).
+    :type attribute_expressions: Dict[Tuple[str, str], Expression]
+    :raises ValueError: Is raised for cyclic dependencies.
+    """
+
+    def __init__(
+        self,
+        latticejson: dict,
+        variables: dict,
+        variable_expressions: Dict[str, Expression],
+        attribute_expressions: Dict[Tuple[str, str], Expression],
+    ):
+        self.latticejson = latticejson
+        self.variables = variables
+        # nodes are variable names or (element, attribute) tuples
+        self.expressions = {**variable_expressions, **attribute_expressions}
+        self.dependents = defaultdict(list)
+        for node, expression in self.expressions.items():
+            for name in expression.names:
+                self.dependents[name].append(node)
+        self.order = self._topological_order()
+        self._evaluate(sorted(self.expressions, key=self.order.__getitem__))
+
+    def update(self, knobs: Dict[str, float] = None, **kwargs) -> dict:
+        """Set variables and re-evaluate everything which depends on them.
+
+        A variable which is set explicitly loses its own deferred expression.
+
+        :param knobs: New values by variable name. Can also be passed as kwargs.
+        :return: New values of the changed attributes by (element, attribute).
+        """
+        knobs = {
+            name.lower(): value for name, value in {**(knobs or {}), **kwargs}.items()
+        }
+        for name, value in knobs.items():
+            self.variables[name] = value
+            self.expressions.pop(name, None)
+        return self._evaluate(self.affected(knobs))
+
+    def affected(self, names) -> list:
+        """Return the nodes depending on the variables `names` in evaluation order."""
+        affected = set()
+        stack = list(names)
+        while stack:
+            for node in self.dependents.get(stack.pop(), ()):
+                if node not in affected and node in self.expressions:
+                    affected.add(node)
+                    if isinstance(node, str):
+                        stack.append(node)
+        return sorted(affected, key=self.order.__getitem__)
+
+    def _evaluate(self, nodes):
+        elements = self.latticejson["elements"]
+        changed = {}
+        for node in nodes:
+            value = self.expressions[node].evaluate(self.variables)
+            if isinstance(node, str):
+                self.variables[node] = value
+            else:
+                element, attribute = node
+                elements[element][1][attribute] = changed[node] = value
+        return changed
+
+    def _topological_order(self):
+        n_dependencies = {
+            node: sum(name in self.expressions for name in expression.names)
+            for node, expression in self.expressions.items()
+        }
+        ready = [node for node, n in n_dependencies.items() if n == 0]
+        order = {}
+        while ready:
+            node = ready.pop()
+            order[node] = len(order)
+            for dependent in (
+                self.dependents.get(node, ()) if isinstance(node, str) else ()
+            ):
+                n_dependencies[dependent] -= 1
+                if n_dependencies[dependent] == 0:
+                    ready.append(dependent)
+
+        if len(order) < len(self.expressions):
+            cycle = sorted(str(node) for node in self.expressions if node not in order)
+            raise ValueError(f"Cyclic dependency between {', '.join(cycle)}.")
+        return order
+
+
+def from_elegant(string: str, compact=False) -> ExpressionGraph:
+    """Convert an elegant lattice file to a LatticeJSON dict with expression graph.
+
+    :param str string: input lattice file as string
+    :param bool compact: Keep repetitions as `utils.Repeat` items.
+    :return: Expression graph, the LatticeJSON dict is its `latticejson` attribute.
+    """
+    return _build_graph(_ELEGANT_PARSER.parse(string + "\n"), FROM_ELEGANT, compact)
+
+
+def from_madx(string: str, compact=False) -> ExpressionGraph:
+    """Convert a MADX lattice file to a LatticeJSON dict with expression graph.
+
+    :param str string: input lattice file as string
+    :param bool compact: Keep repetitions as `utils.Repeat` items.
+    :return: Expression graph, the LatticeJSON dict is its `latticejson` attribute.
+    """
+    return _build_graph(_MADX_PARSER.parse(string), FROM_MADX, compact)
+
+
+def _build_graph(result, name_map, compact):
+    latticejson = _map_names(result, name_map, compact)
+    attribute_expressions = {}
+    for element, expressions in result["attribute_expressions"].items():
+        if result["elements"][element][0] not in name_map:  # replaced with Drift
+            continue
+
+        for key, expression in expressions.items():
+            latticejson_key = name_map.get(key)
+            if latticejson_key is not None:
+                attribute_expressions[element, latticejson_key] = expression
+
+    return ExpressionGraph(
+        latticejson,
+        result["variables"],
+        result["variable_expressions"],
+        attribute_expressions,
+    )
+
+
+@v_args(inline=True)
+class _DeferredTransformer(Transformer):
+    """Mixin for the lattice file transformers, which compiles arithmetic expressions
+    into instructions instead of evaluating them and records the expressions."""
+
+    def reset(self):
+        super().reset()
+        self.variable_expressions = {}
+        self.attribute_expressions = {}
+
+    def result(self):
+        return dict(
+            super().result(),
+            variable_expressions=self.variable_expressions,
+            attribute_expressions=self.attribute_expressions,
+        )
+
+    def number(self, token):
+        return [(CONST, float(token))]
+
+    def variable(self, name):
+        return [(LOAD, str(name))]
+
+    def identity(self, code):
+        return code
+
+    def neg(self, code):
+        return code + [(UNARY, operator.neg)]
+
+    def add(self, left, right):
+        return left + right + [(BINARY, operator.add)]
+
+    def sub(self, left, right):
+        return left + right + [(BINARY, operator.sub)]
+
+    def mul(self, left, right):
+        return left + right + [(BINARY, operator.mul)]
+
+    def div(self, left, right):
+        return left + right + [(BINARY, operator.truediv)]
+
+    def pow(self, left, right):
+        return left + right + [(BINARY, operator.pow)]
+
+    def array(self, *items):
+        return [x for code in items for x in code] + [(ARRAY, len(items))]
+
+    def _assign(self, name, code, deferred):
+        name = name.lower()
+        expression = Expression.from_code(code, name)
+        try:
+            value = expression(self.variables)
+        except UndefinedVariableError:
+            if not deferred:
+                raise
+            value = None  # may be defined later, evaluated when the graph is built
+
+        if deferred and expression.names:
+            self.variable_expressions[name] = expression
+        else:
+            self.variable_expressions.pop(name, None)
+        return value
+
+    def element(self, name, type_, *attributes):
+        name = name.lower()
+        expressions = {}
+        for attribute in attributes:
+            if len(attribute) == 3:
+                expressions[attribute[0]] = attribute[2]
+        if expressions:
+            self.attribute_expressions[name] = expressions
+        super().element(name, type_, *(attribute[:2] for attribute in attributes))
+
+    def command(self, *items):
+        items = (x[:2] if isinstance(x, tuple) and len(x) == 3 else x for x in items)
+        super().command(*items)
+
+    def reverse_object(self, name):
+        reversed_name = super().reverse_object(name)
+        expressions = self.attribute_expressions.get(name)
+        if (
+            expressions is not None
+            and reversed_name != name
+            and reversed_name in self.elements
+            and reversed_name not in self.attribute_expressions
+        ):
+            swap = {"e1": "e2", "e2": "e1"}
+            self.attribute_expressions[reversed_name] = {
+                swap.get(key, key): expression
+                for key, expression in expressions.items()
+            }
+        return reversed_name
+
+
+@v_args(inline=True)
+class _DeferredMADXTransformer(_DeferredTransformer, MADXTransformer):
+    def function(self, function, code):
+        name = FUNCTION_ALIASES.get(function, function).lower()
+        return code + [(UNARY, getattr(math, name))]
+
+    def assignment(self, name, code):
+        return self._assign(name, code, deferred=False)
+
+    def deferred_assignment(self, name, code):
+        return self._assign(name, code, deferred=True)
+
+    def attribute(self, name, value):
+        if isinstance(value, list):
+            value = Expression.from_code(value)(self.variables)
+        return name.lower(), value
+
+    def deferred_attribute(self, name, value):
+        if not isinstance(value, list):
+            return name.lower(), value
+
+        expression = Expression.from_code(value)
+        try:
+            value = expression(self.variables)
+        except UndefinedVariableError:
+            value = None  # may be defined later, evaluated when the graph is built
+
+        if expression.names:
+            return name.lower(), value, expression
+        return name.lower(), value
+
+    def seq_element(self, name, code):
+        return name.lower(), Expression.from_code(code)(self.variables)
+
+
+@v_args(inline=True)
+class _DeferredElegantTransformer(_DeferredTransformer, ElegantTransformer):
+    def function(self, code, function):
+        return code + [(UNARY, getattr(math, function.lower()))]
+
+    def assignment(self, code, name):
+        return self._assign(name, code, deferred=True)
+
+    def string(self, item):
+        s = item[1:-1]
+        expression = compile_rpn(s)
+        if expression is None:
+            return s
+
+        try:
+            value = expression(self.variables)
+        except _EVALUATION_ERRORS:
+            return s
+
+        if expression.target is not None and expression.names:
+            self.variable_expressions[expression.target] = expression
+        if not expression.names:
+            return value
+        return _Evaluated(value, expression)
+
+    def attribute(self, name, value):
+        if isinstance(value, _Evaluated):
+            return name.lower(), value.value, value.expression
+        return name.lower(), value
+
+
+class _Evaluated:
+    __slots__ = "value", "expression"
+
+    def __init__(self, value, expression):
+        self.value = value
+        self.expression = expression
+
+
+_ELEGANT_PARSER = InlineParser(
+    "elegant.lark", _DeferredElegantTransformer, maybe_placeholders=True
+)
+_MADX_PARSER = InlineParser(
+    "madx.lark", _DeferredMADXTransformer, maybe_placeholders=True
+)
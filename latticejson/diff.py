@@ -0,0 +1,190 @@
+"""Structural diff of two LatticeJSON dicts.
+
+Objects are matched by name. The content hashes of `hashing` are compared first, so
+only objects whose hashes differ are inspected in detail: identical sub-lattices are
+skipped no matter how many elements they contain.
+"""
+
+import json
+from difflib import SequenceMatcher
+from itertools import zip_longest
+from numbers import Number
+from typing import Dict, List, Tuple
+
+from .hashing import lattice_hashes
+from .utils import Repeat, format_children, iter_children
+
+
+class LatticeDiff:
+    """Differences between the LatticeJSON dicts `a` and `b`.
+
+    :ivar root: The old and new root lattice, None if the root is unchanged.
+    :ivar added_elements: Elements which are only defined in `b`.
+    :ivar removed_elements: Elements which are only defined in `a`.
+    :ivar changed_elements: Maps element names to a dict with the keys "type" (old
+        and new type, None if unchanged) and "attributes", which maps each changed
+        attribute to its old and new value. Missing values are None.
+    :ivar added_lattices: Lattices which are only defined in `b`.
+    :ivar removed_lattices: Lattices which are only defined in `a`.
+    :ivar changed_lattices: Maps lattice names to a list of changes of the children,
+        each a tuple (tag, start, old children, new children), where tag is one of
+        "replace", "delete" or "insert" and start is the index in the old children.
+        A repetition and its expanded form are not a change.
+    """
+
+    def __init__(self, a: dict, b: dict):
+        # dicts are often modified in place between diffs, so skip the hash cache
+        hashes_a, hashes_b = (lattice_hashes(x, cache=False) for x in (a, b))
+        self.root = None if a["root"] == b["root"] else (a["root"], b["root"])
+        self.added_elements, self.removed_elements, changed = _compare_names(
+            a["elements"], b["elements"], hashes_a, hashes_b
+        )
+        self.changed_elements = {
+            name: _element_changes(a["elements"][name], b["elements"][name])
+            for name in changed
+        }
+        self.added_lattices, self.removed_lattices, changed = _compare_names(
+            a["lattices"], b["lattices"], hashes_a, hashes_b
+        )
+        self.changed_lattices = {}
+        for name in changed:
+            changes = _children_changes(a["lattices"][name], b["lattices"][name])
+            if changes:  # otherwise only the content of a child differs
+                self.changed_lattices[name] = changes
+
+    def __bool__(self):
+        return any(
+            (
+                self.root,
+                self.added_elements,
+                self.removed_elements,
+                self.changed_elements,
+                self.added_lattices,
+                self.removed_lattices,
+                self.changed_lattices,
+            )
+        )
+
+    def to_dict(self) -> dict:
+        """Return the differences as JSON-serializable dict."""
+        return dict(
+            root=self.root,
+            added_elements=self.added_elements,
+            removed_elements=self.removed_elements,
+            changed_elements=self.changed_elements,
+            added_lattices=self.added_lattices,
+            removed_lattices=self.removed_lattices,
+            changed_lattices={
+                name: [
+                    (tag, start, format_children(old), format_children(new))
+                    for tag, start, old, new in changes
+                ]
+                for name, changes in self.changed_lattices.items()
+            },
+        )
+
+    def format(self) -> str:
+        """Return the differences in a human-readable form, one change per line."""
+        lines = []
+        if self.root is not None:
+            lines.append(f"~ root: {self.root[0]} -> {self.root[1]}")
+        lines += (f"- element {name}" for name in self.removed_elements)
+        lines += (f"+ element {name}" for name in self.added_elements)
+        for name, changes in self.changed_elements.items():
+            if changes["type"] is not None:
+                lines.append(f"~ element {name}: type {' -> '.join(changes['type'])}")
+            for key, (old, new) in changes["attributes"].items():
+                lines.append(f"~ element {name}: {key} {_format_change(old, new)}")
+        lines += (f"- lattice {name}" for name in self.removed_lattices)
+        lines += (f"+ lattice {name}" for name in self.added_lattices)
+        for name, changes in self.changed_lattices.items():
+            lines.append(f"~ lattice {name}:")
+            for tag, start, old, new in changes:
+                if old:
+                    lines.append(f"    - [{start}] {format_children(old)}")
+                if new:
+                    lines.append(f"    + [{start}] {format_children(new)}")
+        return "\n".join(lines)
+
+
+def diff(a: dict, b: dict) -> LatticeDiff:
+    """Return the structural differences between the LatticeJSON dicts `a` and `b`."""
+    return LatticeDiff(a, b)
+
+
+def _compare_names(objects_a, objects_b, hashes_a, hashes_b):
+    added = [name for name in objects_b if name not in objects_a]
+    removed = [name for name in objects_a if name not in objects_b]
+    changed = [
+        name
+        for name in objects_a
+        if name in objects_b and hashes_a.digest(name) != hashes_b.digest(name)
+    ]
+    return added, removed, changed
+
+
+def _element_changes(element_a, element_b) -> Dict[str, object]:
+    (type_a, attributes_a), (type_b, attributes_b) = element_a, element_b
+    attributes = {}
+    for key in {**attributes_a, **attributes_b}:
+        old, new = attributes_a.get(key), attributes_b.get(key)
+        if old != new:
+            attributes[key] = old, new
+    return dict(
+        type=None if type_a == type_b else (type_a, type_b), attributes=attributes
+    )
+
+
+def _children_changes(children_a, children_b) -> List[Tuple[str, int, list, list]]:
+    if children_a == children_b:
+        return []
+    if _has_repeat(children_a) or _has_repeat(children_b):
+        # a repetition and its expanded form are the same arrangement
+        if _same_sequence(iter_children(children_a), iter_children(children_b)):
+            return []
+
+    # SequenceMatcher is quadratic in the worst case, so strip the common ends first
+    n_min = min(len(children_a), len(children_b))
+    start = 0
+    while start < n_min and children_a[start] == children_b[start]:
+        start += 1
+    end = 0
+    while end < n_min - start and children_a[-1 - end] == children_b[-1 - end]:
+        end += 1
+    middle_a = children_a[start : len(children_a) - end]
+    middle_b = children_b[start : len(children_b) - end]
+
+    tokens_a, tokens_b = map(_tokens, (middle_a, middle_b))
+    matcher = SequenceMatcher(None, tokens_a, tokens_b, autojunk=False)
+    return [
+        (tag, start + i1, middle_a[i1:i2], middle_b[j1:j2])
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != "equal"
+    ]
+
+
+def _has_repeat(children):
+    return any(isinstance(child, Repeat) for child in children)
+
+
+def _same_sequence(a, b):
+    missing = object()
+    return all(x == y for x, y in zip_longest(a, b, fillvalue=missing))
+
+
+def _tokens(children):
+    return [
+        format_children([child]) if isinstance(child, Repeat) else child
+        for child in children
+    ]
+
+
+def _format_change(old, new):
+    text = f"{json.dumps(old)} -> {json.dumps(new)}"
+    if _is_number(old) and _is_number(new):
+        text += f" ({new - old:+g})"
+    return text
+
+
+def _is_number(value):
+    return isinstance(value, Number) and not isinstance(value, bool)
@@ -0,0 +1,317 @@
+"""Compiled evaluator for arithmetic (MADX) and reverse Polish notation (elegant)
+expressions.
+
+Each expression is compiled once into a flat list of instructions, which is executed by
+a small stack machine. Compiled expressions and results are memoized, the latter keyed
+by the expression text and the values of the variables it reads.
+"""
+
+import math
+import operator
+import re
+from functools import lru_cache
+from typing import Optional
+
+from .exceptions import UndefinedVariableError
+
+COMPILE_CACHE_SIZE = 2**14
+MEMO_SIZE = 2**14
+RPN_FUNCTIONS = "exp", "sin", "cos", "tan", "asin", "acos", "atan"
+FUNCTION_ALIASES = {"arctan": "atan"}  # some math functions are named differently
+
+CONST, LOAD, UNARY, BINARY, ARRAY = range(5)  # opcodes
+BINARY_OPERATORS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "^": operator.pow,
+    "**": operator.pow,
+}
+
+_NUMBER = r"(?:\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)"
+_RPN_TOKEN = re.compile(
+    rf"\s*(?:(?P<number>[+-]?{_NUMBER})|(?P<name>[A-Za-z_]\w*)|(?P<op>[-+*/]))"
+)
+_ARITHMETIC_TOKEN = re.compile(
+    rf"\s*(?:(?P<number>{_NUMBER})|(?P<name>[\w.]+)|(?P<op>\*\*|:=|[-+*/^(){{}},=]))"
+)
+_MEMO = {}
+_UNSET = object()
+
+
+class Expression:
+    """An expression compiled into instructions for a stack machine.
+
+    Calling the expression with a dict of (lowercase) variables evaluates it. If the
+    expression is an assignment, the result is also stored in the variables. As there
+    is no syntactic distinction between a variable and a string, an expression which
+    consists of a single undefined variable evaluates to its name.
+
+    :param str text: Source text of the expression.
+    :param list code: Instructions as (opcode, argument) pairs. The argument of LOAD
+        instructions is the name of the variable.
+    :param str target: Name of the variable the result is assigned to.
+    """
+
+    __slots__ = "text", "code", "names", "target", "_value"
+
+    def __init__(self, text: str, code: list, target: str = None):
+        self.text = text
+        names = (arg.lower() for op, arg in code if op == LOAD)
+        self.names = tuple(dict.fromkeys(names))
+        index = {name: i for i, name in enumerate(self.names)}
+        self.code = tuple(
+            (op, index[arg.lower()] if op == LOAD else arg) for op, arg in code
+        )
+        self.target = target
+        self._value = _UNSET
+
+    @classmethod
+    def from_code(cls, code: list, target: str = None) -> "Expression":
+        """Create an expression from instructions, e.g. built by a parse tree
+        transformer. The text of the expression is generated in reverse Polish notation.
+        """
+        return cls(" ".join(map(_format_instruction, code)), code, target)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.text!r})"
+
+    def __call__(self, variables: dict):
+        value = self.evaluate(variables)
+        if self.target is not None:
+            variables[self.target] = value
+        return value
+
+    def evaluate(self, variables: dict):
+        """Evaluate the expression without assigning the result."""
+        if not self.names:
+            if self._value is _UNSET:
+                self._value = self._run(())
+            return self._value
+
+        try:
+            values = tuple(map(variables.__getitem__, self.names))
+        except KeyError as error:
+            if len(self.code) == 1:  # just a string
+                return self.text.strip()
+            raise UndefinedVariableError(error.args[0]) from None
+
+        key = self.text, values
+        try:
+            return _MEMO[key]
+        except KeyError:
+            pass
+        except TypeError:  # unhashable values
+            return self._run(values)
+
+        value = self._run(values)
+        if len(_MEMO) >= MEMO_SIZE:
+            try:
+                del _MEMO[next(iter(_MEMO))]
+            except (KeyError, RuntimeError, StopIteration):  # concurrent modification
+                pass
+        _MEMO[key] = value
+        return value
+
+    def _run(self, values):
+        stack = []
+        push = stack.append
+        for op, arg in self.code:
+            if op == CONST:
+                push(arg)
+            elif op == LOAD:
+                push(values[arg])
+            elif op == UNARY:
+                stack[-1] = arg(stack[-1])
+            elif op == BINARY:
+                right = stack.pop()
+                stack[-1] = arg(stack[-1], right)
+            else:
+                stack[-arg:] = [stack[-arg:]]
+        return stack[0]
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_rpn(text: str) -> Optional[Expression]:
+    """Compile an expression in reverse Polish notation as used by elegant.
+
+    :param str text: The expression, e.g. "pi 16 /" or "0.5 sto half".
+    :return: The compiled expression or None if `text` is not a valid expression.
+    """
+    tokens = _tokenize(_RPN_TOKEN, text)
+    if not tokens:
+        return None
+
+    target = None
+    if len(tokens) > 2 and tokens[-2] == ("name", "sto"):
+        if tokens[-1][0] != "name":
+            return None
+        target = tokens[-1][1].lower()
+        tokens = tokens[:-2]
+
+    code = []
+    depth = 0
+    for kind, token in tokens:
+        if kind == "number":
+            code.append((CONST, float(token)))
+            depth += 1
+        elif kind == "op":
+            if depth < 2:
+                return None
+            code.append((BINARY, BINARY_OPERATORS[token]))
+            depth -= 1
+        elif token in RPN_FUNCTIONS and depth > 0:
+            code.append((UNARY, getattr(math, token)))
+        elif token == "sto":
+            return None
+        else:
+            code.append((LOAD, token))
+            depth += 1
+
+    return Expression(text, code, target) if depth == 1 else None
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_arithmetic(text: str) -> Optional[Expression]:
+    """Compile an arithmetic expression in infix notation as used by MADX.
+
+    :param str text: The expression, e.g. "2 * pi / 16" or "a := sin(b) ^ 2".
+    :return: The compiled expression or None if `text` is not a valid expression.
+    """
+    tokens = _tokenize(_ARITHMETIC_TOKEN, text)
+    if not tokens:
+        return None
+
+    target = None
+    if len(tokens) > 2 and tokens[0][0] == "name" and tokens[1][1] in ("=", ":="):
+        target = tokens[0][1].lower()
+        tokens = tokens[2:]
+
+    parser = _InfixParser(tokens)
+    try:
+        code = parser.expr()
+    except (IndexError, SyntaxError):
+        return None
+    if parser.position != len(tokens):
+        return None
+    return Expression(text, code, target)
+
+
+def _format_instruction(instruction):
+    op, arg = instruction
+    if op == CONST:
+        return repr(arg)
+    elif op == LOAD:
+        return arg
+    elif op == UNARY:
+        return arg.__name__
+    elif op == BINARY:
+        return _OPERATOR_SYMBOLS[arg]
+    return f"{{{arg}}}"
+
+
+_OPERATOR_SYMBOLS = {function: symbol for symbol, function in BINARY_OPERATORS.items()}
+_OPERATOR_SYMBOLS[operator.pow] = "^"
+
+
+def _tokenize(pattern, text):
+    tokens = []
+    position = 0
+    end = len(text.rstrip())
+    while position < end:
+        match = pattern.match(text, position)
+        if match is None:
+            return None
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        position = match.end()
+    return tokens
+
+
+class _InfixParser:
+    """Recursive descent parser following the arithmetic rules of `madx.lark`."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position][1]
+        return None
+
+    def next(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def expect(self, value):
+        if self.next()[1] != value:
+            raise SyntaxError(value)
+
+    def expr(self):
+        if self.peek() != "{":
+            return self.item()
+
+        self.next()
+        code = self.expr()
+        n_items = 1
+        while self.peek() == ",":
+            self.next()
+            if self.peek() == "}":
+                break
+            code += self.expr()
+            n_items += 1
+        self.expect("}")
+        return code + [(ARRAY, n_items)]
+
+    def item(self):
+        code = self.term()
+        while self.peek() in ("+", "-"):
+            operator_ = BINARY_OPERATORS[self.next()[1]]
+            code += self.term() + [(BINARY, operator_)]
+        return code
+
+    def term(self):
+        code = self.factor()
+        while self.peek() in ("*", "/"):
+            operator_ = BINARY_OPERATORS[self.next()[1]]
+            code += self.factor() + [(BINARY, operator_)]
+        return code
+
+    def factor(self):
+        if self.peek() == "+":
+            self.next()
+            return self.factor()
+        if self.peek() == "-":
+            self.next()
+            return self.factor() + [(UNARY, operator.neg)]
+        return self.power()
+
+    def power(self):
+        code = self.atom()
+        if self.peek() in ("^", "**"):  # right associative
+            self.next()
+            code += self.power() + [(BINARY, operator.pow)]
+        return code
+
+    def atom(self):
+        kind, token = self.next()
+        if kind == "number":
+            return [(CONST, float(token))]
+        if kind == "name":
+            if self.peek() != "(":
+                return [(LOAD, token)]
+            self.next()
+            code = self.expr()
+            self.expect(")")
+            name = FUNCTION_ALIASES.get(token, token).lower()
+            function = getattr(math, name, None)
+            if function is None:
+                raise SyntaxError(f"Unknown function '{token}'.")
+            return code + [(UNARY, function)]
+        if token == "(":
+            code = self.expr()
+            self.expect(")")
+            return code
+        raise SyntaxError(token)
@@ -0,0 +1,245 @@
+"""Concurrent loading of many lattice files from paths and URLs.
+
+HTTP(S) URLs are fetched with `http.client` on keep-alive connections, which are
+reused for later requests to the same host. Responses with an ETag or Last-Modified
+header are stored in a local response cache and revalidated with If-None-Match and
+If-Modified-Since, so unchanged files are not downloaded again. Other URL schemes fall
+back to `urllib.request.urlopen`.
+
+The files are fetched on a pool of threads and parsed on a second executor, a thread
+pool by default. Pass a `concurrent.futures.ProcessPoolExecutor` to parse on several
+CPUs.
+"""
+
+import asyncio
+import hashlib
+import http.client
+import threading
+import weakref
+from concurrent.futures import Executor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Tuple, Union
+from urllib.error import HTTPError
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+from .cache import CACHE_DIR, ConversionCache
+
+DEFAULT_TIMEOUT = 30.0  # seconds
+MAX_REDIRECTS = 5
+_REDIRECTS = {301, 302, 303, 307, 308}
+_ENTRY_KEYS = {"etag", "last_modified", "body"}
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections, reused by all threads.
+
+    :param float timeout: Timeout of connecting and reading in seconds.
+    :param int max_idle: Maximum number of idle connections kept per host.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_idle=8):
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.connections = 0  # number of opened connections
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def request(self, url: str, headers: dict = None) -> Tuple[int, dict, bytes]:
+        """Send a GET request and return the status, the headers and the body."""
+        scheme, netloc, path, query, _ = urlsplit(url)
+        target = urlunsplit(("", "", path or "/", query, ""))
+        key = scheme, netloc
+        while True:
+            connection, reused = self._acquire(key)
+            try:
+                connection.request("GET", target, headers=headers or {})
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.RemoteDisconnected, ConnectionError):
+                connection.close()
+                if reused:  # the server closed the idle connection, open a new one
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(key, connection)
+            return response.status, dict(response.getheaders()), body
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def _acquire(self, key):
+        with self._lock:
+            connections = self._idle.get(key)
+            if connections:
+                return connections.pop(), True
+            self.connections += 1
+
+        scheme, netloc = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout), False
+        return http.client.HTTPConnection(netloc, timeout=self.timeout), False
+
+    def _release(self, key, connection):
+        with self._lock:
+            connections = self._idle.setdefault(key, [])
+            if len(connections) < self.max_idle:
+                connections.append(connection)
+                return
+        connection.close()
+
+
+class Session:
+    """Loads lattice files from paths and URLs concurrently.
+
+    `stats` counts the HTTP requests and the responses which were revalidated from
+    the response cache.
+
+    :param int max_concurrency: Maximum number of files which are fetched and parsed
+        at the same time.
+    :param float timeout: Timeout of HTTP requests in seconds.
+    :param cache: Response cache, True for the default one in the cache directory,
+        False to disable it.
+    :type cache: Union[bool, ConversionCache]
+    :param executor: Executor for parsing and validating, defaults to a thread pool.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=16,
+        timeout=DEFAULT_TIMEOUT,
+        cache: Union[bool, ConversionCache] = True,
+        executor: Executor = None,
+    ):
+        if cache is True:
+            cache = ConversionCache(CACHE_DIR / "responses")
+        self.cache = cache or None
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self.pool = ConnectionPool(timeout, max_idle=max_concurrency)
+        self.stats = dict(requests=0, revalidated=0)
+        self._fetch_executor = ThreadPoolExecutor(max_concurrency)
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Close all connections and the fetching threads."""
+        self._fetch_executor.shutdown()
+        self.pool.close()
+
+    async def load(self, location, file_format: str = None, validate=True) -> dict:
+        """Load a lattice file like `io.load`, but without blocking the event loop."""
+        from . import io
+
+        loop = asyncio.get_event_loop()
+        async with self._semaphore(loop):
+            if urlsplit(str(location)).scheme == "":  # local files may include others
+                return await loop.run_in_executor(
+                    self.executor, io.load, location, file_format, validate
+                )
+
+            text, file_format = await loop.run_in_executor(
+                self._fetch_executor, self.read, str(location), file_format
+            )
+            return await loop.run_in_executor(
+                self.executor, io.load_string, text, file_format, validate
+            )
+
+    def load_many(
+        self, locations: Iterable, file_format: str = None, validate=True
+    ) -> List[dict]:
+        """Load all `locations` in a new event loop, see `load`."""
+
+        async def load_all():
+            return await asyncio.gather(
+                *(self.load(x, file_format, validate) for x in locations)
+            )
+
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(load_all())
+        finally:
+            loop.close()
+
+    def read(self, url: str, file_format: str = None) -> Tuple[Union[str, bytes], str]:
+        """Return the content and the file format of the lattice file at `url`."""
+        path = Path(urlsplit(url).path)
+        file_format = path.suffix[1:] if file_format is None else file_format
+        content = self.fetch(url)
+        return (content if file_format == "ljb" else content.decode()), file_format
+
+    def fetch(self, url: str) -> bytes:
+        """Return the body of `url`, revalidated against the response cache.
+
+        :raises urllib.error.HTTPError: Is raised for error responses.
+        """
+        if urlsplit(url).scheme not in {"http", "https"}:
+            from urllib.request import urlopen
+
+            with urlopen(url, timeout=self.pool.timeout) as response:
+                return response.read()
+
+        key = hashlib.sha256(url.encode()).hexdigest()
+        cached = None if self.cache is None else self.cache.get(key)
+        if not isinstance(cached, dict) or set(cached) != _ENTRY_KEYS:
+            cached = None
+        headers = {}
+        if cached is not None:
+            if cached["etag"] is not None:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"] is not None:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        location = url
+        for _ in range(MAX_REDIRECTS + 1):
+            self._count("requests")
+            status, response_headers, body = self.pool.request(location, headers)
+            if status not in _REDIRECTS:
+                break
+            location = urljoin(location, _header(response_headers, "Location"))
+
+        if status == 304 and cached is not None:
+            self._count("revalidated")
+            return cached["body"]
+        if status >= 300:
+            raise HTTPError(url, status, f"HTTP Error {status}", response_headers, None)
+
+        etag = _header(response_headers, "ETag")
+        last_modified = _header(response_headers, "Last-Modified")
+        no_store = "no-store" in (_header(response_headers, "Cache-Control") or "")
+        if self.cache is not None and (etag or last_modified) and not no_store:
+            entry = dict(etag=etag, last_modified=last_modified, body=body)
+            self.cache.set(key, entry)
+        return body
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _semaphore(self, loop):
+        # asyncio primitives are bound to the loop which is running when created
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+
+def _header(headers, name):
+    name = name.lower()
+    return next((value for key, value in headers.items() if key.lower() == name), None)
@@ -1,23 +1,91 @@
 import json
+from json.encoder import encode_basestring_ascii
+from itertools import islice
+from typing import IO, Iterable, Iterator
+
+from .utils import Repeat, iter_children
+
+BUFFER_SIZE = 2**16
+LIST_CHUNK_SIZE = 4096
+_encode = json.JSONEncoder().encode
 
 
 def format_json(obj):
-    """Compact version of json.dumps."""
-    return json.dumps(obj, cls=CompactJSONEncoder, indent=4)
+    """Compact version of json.dumps. Repetitions in lattices are expanded."""
+    return "".join(iter_json(obj))
+
+
+def iter_json(obj, indent=4) -> Iterator[str]:
+    """Yield the output of `format_json` in chunks.
+
+    Long lists are encoded in slices, so that no chunk grows with the lattice size.
+    """
+    return _iter_json(obj, 0, indent)
+
+
+def dump_json(obj, file: IO[str]):
+    """Write the output of `format_json` to the text file object `file`."""
+    write_chunks(iter_json(obj), file)
+
+
+def write_chunks(chunks: Iterable[str], file: IO[str], buffer_size=BUFFER_SIZE):
+    """Write `chunks` to `file`, joining small chunks up to `buffer_size` characters."""
+    buffer = []
+    size = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= buffer_size:
+            file.write("".join(buffer))
+            buffer.clear()
+            size = 0
+    if buffer:
+        file.write("".join(buffer))
 
 
 class CompactJSONEncoder(json.JSONEncoder):
     """A JSON Encoder which only indents the first two levels."""
 
     def encode(self, obj, level=0):
-        if isinstance(obj, dict) and level < 2:
-            items_indent = (level + 1) * self.indent * " "
-            items_string = ",\n".join(
-                f"{items_indent}{json.dumps(key)}: {self.encode(value, level=level+1)}"
-                for key, value in obj.items()
-            )
-            dict_indent = level * self.indent * " "
-            newline = "\n" if level == 0 else ""
-            return f"{{\n{items_string}\n{dict_indent}}}{newline}"
-        else:
-            return json.dumps(obj)
+        return "".join(_iter_json(obj, level, self.indent))
+
+
+def _iter_json(obj, level, indent):
+    if isinstance(obj, dict) and level < 2:
+        items_indent = (level + 1) * indent * " "
+        separator = "{\n"
+        for key, value in obj.items():
+            yield f"{separator}{items_indent}{_encode_key(key)}: "
+            if level == 0 or isinstance(value, list) and _is_long(value):
+                yield from _iter_json(value, level + 1, indent)
+            else:
+                yield _encode(value)
+            separator = ",\n"
+        if separator == "{\n":  # empty dict
+            yield separator
+        newline = "\n" if level == 0 else ""
+        yield f"\n{level * indent * ' '}}}{newline}"
+    elif isinstance(obj, list) and _is_long(obj):
+        yield from _iter_list(iter_children(obj))
+    else:
+        yield _encode(obj)
+
+
+def _is_long(obj):
+    # whether `obj` is encoded in slices because its length may be unbounded
+    return len(obj) > LIST_CHUNK_SIZE or Repeat in map(type, obj)
+
+
+def _encode_key(key):
+    return encode_basestring_ascii(key) if isinstance(key, str) else json.dumps(key)
+
+
+def _iter_list(iterator):
+    opening = "["
+    while True:
+        part = list(islice(iterator, LIST_CHUNK_SIZE))
+        if not part:
+            break
+        yield opening + json.dumps(part)[1:-1]
+        opening = ", "
+    yield "[]" if opening == "[" else "]"
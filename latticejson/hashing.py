@@ -0,0 +1,230 @@
+"""Content hashes of elements and lattices.
+
+The hash of an element covers its type and attributes, the hash of a lattice covers
+the hashes of its children and its repetitions. Names are not part of the hashes, so
+objects with equal hashes are structurally identical, also across files. A lattice
+written with a repetition, e.g. `Repeat(2, ["a"])`, and the expanded `["a", "a"]` are
+considered different.
+"""
+
+import hashlib
+import json
+from collections.abc import Mapping
+from typing import Dict, Iterable, List
+
+from .cache import IdentityCache
+from .utils import Repeat, traverse, unique_children
+
+CACHE_SIZE = 8
+_CACHE = IdentityCache(CACHE_SIZE)
+_ELEMENT = b"e"
+_LATTICE = b"l"
+_CHILD = b"\x00"
+_REPEAT = b"\x01"
+_PLAIN_TYPES = {float, str}
+_encode = json.JSONEncoder(sort_keys=True, separators=(",", ":")).encode
+
+
+def element_digest(type_: str, attributes: dict) -> bytes:
+    """Return the SHA-256 digest of an element.
+
+    Integral and float values which compare equal, e.g. 1 and 1.0, give the same
+    digest.
+    """
+    if not _PLAIN_TYPES.issuperset(map(type, attributes.values())):
+        attributes = {key: _normalize(value) for key, value in attributes.items()}
+    return hashlib.sha256(_ELEMENT + _encode([type_, attributes]).encode()).digest()
+
+
+class LatticeHashes(Mapping):
+    """Content hashes of all elements and lattices of a LatticeJSON dict.
+
+    Maps the name of each object to the hex digest of its content. The hashes are
+    computed bottom-up, so each object is hashed once.
+
+    :param dict latticejson: LatticeJSON dict
+    :raises ValueError: Is raised for undefined objects or self-containing lattices.
+    """
+
+    def __init__(self, latticejson: dict):
+        elements = latticejson["elements"]
+        lattices = latticejson["lattices"]
+        self.root = latticejson.get("root")
+        self.order = list(traverse(lattices, lattices, elements=False))
+        self._latticejson = latticejson
+        self._digests = {name: element_digest(*elements[name]) for name in elements}
+        self._parents = None
+        for name in self.order:
+            self._digests[name] = self._lattice_digest(name)
+
+    def __getitem__(self, name: str) -> str:
+        return self._digests[name].hex()
+
+    def __iter__(self):
+        return iter(self._digests)
+
+    def __len__(self):
+        return len(self._digests)
+
+    def digest(self, name: str = None) -> bytes:
+        """Return the raw digest of `name`, defaults to the root lattice."""
+        return self._digests[self.root if name is None else name]
+
+    def equal(self, name: str, other: str) -> bool:
+        """Whether the objects `name` and `other` are structurally identical."""
+        return self._digests[name] == self._digests[other]
+
+    def update(self, names: Iterable[str]) -> List[str]:
+        """Rehash the objects `names` after they were modified or added in place.
+
+        Only the lattices which contain one of the objects are rehashed as well.
+
+        :param names: Names of modified elements or lattices.
+        :return: Names of the objects whose hashes changed, lattices after their
+            children.
+        """
+        elements = self._latticejson["elements"]
+        lattices = self._latticejson["lattices"]
+        names = list(dict.fromkeys(names))
+        modified_lattices = {name for name in names if name in lattices}
+        if modified_lattices or not set(self.order).isdisjoint(names):
+            # the hierarchy may have changed
+            self.order = list(traverse(lattices, lattices, elements=False))
+            self._parents = None
+
+        changed = []
+        for name in names:
+            if name in lattices:
+                continue
+            if name not in elements:  # removed
+                if self._digests.pop(name, None) is not None:
+                    changed.append(name)
+                continue
+
+            digest = element_digest(*elements[name])
+            if digest != self._digests.get(name):
+                self._digests[name] = digest
+                changed.append(name)
+
+        ancestors = self._ancestors([*changed, *modified_lattices]) | modified_lattices
+        for name in self.order:
+            if name in ancestors:
+                digest = self._lattice_digest(name)
+                if digest != self._digests.get(name):
+                    self._digests[name] = digest
+                    changed.append(name)
+        return changed
+
+    def duplicates(self) -> Dict[str, List[str]]:
+        """Return the names of identical objects grouped by the first name.
+
+        Groups are only returned if they contain more than one object. The root
+        lattice is always the first name of its group.
+        """
+        groups = {}
+        if self.root in self._digests:
+            groups[self._digests[self.root]] = [self.root]
+        for name, digest in self._digests.items():
+            group = groups.setdefault(digest, [])
+            if name != self.root:
+                group.append(name)
+        return {group[0]: group[1:] for group in groups.values() if len(group) > 1}
+
+    def _lattice_digest(self, name):
+        hasher = hashlib.sha256(_LATTICE)
+        _update(hasher, self._latticejson["lattices"][name], self._digests)
+        return hasher.digest()
+
+    def _ancestors(self, names):
+        if self._parents is None:
+            self._parents = {}
+            for lattice, children in self._latticejson["lattices"].items():
+                for child in unique_children(children):
+                    self._parents.setdefault(child, set()).add(lattice)
+
+        ancestors = set()
+        stack = list(names)
+        while stack:
+            for parent in self._parents.get(stack.pop(), ()):
+                if parent not in ancestors:
+                    ancestors.add(parent)
+                    stack.append(parent)
+        return ancestors
+
+
+def lattice_hashes(latticejson: dict, cache=True) -> LatticeHashes:
+    """Return the content hashes of a LatticeJSON dict.
+
+    The hashes are memoized per LatticeJSON dict. Pass `cache=False` or call
+    `clear_cache` when the dict was modified in place.
+
+    :param dict latticejson: LatticeJSON dict
+    :param bool cache: Whether to use the cache.
+    """
+    if not cache:
+        return LatticeHashes(latticejson)
+    return _CACHE.get(latticejson, None, lambda: LatticeHashes(latticejson))
+
+
+def lattice_hash(latticejson: dict, name: str = None) -> str:
+    """Return the content hash of `name`, defaults to the root lattice."""
+    hashes = lattice_hashes(latticejson)
+    return hashes[hashes.root if name is None else name]
+
+
+def clear_cache():
+    """Remove all memoized hashes."""
+    _CACHE.clear()
+
+
+def deduplicate(latticejson: dict) -> dict:
+    """Return a LatticeJSON dict in which identical objects are merged.
+
+    Every group of identical elements or lattices is replaced by its first member,
+    e.g. the `_reversed` copies of symmetric lattices are replaced by the originals.
+
+    :param dict latticejson: LatticeJSON dict
+    """
+    duplicates = lattice_hashes(latticejson).duplicates()
+    rename = {name: first for first, names in duplicates.items() for name in names}
+    elements = {k: v for k, v in latticejson["elements"].items() if k not in rename}
+    lattices = {
+        name: _renamed(children, rename)
+        for name, children in latticejson["lattices"].items()
+        if name not in rename
+    }
+    return dict(latticejson, elements=elements, lattices=lattices)
+
+
+def _update(hasher, children, digests):
+    for child in children:
+        if isinstance(child, Repeat):
+            hasher.update(_REPEAT)
+            hasher.update(child.count.to_bytes(8, "little"))
+            hasher.update(len(child.items).to_bytes(8, "little"))
+            _update(hasher, child.items, digests)
+        else:
+            digest = digests.get(child)
+            if digest is None:
+                raise ValueError(f"Object '{child}' is not defined.")
+            hasher.update(_CHILD)
+            hasher.update(digest)
+
+
+def _renamed(children, rename):
+    renamed = []
+    for child in children:
+        if isinstance(child, Repeat):
+            child = Repeat(child.count, _renamed(child.items, rename))
+        renamed.append(rename.get(child, child) if isinstance(child, str) else child)
+    return renamed
+
+
+def _normalize(value):
+    if type(value) is int:
+        return float(value)
+    if isinstance(value, list):
+        return [_normalize(x) for x in value]
+    if isinstance(value, dict):
+        return {key: _normalize(x) for key, x in value.items()}
+    return value
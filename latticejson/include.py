@@ -0,0 +1,243 @@
+"""Lattice files which are split across several files.
+
+elegant files include other files with `#include: path`, MADX files with
+`call, file="path";`. Relative paths are resolved against the directory of the
+including file, then against the working directory.
+
+Every file is split at its include statements and the parts in between are parsed
+into trees, which do not depend on the context in which the file is included. The
+files of one level of the include graph are parsed concurrently and the trees are
+cached by the hash of the file content. Afterwards, the trees are transformed in the
+order of the textual inclusion, so that variables and objects are defined in the same
+order as if the files were one file.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from lark import Transformer
+
+from .parse import ELEGANT_PARSER, MADX_PARSER, ElegantTransformer, MADXTransformer
+from .stream import (
+    _MADX_COMMENT,
+    _elegant_comment_start,
+    iter_elegant_statements,
+    iter_madx_statements,
+)
+
+CACHE_SIZE = 256
+_ELEGANT_INCLUDE = re.compile(r'\s*#include:\s*"?([^"\s]+)"?\s*', re.IGNORECASE)
+_MADX_CALL = re.compile(r'\s*call\s*,\s*file\s*=\s*"?([^";]+?)"?\s*;\s*', re.IGNORECASE)
+_HAS_INCLUDE = dict(
+    lte=re.compile(r"^\s*#include:", re.IGNORECASE | re.MULTILINE),
+    madx=re.compile(r"\bcall\s*,", re.IGNORECASE),
+)
+_FORMATS = dict(
+    lte=(ELEGANT_PARSER, ElegantTransformer, iter_elegant_statements),
+    madx=(MADX_PARSER, MADXTransformer, iter_madx_statements),
+)
+
+
+def has_includes(text: str, file_format: str) -> bool:
+    """Whether the content of a lattice file may include other files."""
+    pattern = _HAS_INCLUDE.get(file_format)
+    return pattern is not None and pattern.search(text) is not None
+
+
+class DeckParser:
+    """Parser for lattice files which include other files.
+
+    The parsed files are cached by their content, so parsing the deck again after a
+    change only parses the changed files. `stats` holds the number of files which
+    were parsed and taken from the cache by the last call of `parse`, `graph` the
+    include graph. The parser may be used by several threads at the same time.
+
+    :param int cache_size: Maximum number of cached files.
+    """
+
+    def __init__(self, cache_size=CACHE_SIZE):
+        self.cache_size = cache_size
+        self.stats = dict(parsed=0, cached=0)
+        self.graph: Dict[Path, List[Path]] = {}
+        self._cache: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def parse(self, path, file_format: str = None, jobs=1) -> dict:
+        """Parse the lattice file at `path` and all files it includes.
+
+        :param path: Path of the main file.
+        :param str file_format: Either "lte" or "madx", defaults to the file suffix.
+        :param int jobs: Number of processes, 0 for one process per CPU.
+        :raises ValueError: Is raised if a file includes itself.
+        :return: The result like `parse.parse_elegant` or `parse.parse_madx`.
+        """
+        path = Path(path).resolve()
+        file_format = path.suffix[1:] if file_format is None else file_format
+        if file_format not in _FORMATS:
+            raise NotImplementedError(f"Unknown lattice file format: {file_format}.")
+
+        graph, segments, stats = self._parse_files(path, file_format, jobs)
+        transformer = _FORMATS[file_format][1]()
+        transformer.reset()
+        _transform(path, graph, segments, transformer, set())
+        self.graph, self.stats = graph, stats
+        return transformer.result()
+
+    def load(
+        self, path, file_format: str = None, validate=True, jobs=1, compact=False
+    ) -> dict:
+        """Parse the lattice file at `path` and convert it to a LatticeJSON dict.
+
+        :param bool validate: Whether to validate the result.
+        :param bool compact: Keep repetitions as `utils.Repeat` items.
+        """
+        from .convert import FROM_ELEGANT, FROM_MADX, _map_names
+        from .utils import expand_repetitions
+        from .validate import validate as _validate
+
+        path = Path(path)
+        file_format = path.suffix[1:] if file_format is None else file_format
+        name_map = FROM_ELEGANT if file_format == "lte" else FROM_MADX
+        data = self.parse(path, file_format, jobs)
+        latticejson = _map_names(data, name_map, compact=True)
+        if validate:
+            _validate(latticejson)
+        return latticejson if compact else expand_repetitions(latticejson)
+
+    def clear_cache(self):
+        """Remove all parsed files from the cache."""
+        with self._lock:
+            self._cache.clear()
+
+    def _parse_files(self, path, file_format, jobs):
+        graph, segments = {}, {}
+        stats = dict(parsed=0, cached=0)
+        level = [path]
+        while level:
+            texts = [file.read_text() for file in level]
+            keys = [(_digest(text), file_format) for text in texts]
+            with self._lock:
+                cached = [self._cache.get(key) for key in keys]
+            missing = [i for i, result in enumerate(cached) if result is None]
+            tasks = [(texts[i], file_format) for i in missing]
+            for i, result in zip(missing, _map(_parse_segments, tasks, jobs)):
+                cached[i] = result
+            stats["parsed"] += len(missing)
+            stats["cached"] += len(level) - len(missing)
+            with self._lock:
+                for key, result in zip(keys, cached):
+                    self._cache[key] = result
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+            next_level = []
+            for file, result in zip(level, cached):
+                segments[file] = result
+                children = [
+                    _resolve(file, target)
+                    for is_include, target in result
+                    if is_include
+                ]
+                graph[file] = children
+                for child in children:
+                    if child not in graph and child not in next_level:
+                        next_level.append(child)
+            level = next_level
+        return graph, segments, stats
+
+
+_DEFAULT_PARSER = DeckParser()
+
+
+def load_deck(
+    path, file_format: str = None, validate=True, jobs=1, compact=False
+) -> dict:
+    """Load a lattice file and all files it includes to a LatticeJSON dict.
+
+    Uses a shared `DeckParser`, so unchanged files are not parsed again.
+
+    :param path: Path of the main file.
+    :param str file_format: Either "lte" or "madx", defaults to the file suffix.
+    :param bool validate: Whether to validate the result.
+    :param int jobs: Number of processes, 0 for one process per CPU.
+    :param bool compact: Keep repetitions as `utils.Repeat` items.
+    """
+    return _DEFAULT_PARSER.load(path, file_format, validate, jobs, compact)
+
+
+def _transform(file, graph, segments, transformer, including):
+    including.add(file)
+    children = iter(graph[file])
+    for is_include, value in segments[file]:
+        if not is_include:
+            Transformer.transform(transformer, value)
+            continue
+
+        child = next(children)
+        if child in including:
+            raise ValueError(f"{child} includes itself.")
+        _transform(child, graph, segments, transformer, including)
+    including.remove(file)
+
+
+def _parse_segments(task):
+    """Split a file at its include statements and parse the parts in between.
+
+    :return: List of (False, tree) and (True, included path) tuples.
+    """
+    text, file_format = task
+    parser, _, split = _FORMATS[file_format]
+    segments, statements = [], []
+
+    def flush():
+        if any(statement.strip() for statement in statements):
+            segments.append((False, parser.parse("".join(statements))))
+        statements.clear()
+
+    for statement in split([text + "\n"]):
+        target = _include_target(statement, file_format)
+        if target is None:
+            statements.append(statement)
+        else:
+            flush()
+            segments.append((True, target))
+    flush()
+    return segments
+
+
+def _include_target(statement, file_format):
+    if file_format == "lte":
+        comment_start = _elegant_comment_start(statement)
+        if comment_start != -1:
+            statement = statement[:comment_start]
+        match = _ELEGANT_INCLUDE.fullmatch(statement)
+    else:
+        match = _MADX_CALL.fullmatch(_MADX_COMMENT.sub("", statement))
+    return None if match is None else match.group(1)
+
+
+def _resolve(file, target):
+    path = file.parent / target
+    return (path if path.exists() else Path(target)).resolve()
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _map(function, items, jobs):
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if jobs == 1 or len(items) < 2:
+        return list(map(function, items))
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(min(jobs, len(items))) as executor:
+        return list(executor.map(function, items))
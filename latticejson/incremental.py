@@ -0,0 +1,240 @@
+"""Incremental parsing of successive versions of an elegant or MADX lattice file.
+
+The file is split into statements (see `stream`). The result of every statement is
+cached by its normalized text together with the variables and objects it read. After
+an edit, the cached definitions of a statement are replayed if the values it read are
+unchanged. New statements are parsed, and unchanged statements which depend on a
+changed value are evaluated again from their parse tree, which is kept from then on.
+"""
+
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Iterable, Iterator, List
+
+from lark import Transformer
+
+from .parse import ElegantTransformer, LazyParser, MADXTransformer, _build_parser
+from .stream import iter_elegant_statements, iter_madx_statements
+
+_MISSING = object()
+_FORMATS = {
+    "lte": ("elegant.lark", ElegantTransformer, iter_elegant_statements),
+    "madx": ("madx.lark", MADXTransformer, iter_madx_statements),
+}
+
+
+class IncrementalParser:
+    """Parser for successive versions of one lattice file.
+
+    :param str input_format: Either "lte" or "madx".
+    """
+
+    def __init__(self, input_format: str):
+        if input_format not in _FORMATS:
+            raise NotImplementedError(f"Unknown lattice file format: {input_format}.")
+
+        self.input_format = input_format
+        grammar_file, transformer_class, self._split = _FORMATS[input_format]
+        self.transformer = transformer_class()
+        self.tree_parser = LazyParser(grammar_file, maybe_placeholders=True)
+        # parses and transforms new statements in one go, without building a tree
+        self.inline_parser = _build_parser(
+            grammar_file, self.transformer, maybe_placeholders=True
+        )
+        self.stats = dict(parsed=0, transformed=0, replayed=0)
+        self._trees = {}
+        self._records = {}
+
+    def parse(self, string: str) -> dict:
+        """Parse `string` like `parse.parse_elegant` or `parse.parse_madx`.
+
+        `stats` holds the number of statements which were parsed, transformed and
+        replayed afterwards.
+        """
+        transformer = self.transformer
+        transformer.reset()
+        tracker = _Tracker()
+        containers = dict(
+            element=_TrackingDict("element", tracker),
+            lattice=_TrackingDict("lattice", tracker),
+            assignment=_TrackingDict("assignment", tracker, transformer.variables),
+        )
+        transformer.elements = containers["element"]
+        transformer.lattices = containers["lattice"]
+        transformer._variables = containers["assignment"]
+        transformer.commands = commands = _TrackingList(tracker)
+
+        self.stats = stats = dict(parsed=0, transformed=0, replayed=0)
+        trees, records = {}, {}
+        occurrences = defaultdict(int)
+        for statement in self._split([string + "\n"]):
+            text = _normalize(statement)
+            if not text:
+                continue
+
+            occurrences[text] += 1
+            key = text, occurrences[text]
+            record = self._records.get(key)
+            tree = self._trees.get(text)
+            if record is not None and record.is_valid(containers):
+                record.replay(containers, commands)
+                stats["replayed"] += 1
+            else:
+                tracker.start()
+                if tree is None and record is None:
+                    self.inline_parser.parse(statement)
+                    stats["parsed"] += 1
+                else:  # the statement is evaluated again, keep its tree
+                    if tree is None:
+                        tree = self.tree_parser.parse(statement)
+                        stats["parsed"] += 1
+                    Transformer.transform(transformer, tree)
+                    stats["transformed"] += 1
+                record = _Record(tracker.events, tracker.reads)
+            if tree is not None:
+                trees[text] = tree
+            records[key] = record
+
+        self._trees, self._records = trees, records
+        return dict(
+            elements=dict(containers["element"]),
+            lattices={name: list(x) for name, x in containers["lattice"].items()},
+            commands=list(commands),
+            variables=dict(containers["assignment"]),
+        )
+
+    def load(self, string: str, validate=True, compact=False) -> dict:
+        """Parse `string` and convert the result to a LatticeJSON dict.
+
+        :param str string: Content of the lattice file.
+        :param bool validate: Whether to validate the result.
+        :param bool compact: Keep repetitions as `utils.Repeat` items.
+        """
+        from .convert import FROM_ELEGANT, FROM_MADX, _map_names
+        from .utils import expand_repetitions
+        from .validate import validate as _validate
+
+        name_map = FROM_ELEGANT if self.input_format == "lte" else FROM_MADX
+        latticejson = _map_names(self.parse(string), name_map, compact=True)
+        if validate:
+            _validate(latticejson)
+        return latticejson if compact else expand_repetitions(latticejson)
+
+
+def watch_files(paths: Iterable, interval=0.1) -> Iterator[List[Path]]:
+    """Poll the files `paths` and yield the ones which changed since the last check.
+
+    The first yielded list contains all paths. A file counts as changed when its
+    modification time, size or inode changes, e.g. when an editor saves it.
+
+    :param paths: Paths of the files to watch.
+    :param float interval: Seconds between two checks.
+    """
+    paths = [Path(path) for path in paths]
+    signatures = {}
+    first = True
+    while True:
+        changed = []
+        for path in paths:
+            signature = _signature(path)
+            if signature is not None and signature != signatures.get(path):
+                signatures[path] = signature
+                changed.append(path)
+
+        if changed or first:
+            first = False
+            yield changed
+        else:
+            time.sleep(interval)
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:  # e.g. while an editor replaces the file
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def _normalize(statement):
+    return "\n".join(filter(None, (line.strip() for line in statement.splitlines())))
+
+
+class _Record:
+    """Definitions made by a statement and the values it read from outside."""
+
+    __slots__ = "events", "reads"
+
+    def __init__(self, events, reads):
+        self.events = events
+        self.reads = reads
+
+    def is_valid(self, containers):
+        for (kind, name), value in self.reads.items():
+            current = dict.get(containers[kind], name, _MISSING)
+            if current is not value and (
+                type(current) is not type(value) or current != value
+            ):
+                return False
+        return True
+
+    def replay(self, containers, commands):
+        for kind, name, value in self.events:
+            if kind == "command":
+                list.append(commands, value)
+            else:
+                dict.__setitem__(containers[kind], name, value)
+
+
+class _Tracker:
+    def __init__(self):
+        self.start()
+
+    def start(self):
+        self.events = []
+        self.reads = {}
+        self.written = set()
+
+    def read(self, kind, name, value):
+        key = kind, name
+        if key not in self.written and key not in self.reads:
+            self.reads[key] = value
+
+    def write(self, kind, name, value):
+        self.written.add((kind, name))
+        self.events.append((kind, name, value))
+
+
+class _TrackingDict(dict):
+    def __init__(self, kind, tracker, *args):
+        super().__init__(*args)
+        self.kind = kind
+        self.tracker = tracker
+
+    def __getitem__(self, key):
+        self.tracker.read(self.kind, key, dict.get(self, key, _MISSING))
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.tracker.read(self.kind, key, dict.get(self, key, _MISSING))
+        return super().get(key, default)
+
+    def __contains__(self, key):
+        self.tracker.read(self.kind, key, dict.get(self, key, _MISSING))
+        return super().__contains__(key)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.tracker.write(self.kind, key, value)
+
+
+class _TrackingList(list):
+    def __init__(self, tracker):
+        super().__init__()
+        self.tracker = tracker
+
+    def append(self, item):
+        super().append(item)
+        self.tracker.events.append(("command", None, item))
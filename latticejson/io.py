@@ -1,15 +1,25 @@
 import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
-from typing import AnyStr, Tuple, Union
+from typing import IO, AnyStr, Iterable, Iterator, List, Tuple, Union
 from urllib.parse import urlparse
-from urllib.request import urlopen
 
-from . import convert
-from .format import format_json
+from .format import iter_json, write_chunks
+from .utils import expand_repetitions
 from .validate import validate as _validate
 
 
-def load(location: Union[AnyStr, Path], file_format=None, validate=True) -> dict:
+def load(
+    location: Union[AnyStr, Path],
+    file_format=None,
+    validate=True,
+    cache=None,
+    compact=False,
+) -> dict:
     """Deserialize a lattice file to LatticeJSON-compliant dictionary.
 
     :param location: path-like or url-like
@@ -18,12 +28,111 @@ def load(location: Union[AnyStr, Path], file_format=None, validate=True) -> dict
     :type file_format: str, optional
     :param validate: Whether to validate the input file.
     :type validate: bool
+    :param cache: Conversion cache, see `load_string`. Not used for elegant and MADX
+        files which include other files: their entry would have to depend on all
+        included files. These are loaded with `include.load_deck`, which caches the
+        parsed files in memory instead.
+    :type cache: Union[bool, ConversionCache], optional
+    :param compact: Keep repetitions as `utils.Repeat` items, see `load_string`.
+    :type compact: bool
     :return dict: Deserialized lattice file
     """
-    return load_string(*_load_file(location, file_format), validate)
+    text, file_format = _load_file(location, file_format)
+    if urlparse(str(location)).scheme == "":
+        from .include import has_includes
 
+        if has_includes(text, file_format):
+            from .include import load_deck
 
-def load_string(string: str, input_format: str, validate: bool = True) -> dict:
+            return load_deck(location, file_format, validate, compact=compact)
+    return load_string(text, file_format, validate, cache, compact)
+
+
+async def aload(
+    location: Union[AnyStr, Path], file_format=None, validate=True, session=None
+) -> dict:
+    """Like `load`, but fetches and parses without blocking the event loop.
+
+    URLs are fetched on keep-alive connections and revalidated against a local
+    response cache, see `fetch.Session`.
+
+    :param session: Session to share connections and the concurrency limit between
+        calls, defaults to a new session.
+    :type session: fetch.Session, optional
+    :return dict: Deserialized lattice file
+    """
+    from .fetch import Session
+
+    if session is not None:
+        return await session.load(location, file_format, validate)
+
+    with Session() as session:
+        return await session.load(location, file_format, validate)
+
+
+def load_many(
+    locations: Iterable[Union[AnyStr, Path]],
+    file_format=None,
+    validate=True,
+    max_concurrency=16,
+    executor=None,
+    cache=True,
+) -> List[dict]:
+    """Deserialize many lattice files concurrently, see `aload`.
+
+    :param locations: path-likes or url-likes
+    :param file_format: File format of all lattice files, defaults to the suffixes.
+    :type file_format: str, optional
+    :param validate: Whether to validate the input files.
+    :type validate: bool
+    :param max_concurrency: Maximum number of files fetched and parsed at once.
+    :type max_concurrency: int
+    :param executor: Executor for parsing and validating, defaults to threads.
+    :type executor: concurrent.futures.Executor, optional
+    :param cache: Response cache for URLs, see `fetch.Session`.
+    :type cache: Union[bool, ConversionCache], optional
+    :return list: Deserialized lattice files in the order of `locations`
+    """
+    from .fetch import Session
+
+    with Session(max_concurrency, cache=cache, executor=executor) as session:
+        return session.load_many(locations, file_format, validate)
+
+
+def load_all(
+    locations: Iterable[Union[AnyStr, Path]],
+    file_format=None,
+    validate=True,
+    executor=None,
+) -> List[dict]:
+    """Deserialize many lattice files concurrently on an executor.
+
+    Loading is safe on thread pools: each thread parses with its own parsers and
+    transformers, and the shared caches are guarded by locks. Threads only run in
+    parallel on free-threaded Python builds, use a process pool otherwise.
+
+    :param locations: path-likes or url-likes
+    :param file_format: File format of all lattice files, defaults to the suffixes.
+    :type file_format: str, optional
+    :param validate: Whether to validate the input files.
+    :type validate: bool
+    :param executor: Executor to load the files on, defaults to a thread pool.
+    :type executor: concurrent.futures.Executor, optional
+    :return list: Deserialized lattice files in the order of `locations`
+    """
+    if executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor() as executor:
+            return load_all(locations, file_format, validate, executor)
+
+    futures = [executor.submit(load, x, file_format, validate) for x in locations]
+    return [future.result() for future in futures]
+
+
+def load_string(
+    string: str, input_format: str, validate: bool = True, cache=None, compact=False
+) -> dict:
     """Deserialize a string to a LatticeJSON-compliant dictionary.
 
     :param string str: Content of the input lattice file.
@@ -32,20 +141,50 @@ def load_string(string: str, input_format: str, validate: bool = True) -> dict:
     :param input_format str: Input format of the input lattice file.
     :param validate: Whether to validate the input file.
     :type validate: bool
+    :param cache: If True, results are looked up in and stored to the default
+        on-disk `ConversionCache`. A `ConversionCache` instance may be passed instead.
+    :type cache: Union[bool, ConversionCache], optional
+    :param compact: Keep repetitions like `500*(cell)` of elegant, MADX and binary
+        files as `utils.Repeat` items instead of expanding them to lists of names.
+        Such dicts are not JSON serializable, but `save` writes them compactly.
+    :type compact: bool
     :return dict: Returns deserialized lattice file as dict.
     """
-    if input_format == "json":
+    from . import convert
+
+    if cache:
+        if cache is True:
+            from .cache import default_cache
+
+            cache = default_cache()
+
+        key = cache.key(string, input_format, validate, compact)
+        latticejson = cache.get(key)
+        if latticejson is None:
+            latticejson = load_string(string, input_format, validate, compact=compact)
+            cache.set(key, latticejson)
+        return latticejson
+
+    if input_format == "ljb":
+        from .binary import BinaryLattice
+
+        lattice = BinaryLattice(string)
+        if validate:
+            lattice.validate()  # much cheaper than validating the decoded dict
+        latticejson = {key: lattice[key] for key in lattice}
+        return latticejson if compact else expand_repetitions(latticejson)
+    elif input_format == "json":
         latticejson = json.loads(string)
     elif input_format == "lte":
-        latticejson = convert.from_elegant(string)
+        latticejson = convert.from_elegant(string, compact=True)
     elif input_format == "madx":
-        latticejson = convert.from_madx(string)
+        latticejson = convert.from_madx(string, compact=True)
     else:
         raise NotImplementedError(f"Unknown lattice file format: {input_format}.")
 
     if validate:
-        _validate(latticejson)
-    return latticejson
+        _validate(latticejson)  # cheaper before expanding the repetitions
+    return latticejson if compact else expand_repetitions(latticejson)
 
 
 def _load_file(location: Union[AnyStr, Path], file_format=None) -> Tuple[str, str]:
@@ -63,9 +202,13 @@ def _load_file(location: Union[AnyStr, Path], file_format=None) -> Tuple[str, st
         file_format = path.suffix[1:]
 
     is_path = parse_result.scheme == ""
-    if is_path:
+    if is_path and file_format == "ljb":
+        text = Path(location).read_bytes()
+    elif is_path:
         text = Path(location).read_text()
     else:
+        from urllib.request import urlopen
+
         text = urlopen(location).read()
     return text, file_format
 
@@ -73,6 +216,8 @@ def _load_file(location: Union[AnyStr, Path], file_format=None) -> Tuple[str, st
 def save(latticejson: dict, path: str, output_format=None):
     """Serialize LatticeJSON-compliant dictionary to different lattice file formats.
 
+    The output is streamed to the file instead of building it in memory first.
+
     :param latticejson dict: A LatticeJSON-compliant dictionary.
     :param path Union[AnyStr, Path]: Output path.
     :param output_format str: Output format.
@@ -82,7 +227,17 @@ def save(latticejson: dict, path: str, output_format=None):
     if output_format is None:
         output_format = path.suffix[1:]
 
-    path.write_text(save_string(latticejson, output_format))
+    if output_format == "ljb":
+        from .binary import dumps
+
+        data = dumps(latticejson)
+        with atomic_open(path, "wb") as file:
+            file.write(data)
+        return
+
+    chunks = iter_string(latticejson, output_format)
+    with atomic_open(path) as file:
+        write_chunks(chunks, file)
 
 
 def save_string(latticejson: dict, output_format: str) -> str:
@@ -91,13 +246,79 @@ def save_string(latticejson: dict, output_format: str) -> str:
     :param latticejson dict: A LatticeJSON-compliant dictionary.
     :param output_format str: Output format.
     :raises NotImplementedError: Is raised for unknown lattice file formats.
-    :return: Returns lattice file in `output_format` as string.
-    :rtype: str
+    :return: Returns lattice file in `output_format` as string, bytes for "ljb".
+    :rtype: Union[str, bytes]
+    """
+    if output_format == "ljb":
+        from .binary import dumps
+
+        return dumps(latticejson)
+    return "".join(iter_string(latticejson, output_format))
+
+
+def dump(latticejson: dict, file: IO[str], output_format: str):
+    """Serialize LatticeJSON-compliant dictionary to the text file object `file`.
+
+    :param latticejson dict: A LatticeJSON-compliant dictionary.
+    :param file: Text file object, e.g. `sys.stdout`, binary for "ljb".
+    :param output_format str: Output format.
+    :raises NotImplementedError: Is raised for unknown lattice file formats.
+    """
+    if output_format == "ljb":
+        from .binary import dump as dump_binary
+
+        return dump_binary(latticejson, file)
+    write_chunks(iter_string(latticejson, output_format), file)
+
+
+def iter_string(latticejson: dict, output_format: str) -> Iterator[str]:
+    """Like `save_string`, but yields the output in chunks.
+
+    :param latticejson dict: A LatticeJSON-compliant dictionary.
+    :param output_format str: Output format.
+    :raises NotImplementedError: Is raised for unknown lattice file formats.
     """
+    from . import convert
+
     if output_format == "json":
-        return format_json(latticejson)
+        return iter_json(latticejson)
     elif output_format == "lte":
-        return convert.to_elegant(latticejson)
+        return convert.iter_elegant(latticejson)
     elif output_format == "madx":
-        return convert.to_madx(latticejson)
+        return convert.iter_madx(latticejson)
     raise NotImplementedError(f"Converting to {output_format} is not implemented!")
+
+
+@contextmanager
+def atomic_open(path: Union[AnyStr, Path], mode="w"):
+    """Open a temporary file which atomically replaces the file at `path` once it is
+    closed. If an exception is raised within the block, `path` is left untouched.
+
+    :param path: Destination path.
+    :type path: Union[AnyStr, Path]
+    :param mode str: File mode, "w" for text and "wb" for binary files.
+    """
+    path = Path(path)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    try:
+        with open(fd, mode) as file:
+            yield file
+        # mkstemp creates files with mode 0600, use the usual permissions instead
+        mode = path.stat().st_mode & 0o777 if path.exists() else 0o666 & ~_umask()
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+_UMASK_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _umask():
+    # reading the umask sets it temporarily, which must not interleave between threads
+    with _UMASK_LOCK:
+        umask = os.umask(0)
+        os.umask(umask)
+    return umask
@@ -0,0 +1,204 @@
+"""Linear transfer matrices of elements and lattices.
+
+The matrices act on the coordinates (x, x', y, y', s, delta) in the convention of
+elegant, where s is the path length and delta the relative momentum deviation. The
+beam is assumed to be ultra-relativistic. Cavities, sextupoles and octupoles are
+linear drifts.
+
+NumPy is an optional dependency: `pip install latticejson[numpy]`.
+"""
+
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from .hashing import LatticeHashes
+from .table import ElementGroup
+from .utils import Repeat
+
+COORDINATES = "x", "xp", "y", "yp", "s", "delta"
+# below this |K| L^2 the series expansions are used, which avoid cancellation
+_SMALL_PHASE = 1e-6
+
+
+def element_matrices(group: ElementGroup) -> np.ndarray:
+    """Return the transfer matrices of all elements of a group.
+
+    :param group: Elements of one type, see `table.ElementTable`.
+    :return: Array of shape (len(group), 6, 6).
+    """
+    length = _column(group, "length")
+    h, k1 = np.zeros(len(group)), np.zeros(len(group))
+    if group.type in {"Quadrupole", "Dipole"}:
+        k1 = _column(group, "k1")
+    if group.type == "Dipole":
+        np.divide(_column(group, "angle"), length, out=h, where=length > 0)
+        if "radius" in group.columns:
+            radius = _column(group, "radius")
+            use_radius = (radius != 0) & ~_present(group, "angle")
+            h[use_radius] = 1 / radius[use_radius]
+
+    matrices = np.tile(np.eye(6), (len(group), 1, 1))
+    kx = h**2 + k1
+    cx, sx, dx, fx = _principal_functions(kx, length)
+    matrices[:, 0, 0] = matrices[:, 1, 1] = cx
+    matrices[:, 0, 1] = sx
+    matrices[:, 1, 0] = -kx * sx
+    cy, sy, _, _ = _principal_functions(-k1, length)
+    matrices[:, 2, 2] = matrices[:, 3, 3] = cy
+    matrices[:, 2, 3] = sy
+    matrices[:, 3, 2] = k1 * sy
+    matrices[:, 0, 5] = matrices[:, 4, 1] = h * dx
+    matrices[:, 1, 5] = matrices[:, 4, 0] = h * sx
+    matrices[:, 4, 5] = h**2 * fx
+
+    if group.type == "Dipole":
+        for key, side in ("e1", 1), ("e2", 0):
+            if key in group.columns:
+                edges = _edge_matrices(h, _column(group, key))
+                pair = (matrices, edges) if side else (edges, matrices)
+                matrices = np.matmul(*pair)
+
+    if "tilt" in group.columns:
+        tilt = _column(group, "tilt")
+        rows = np.flatnonzero(tilt)
+        rotation = _rotation_matrices(tilt[rows])
+        inverse = np.transpose(rotation, (0, 2, 1))
+        matrices[rows] = inverse @ matrices[rows] @ rotation
+    return matrices
+
+
+class TransferMatrices:
+    """Transfer matrices of all elements and lattices of a LatticeJSON dict.
+
+    The matrices are stored by content hash, so identical objects share one matrix
+    and each sub-lattice is computed once. Repetitions `Repeat(n, items)` use
+    exponentiation by squaring. After elements or lattices were modified in place,
+    `update` only recomputes the modified objects and the lattices containing them.
+
+    :param dict latticejson: LatticeJSON dict
+    :param dict cache: Matrices by content digest, may be shared between instances.
+    """
+
+    def __init__(self, latticejson: dict, cache: Dict[bytes, np.ndarray] = None):
+        self.latticejson = latticejson
+        self.hashes = LatticeHashes(latticejson)
+        self.cache = {} if cache is None else cache
+        self._compute(latticejson["elements"], self.hashes.order)
+
+    def matrix(self, name: str = None) -> np.ndarray:
+        """Return the transfer matrix of `name`, defaults to the root lattice."""
+        return self.cache[self.hashes.digest(name)]
+
+    def update(self, names: Iterable[str]) -> List[str]:
+        """Recompute the matrices after the objects `names` were modified in place.
+
+        :return: Names of the objects whose content changed.
+        """
+        changed = self.hashes.update(names)
+        elements, lattices = self.latticejson["elements"], self.latticejson["lattices"]
+        self._compute(
+            [name for name in changed if name in elements],
+            [name for name in changed if name in lattices],
+        )
+        return changed
+
+    def _compute(self, elements: Iterable[str], lattices: Iterable[str]):
+        cache, digest = self.cache, self.hashes.digest
+        definitions = self.latticejson["elements"]
+        names_by_type = {}
+        for name in elements:
+            if digest(name) not in cache:
+                names_by_type.setdefault(definitions[name][0], []).append(name)
+
+        for type_, names in names_by_type.items():
+            attributes = [definitions[name][1] for name in names]
+            group = ElementGroup(type_, names, attributes)
+            for name, matrix in zip(names, element_matrices(group)):
+                cache[digest(name)] = matrix
+
+        children = self.latticejson["lattices"]
+        for name in lattices:
+            if digest(name) not in cache:
+                cache[digest(name)] = self._compose(children[name])
+
+    def _compose(self, children) -> np.ndarray:
+        matrices = []
+        for child in children:
+            if isinstance(child, Repeat):
+                matrix = self._compose(child.items)
+                matrices.append(np.linalg.matrix_power(matrix, child.count))
+            else:
+                matrices.append(self.cache[self.hashes.digest(child)])
+        return product(matrices)
+
+
+def transfer_matrix(latticejson: dict, name: str = None) -> np.ndarray:
+    """Return the transfer matrix of `name`, defaults to the root lattice."""
+    return TransferMatrices(latticejson).matrix(name)
+
+
+def product(matrices) -> np.ndarray:
+    """Return the transfer matrix of a sequence of matrices in beam order.
+
+    The products are computed pairwise in batches, which needs log2(n) NumPy calls.
+    """
+    if len(matrices) == 0:
+        return np.eye(6)
+
+    stack = np.asarray(matrices)
+    while len(stack) > 1:
+        if len(stack) % 2:
+            last = stack[-1:]
+            stack = np.concatenate((stack[1:-1:2] @ stack[:-1:2], last))
+        else:
+            stack = stack[1::2] @ stack[::2]
+    return stack[0]
+
+
+def _column(group, key):
+    column = group.columns.get(key)
+    return np.zeros(len(group)) if column is None else np.nan_to_num(column)
+
+
+def _present(group, key):
+    present = group.present.get(key)
+    return np.zeros(len(group), dtype=bool) if present is None else present
+
+
+def _principal_functions(k, length):
+    """Return C, S, (1 - C) / k and (L - S) / k for the focusing strengths `k`."""
+    phase = np.abs(k) * length**2
+    small = phase < _SMALL_PHASE
+    root = np.sqrt(np.abs(np.where(small, 1, k)))
+    phi = root * length
+    c = np.where(k > 0, np.cos(phi), np.cosh(phi))
+    s = np.where(k > 0, np.sin(phi), np.sinh(phi)) / root
+    k_safe = np.where(small, 1, k)
+    d = (1 - c) / k_safe
+    f = (length - s) / k_safe
+
+    # Taylor expansions up to first order in k
+    l2, l3 = length**2, length**3
+    c = np.where(small, 1 - k * l2 / 2, c)
+    s = np.where(small, length - k * l3 / 6, s)
+    d = np.where(small, l2 / 2 - k * l2**2 / 24, d)
+    f = np.where(small, l3 / 6 - k * l2 * l3 / 120, f)
+    return c, s, d, f
+
+
+def _edge_matrices(h, angle):
+    matrices = np.tile(np.eye(6), (len(h), 1, 1))
+    matrices[:, 1, 0] = h * np.tan(angle)
+    matrices[:, 3, 2] = -h * np.tan(angle)
+    return matrices
+
+
+def _rotation_matrices(angle):
+    c, s = np.cos(angle), np.sin(angle)
+    matrices = np.tile(np.eye(6), (len(angle), 1, 1))
+    for i in 0, 1:
+        matrices[:, i, i] = matrices[:, i + 2, i + 2] = c
+        matrices[:, i, i + 2] = s
+        matrices[:, i + 2, i] = -s
+    return matrices
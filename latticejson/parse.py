@@ -1,30 +1,117 @@
+import hashlib
 import math
+import threading
 from abc import ABC, abstractproperty
 from pathlib import Path
 
 from lark import Lark, Transformer, v_args
-from lark.exceptions import LarkError
+from lark import __version__ as lark_version
 
+from .cache import CACHE_DIR
 from .exceptions import UndefinedVariableError
+from .expression import compile_arithmetic, compile_rpn
+from .utils import Repeat, traverse
 
 BASE_DIR = Path(__file__).resolve().parent
+# Lark writes its table cache non-atomically, so parsers are built one at a time
+_BUILD_LOCK = threading.Lock()
 
-with (BASE_DIR / "elegant.lark").open() as file:
-    ELEGANT_PARSER = Lark(file, parser="lalr", maybe_placeholders=True)
-    file.seek(0)
-    RPN_PARSER = Lark(file, parser="lalr", start="start_rpn")
 
-with (BASE_DIR / "madx.lark").open() as file:
-    MADX_PARSER = Lark(file, parser="lalr", maybe_placeholders=True)
-    file.seek(0)
-    ARITHMETIC_PARSER = Lark(file, parser="lalr", start="start_artih")
+class LazyParser:
+    """A LALR parser which is built on first use.
+
+    The generated parse tables are cached on disk, keyed by the grammar hash and the
+    Lark version, so that warm starts skip the table generation. The parser is built
+    once even if several threads use it at the same time. It does not keep any state
+    between parses, so it may be shared by all threads.
+
+    :param str grammar_file: Name of the grammar file within the package directory.
+    :param options: Additional keyword arguments passed to `Lark`.
+    """
+
+    def __init__(self, grammar_file, **options):
+        self.grammar_file = grammar_file
+        self.options = options
+        self._parser = None
+        self._lock = threading.Lock()
+
+    @property
+    def parser(self) -> Lark:
+        if self._parser is None:
+            with self._lock:
+                if self._parser is None:
+                    self._parser = _build_parser(self.grammar_file, **self.options)
+        return self._parser
+
+    def parse(self, text, *args, **kwargs):
+        return self.parser.parse(text, *args, **kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.parser, name)
+
+
+class InlineParser:
+    """A LALR parser which applies the transformer during parsing.
+
+    As the transformer callbacks are invoked on each reduction, the parse tree is never
+    materialized. The parser and the stateful transformer are built on first use, once
+    per thread.
+
+    :param str grammar_file: Name of the grammar file within the package directory.
+    :param transformer_class: Subclass of `AbstractLatticeFileTransformer`.
+    :param options: Additional keyword arguments passed to `Lark`.
+    """
+
+    def __init__(self, grammar_file, transformer_class, **options):
+        self.grammar_file = grammar_file
+        self.transformer_class = transformer_class
+        self.options = options
+        self._local = threading.local()
+
+    def parse(self, text) -> dict:
+        try:
+            parser, transformer = self._local.parser, self._local.transformer
+        except AttributeError:
+            transformer = self._local.transformer = self.transformer_class()
+            parser = self._local.parser = _build_parser(
+                self.grammar_file, transformer=transformer, **self.options
+            )
+
+        transformer.reset()
+        parser.parse(text)
+        return transformer.result()
+
+
+def _build_parser(grammar_file, transformer=None, **options) -> Lark:
+    grammar = (BASE_DIR / grammar_file).read_text()
+    key = grammar + repr(sorted(options.items()))
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    name = f"{Path(grammar_file).stem}-{digest}-lark-{lark_version}.pickle"
+    cache_path = CACHE_DIR / "grammars" / name
+    options = dict(options, parser="lalr", transformer=transformer)
+    with _BUILD_LOCK:
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            return Lark(grammar, cache=str(cache_path), **options)
+        except OSError:  # cache directory is not writable
+            return Lark(grammar, **options)
+
+
+ELEGANT_PARSER = LazyParser("elegant.lark", maybe_placeholders=True)
+RPN_PARSER = LazyParser("elegant.lark", start="start_rpn")
+MADX_PARSER = LazyParser("madx.lark", maybe_placeholders=True)
+ARITHMETIC_PARSER = LazyParser("madx.lark", start="start_artih")
 
 
 @v_args(inline=True)
 class ArithmeticTransformer(Transformer):
+    CONSTANTS = {"pi": math.pi, "twopi": 2 * math.pi, "e": math.e}
+
     def __init__(self, variables=None):
         if variables is None:
-            self._variables = {"pi": math.pi, "twopi": 2 * math.pi, "e": math.e}
+            self._variables = self.CONSTANTS.copy()
         else:
             self._variables = variables
 
@@ -41,6 +128,9 @@ class ArithmeticTransformer(Transformer):
         self.variables[name.lower()] = value
         return value
 
+    def deferred_assignment(self, name, value):
+        return self.assignment(name, value)
+
     def function(self, function, operand):
         # some math functions are named differently in Python
         function = {"arctan": "atan"}.get(function, function)
@@ -68,16 +158,25 @@ class RPNTransformer(ArithmeticTransformer):
 @v_args(inline=True)
 class AbstractLatticeFileTransformer(ABC, Transformer):
     REVERSED_SUFFIX = "_reversed"
+    # element types whose entrance and exit edges are swapped when reversed
+    ASYMMETRIC_TYPES = {"sbend", "csbend"}
 
     @abstractproperty
     def variables(self):
         pass
 
     def transform(self, tree):
+        self.reset()
+        super().transform(tree)
+        return self.result()
+
+    def reset(self):
+        """Reset the state of the transformer before a new lattice file is parsed."""
         self.elements = {}
         self.lattices = {}
         self.commands = []
-        super().transform(tree)
+
+    def result(self):
         return dict(
             elements=self.elements,
             lattices=self.lattices,
@@ -97,6 +196,9 @@ class AbstractLatticeFileTransformer(ABC, Transformer):
     def attribute(self, name, value):
         return name.lower(), value
 
+    def deferred_attribute(self, name, value):
+        return self.attribute(name, value)
+
     def lattice(self, name, arangement):
         self.lattices[name.lower()] = list(arangement)
 
@@ -105,10 +207,11 @@ class AbstractLatticeFileTransformer(ABC, Transformer):
         if is_reversed is not None:
             multiplier *= -1
 
+        # only the top-level items are reversed, nested groups keep their order
         if multiplier < 0:
             items = items[::-1]
 
-        return [x for _ in range(abs(multiplier)) for y in items for x in y]
+        return _repeat(abs(multiplier), [x for y in items for x in y])
 
     def ref_name(self, mutliplier, is_reversed, name):
         name = str(name).lower()
@@ -119,26 +222,27 @@ class AbstractLatticeFileTransformer(ABC, Transformer):
         if multiplier < 0:
             name = self.reverse_object(name)
 
-        return abs(multiplier) * (name,)
+        return _repeat(abs(multiplier), [name])
 
     def reverse_object(self, name):
-        if name.endswith(self.REVERSED_SUFFIX):
-            reversed_name = name[: -len(self.REVERSED_SUFFIX)]
-        else:
-            reversed_name = name + self.REVERSED_SUFFIX
+        reversed_name = self._reversed_name(name)
         if reversed_name in self.lattices or reversed_name in self.elements:
             pass
         elif name in self.lattices:
-            self.lattices[reversed_name] = [
-                self.reverse_object(obj_name)
-                for obj_name in reversed(self.lattices[name])
-            ]
+            # reverse the sub-lattices first, so that reversing the children of a
+            # lattice never recurses into the hierarchy
+            for lattice in traverse(self.lattices, [name], elements=False):
+                reversed_lattice = self._reversed_name(lattice)
+                if reversed_lattice not in self.lattices:
+                    self.lattices[reversed_lattice] = _reversed_items(
+                        self.lattices[lattice], self.reverse_object
+                    )
         elif name in self.elements:
             # a bend with different exit and entrance angles must be reversed
             # for all other elements we can return the old reference
             # TODO: must other elemetns be reversed too?
             type_, attrs = self.elements[name]
-            if type_ not in {"sbend", "csbend"} or attrs.get("e1") == attrs.get("e2"):
+            if type_ not in self.ASYMMETRIC_TYPES or attrs.get("e1") == attrs.get("e2"):
                 return name
 
             attrs = attrs.copy()
@@ -146,12 +250,21 @@ class AbstractLatticeFileTransformer(ABC, Transformer):
             self.elements[reversed_name] = type_, attrs
         return reversed_name
 
+    def _reversed_name(self, name):
+        if name.endswith(self.REVERSED_SUFFIX):
+            return name[: -len(self.REVERSED_SUFFIX)]
+        return name + self.REVERSED_SUFFIX
+
     def command(self, *items):
         self.commands.append(items)
 
 
 @v_args(inline=True)
 class MADXTransformer(ArithmeticTransformer, AbstractLatticeFileTransformer):
+    def reset(self):
+        super().reset()
+        self._variables = self.CONSTANTS.copy()
+
     def sequence(self, name, *items):
         *attributes, elements = items
         self.lattices[name.lower()] = elements
@@ -166,35 +279,89 @@ class MADXTransformer(ArithmeticTransformer, AbstractLatticeFileTransformer):
 
 @v_args(inline=True)
 class ElegantTransformer(RPNTransformer, AbstractLatticeFileTransformer):
-    def __init__(self):
-        super().__init__()
-        self.calc = Calculator(rpn=True)
-        self.calc.transformer._variables = self._variables
+    def reset(self):
+        super().reset()
+        self._variables = self.CONSTANTS.copy()
 
     def string(self, item):
         s = item[1:-1]
-        try:  # There is no syntactic distinction between a string and a variable.
-            return self.calc(s)
-        except LarkError:  # Just a string
+        # There is no syntactic distinction between a string and a variable.
+        expression = compile_rpn(s)
+        if expression is None:  # Just a string
+            return s
+
+        try:
+            return expression(self._variables)
+        except (ArithmeticError, TypeError, ValueError, UndefinedVariableError):
             return s
 
 
 class Calculator:
-    """Can evaluate simple arithmetic expressions. Used to test ArithmeticParser."""
+    """Can evaluate simple arithmetic expressions. Used to test ArithmeticParser.
+
+    Expressions are evaluated by the compiled evaluator of `latticejson.expression`.
+    Only invalid expressions are passed to the Lark parser to get a proper error. The
+    variables are shared by all calls, so use one instance per thread.
+    """
 
     def __init__(self, rpn=False):
         self.parser = RPN_PARSER if rpn else ARITHMETIC_PARSER
         self.transformer = RPNTransformer() if rpn else ArithmeticTransformer()
+        self.compile = compile_rpn if rpn else compile_arithmetic
 
     def __call__(self, expression):
-        return self.transformer.transform(self.parser.parse(expression))
+        compiled = self.compile(expression)
+        if compiled is None:
+            return self.transformer.transform(self.parser.parse(expression))
+        return compiled(self.transformer.variables)
+
+
+ELEGANT_INLINE_PARSER = InlineParser(
+    "elegant.lark", ElegantTransformer, maybe_placeholders=True
+)
+MADX_INLINE_PARSER = InlineParser("madx.lark", MADXTransformer, maybe_placeholders=True)
+
+
+def parse_elegant(string: str, build_tree=False):
+    """Parse an elegant lattice file.
 
+    :param str string: Content of the lattice file.
+    :param bool build_tree: Build the full parse tree and transform it afterwards instead
+        of transforming during parsing. Needs considerably more memory.
+    """
+    string += "\n"  # TODO: remove "\n" when lark has EOF
+    if build_tree:
+        return ElegantTransformer().transform(ELEGANT_PARSER.parse(string))
+    return ELEGANT_INLINE_PARSER.parse(string)
 
-def parse_elegant(string: str):
-    tree = ELEGANT_PARSER.parse(string + "\n")  # TODO: remove "\n" when lark has EOF
-    return ElegantTransformer().transform(tree)
 
+def parse_madx(string: str, build_tree=False):
+    """Parse a MADX lattice file.
 
-def parse_madx(string: str):
-    tree = MADX_PARSER.parse(string)
-    return MADXTransformer().transform(tree)
+    :param str string: Content of the lattice file.
+    :param bool build_tree: Build the full parse tree and transform it afterwards instead
+        of transforming during parsing. Needs considerably more memory.
+    """
+    if build_tree:
+        return MADXTransformer().transform(MADX_PARSER.parse(string))
+    return MADX_INLINE_PARSER.parse(string)
+
+
+def _repeat(count, items):
+    # repetitions are kept compact instead of expanding them
+    if count == 1 or not items:
+        return items
+    if count == 0:
+        return []
+    return [Repeat(count, items)]
+
+
+def _reversed_items(items, reverse_object):
+    reversed_items = []
+    for item in reversed(items):
+        if isinstance(item, Repeat):
+            item = Repeat(item.count, _reversed_items(item.items, reverse_object))
+        else:
+            item = reverse_object(item)
+        reversed_items.append(item)
+    return reversed_items
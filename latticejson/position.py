@@ -0,0 +1,106 @@
+"""Index of the longitudinal positions (s) of the elements of a lattice."""
+
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from itertools import accumulate
+from typing import Dict, List, Tuple
+
+from .utils import Repeat, flattened_element_sequence, traverse
+
+
+class PositionIndex:
+    """Cumulative positions of the flattened lattice with O(log n) lookups.
+
+    :param dict latticejson: LatticeJSON dict
+    :param str root: Name of the lattice to index, defaults to the root lattice.
+    """
+
+    def __init__(self, latticejson: dict, root: str = None):
+        elements = latticejson["elements"]
+        self.latticejson = latticejson
+        self.root = latticejson["root"] if root is None else root
+        self.names: List[str] = list(flattened_element_sequence(latticejson, self.root))
+        lengths = (elements[name][1].get("length", 0) for name in self.names)
+        self.positions: List[float] = [0, *accumulate(lengths)]
+        self.occurrences: Dict[str, List[int]] = defaultdict(list)
+        for index, name in enumerate(self.names):
+            self.occurrences[name].append(index)
+        self._lattice_lengths = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def length(self) -> float:
+        """Total length of the indexed lattice."""
+        return self.positions[-1]
+
+    def index_at(self, s: float) -> int:
+        """Return the index of the element at position `s`.
+
+        Zero-length elements share the position of the following element and are
+        never returned.
+
+        :raises IndexError: If `s` is outside of the lattice.
+        """
+        if not 0 <= s <= self.length or not self.names:
+            raise IndexError(f"Position {s} is outside of the lattice.")
+        index = bisect_right(self.positions, s) - 1
+        return min(index, len(self.names) - 1)
+
+    def element_at(self, s: float) -> Tuple[int, str]:
+        """Return the index and name of the element at position `s`."""
+        index = self.index_at(s)
+        return index, self.names[index]
+
+    def elements_between(self, start: float, end: float) -> List[Tuple[int, str]]:
+        """Return the indices and names of the elements overlapping [start, end)."""
+        first = max(bisect_right(self.positions, start) - 1, 0)
+        last = min(bisect_left(self.positions, end), len(self.names))
+        return [(index, self.names[index]) for index in range(first, last)]
+
+    def start(self, index: int) -> float:
+        """Return the start position of the element at `index`."""
+        return self.positions[index]
+
+    def starts(self, name: str) -> List[float]:
+        """Return the start positions of all occurrences of the element `name`."""
+        return [self.positions[index] for index in self.occurrences.get(name, ())]
+
+    def lattice_length(self, name: str) -> float:
+        """Return the length of the element or sub-lattice `name`."""
+        return lattice_lengths(self.latticejson, name, self._lattice_lengths)[name]
+
+
+def lattice_lengths(latticejson: dict, root: str = None, memo: dict = None) -> dict:
+    """Return the lengths of `root` and all objects it contains.
+
+    Lengths of sub-lattices are computed once and reused, so the cost depends on the
+    number of distinct lattices, not on how often they are repeated.
+
+    :param dict latticejson: LatticeJSON dict
+    :param str root: Name of the object, defaults to the root lattice.
+    :param dict memo: Previously computed lengths, which is updated in place.
+    :return: Lengths by object name.
+    """
+    elements = latticejson["elements"]
+    lattices = latticejson["lattices"]
+    lengths = {} if memo is None else memo
+    root = latticejson["root"] if root is None else root
+    for name in traverse(lattices, [root], visited=set(lengths)):
+        if name in lattices:
+            lengths[name] = _children_length(lattices[name], lengths)
+        else:
+            lengths[name] = elements[name][1].get("length", 0)
+    return lengths
+
+
+def _children_length(children, lengths):
+    return sum(
+        (
+            child.count * _children_length(child.items, lengths)
+            if isinstance(child, Repeat)
+            else lengths[child]
+        )
+        for child in children
+    )
@@ -0,0 +1,223 @@
+"""Write many variants of a lattice which only differ in a few element attributes.
+
+The element definitions and lattices of the base lattice are rendered once. For each
+variant only the lines of the overridden elements are rendered again, the unchanged
+parts in between are written as pre-joined segments.
+"""
+
+import csv
+import os
+from pathlib import Path
+from typing import IO, List, Sequence, Tuple
+
+from .convert import (
+    TO_ELEGANT,
+    TO_MADX,
+    _elegant_element,
+    _madx_element,
+    iter_elegant,
+    iter_madx,
+)
+
+FORMATS = {
+    "lte": (iter_elegant, _elegant_element, TO_ELEGANT),
+    "madx": (iter_madx, _madx_element, TO_MADX),
+}
+
+
+def read_csv(file: IO[str]) -> Tuple[List[str], List[list], List[str]]:
+    """Read a table of overrides in the CSV format.
+
+    The header contains one "element.attribute" column per override and optionally a
+    "name" column with the names of the variants.
+
+    :param file: Open CSV file.
+    :raises ValueError: Is raised if a value is not a number.
+    :return: Columns, rows of values and the names of the variants (or None).
+    """
+    reader = csv.reader(file)
+    header = next(reader)
+    name_index = header.index("name") if "name" in header else None
+    columns = [column for i, column in enumerate(header) if i != name_index]
+    rows, names = [], []
+    for line, row in enumerate(reader, start=2):
+        if not row:
+            continue
+        if name_index is not None:
+            names.append(row.pop(name_index))
+        try:
+            rows.append([_number(value) for value in row])
+        except ValueError:
+            column, value = next(
+                (column, value)
+                for column, value in zip(columns, row)
+                if not _is_number(value)
+            )
+            raise ValueError(
+                f"Line {line}, column {column!r}: {value!r} is not a number."
+            ) from None
+    return columns, rows, names if name_index is not None else None
+
+
+class VariantWriter:
+    """Renders variants of `latticejson` in which the attributes in `columns` differ.
+
+    :param latticejson dict: The base lattice.
+    :param columns: Overridden attributes as "element.attribute" strings.
+    :param output_format str: Either "lte" or "madx".
+    :raises ValueError: Is raised for unknown formats, elements, attributes or
+        malformed columns.
+    """
+
+    def __init__(self, latticejson: dict, columns: Sequence[str], output_format="lte"):
+        if output_format not in FORMATS:
+            raise ValueError(f"Unsupported output format {output_format!r}.")
+
+        iter_format, self._format_element, names = FORMATS[output_format]
+        self.elements = latticejson["elements"]
+        self.columns = []
+        for column in columns:
+            element, sep, attribute = column.partition(".")
+            if not sep or not attribute:
+                raise ValueError(f"Column {column!r} is not of the form element.attr.")
+            if element not in self.elements:
+                raise ValueError(f"Unknown element {element!r} in column {column!r}.")
+            if attribute not in names:
+                raise ValueError(
+                    f"Unknown attribute {attribute!r} in column {column!r}."
+                )
+            self.columns.append((element, attribute))
+
+        # the first chunk is the title, followed by one chunk per element
+        chunks = list(iter_format(latticejson))
+        index = {name: i for i, name in enumerate(self.elements, start=1)}
+        self.changed = sorted({element for element, _ in self.columns}, key=index.get)
+        bounds = [0, *(index[name] for name in self.changed), len(chunks)]
+        self.segments = [
+            "".join(chunks[start + (i > 0) : end])
+            for i, (start, end) in enumerate(zip(bounds, bounds[1:]))
+        ]
+
+    def write(self, file: IO[str], values: Sequence):
+        """Write the variant with the override `values` to `file`.
+
+        :param values: One value per column.
+        :raises ValueError: Is raised if the number of values does not match.
+        """
+        if len(values) != len(self.columns):
+            raise ValueError(
+                f"Got {len(values)} values for {len(self.columns)} columns."
+            )
+
+        overrides = {}
+        for (element, attribute), value in zip(self.columns, values):
+            overrides.setdefault(element, {})[attribute] = _python_value(value)
+
+        segments = iter(self.segments)
+        file.write(next(segments))
+        for name, segment in zip(self.changed, segments):
+            type_, attributes = self.elements[name]
+            attributes = {**attributes, **overrides[name]}
+            file.write(self._format_element(name, type_, attributes))
+            file.write(segment)
+
+    def render(self, values: Sequence) -> str:
+        """Return the variant with the override `values` as string."""
+        from io import StringIO
+
+        file = StringIO()
+        self.write(file, values)
+        return file.getvalue()
+
+
+def write_variants(
+    latticejson: dict,
+    columns: Sequence[str],
+    rows,
+    output_dir,
+    output_format="lte",
+    names: Sequence[str] = None,
+    jobs=1,
+) -> List[Path]:
+    """Write one variant of `latticejson` per row of override values to `output_dir`.
+
+    :param latticejson dict: The base lattice.
+    :param columns: Overridden attributes as "element.attribute" strings.
+    :param rows: Rows of override values, e.g. a list of lists or a 2D NumPy array.
+    :param output_dir: Directory of the variants, created if it does not exist.
+    :param output_format str: Either "lte" or "madx".
+    :param names: File names of the variants without suffix. Defaults to the row
+        numbers.
+    :param jobs int: Number of processes, 0 for one process per CPU.
+    :return: Paths of the written files in the order of `rows`.
+    """
+    rows = list(rows)
+    if names is None:
+        width = len(str(max(len(rows) - 1, 0)))
+        names = [f"variant_{i:0{width}d}" for i in range(len(rows))]
+    elif len(names) != len(rows):
+        raise ValueError(f"Got {len(names)} names for {len(rows)} rows.")
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = [output_dir / f"{name}.{output_format}" for name in names]
+    tasks = list(zip(paths, rows))
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if jobs == 1 or len(tasks) < 2:
+        _init_worker(latticejson, columns, output_format)
+        try:
+            list(map(_write_variant, tasks))
+        finally:
+            _init_worker(None, None, None)
+        return paths
+
+    from multiprocessing import Pool
+
+    # the writer is set up once per worker process instead of once per variant
+    jobs = min(jobs, len(tasks))
+    chunksize = max(1, len(tasks) // (4 * jobs))
+    initargs = latticejson, columns, output_format
+    with Pool(jobs, initializer=_init_worker, initargs=initargs) as pool:
+        pool.map(_write_variant, tasks, chunksize=chunksize)
+    return paths
+
+
+_writer = None
+
+
+def _init_worker(latticejson, columns, output_format):
+    global _writer
+    if latticejson is None:
+        _writer = None
+    else:
+        _writer = VariantWriter(latticejson, columns, output_format)
+
+
+def _write_variant(task):
+    from .io import atomic_open
+
+    path, values = task
+    with atomic_open(path) as file:
+        _writer.write(file, values)
+
+
+def _number(string):
+    try:
+        return int(string)
+    except ValueError:
+        return float(string)
+
+
+def _is_number(string):
+    try:
+        _number(string)
+    except ValueError:
+        return False
+    return True
+
+
+def _python_value(value):
+    # NumPy scalars would otherwise be formatted by their own rules
+    return value.item() if hasattr(value, "item") else value
@@ -0,0 +1,256 @@
+"""A long-running server which keeps the parsers, the validator and converted files warm.
+
+The server listens on a Unix domain socket and speaks a JSON lines protocol: each
+request is a job like in the manifest of `batch.run_job` plus an optional "id", each
+response a JSON object {"id": ..., "ok": true, "message": ...} or {"id": ..., "ok":
+false, "error": ...}. Besides the actions of `batch`, the server knows "load", which
+returns the LatticeJSON dict as "result", "ping" and "stop".
+
+Each connection is read by its own thread and the jobs are run by a shared pool of
+worker threads, so the responses of one connection may arrive out of order. Relative
+paths are resolved against the working directory of the server, `Client` sends
+absolute paths.
+"""
+
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+from urllib.parse import urlparse
+
+from .__about__ import __version__
+from .cache import CACHE_DIR, MemoryCache
+
+ACTIONS = "convert", "validate", "format", "load", "ping", "stop"
+
+
+def socket_path() -> Path:
+    """Return the default socket path: `$LATTICEJSON_SOCKET` or in the cache dir."""
+    return Path(os.environ.get("LATTICEJSON_SOCKET") or CACHE_DIR / "server.sock")
+
+
+class Server:
+    """Runs the jobs sent to a Unix domain socket.
+
+    The socket is bound on construction, so clients may connect right away, and the
+    connections are accepted once `serve_forever` runs.
+
+    :param path: Path of the socket, defaults to `socket_path()`.
+    :param int workers: Number of worker threads, defaults to the number of CPUs.
+    :param int cache_size: Maximum number of converted files kept in memory.
+    :raises RuntimeError: Is raised if another server listens on `path`.
+    """
+
+    def __init__(self, path=None, workers: int = None, cache_size=256):
+        self.path = Path(path or socket_path())
+        self.cache = MemoryCache(cache_size)
+        self.executor = ThreadPoolExecutor(workers or os.cpu_count() or 1)
+        self._stop = threading.Event()
+        self._listener, self._inode = _listen(self.path)
+
+    def serve_forever(self, poll_interval=0.1):
+        """Accept connections until `shutdown` is called or a "stop" job arrives."""
+        self._listener.settimeout(poll_interval)
+        try:
+            while not self._stop.is_set():
+                try:
+                    connection, _ = self._listener.accept()
+                except socket.timeout:
+                    continue
+                connection.settimeout(None)
+                thread = threading.Thread(target=self._handle, args=(connection,))
+                thread.daemon = True
+                thread.start()
+        finally:
+            self.close()
+
+    def shutdown(self):
+        """Stop `serve_forever` after the current poll interval."""
+        self._stop.set()
+
+    def close(self):
+        """Close the socket and wait for the running jobs."""
+        self._listener.close()
+        try:
+            if os.stat(self.path).st_ino == self._inode:  # not replaced by a new server
+                self.path.unlink()
+        except FileNotFoundError:
+            pass
+        self.executor.shutdown()
+
+    def respond(self, line: bytes) -> bytes:
+        """Run the job encoded in `line` and return the encoded response."""
+        job_id = None
+        try:
+            job = json.loads(line)
+            job_id = job.get("id")
+            response = self.run(job)
+            response["ok"] = True
+        except Exception as error:
+            response = dict(ok=False, error=str(error) or type(error).__name__)
+        response["id"] = job_id
+        return (json.dumps(response) + "\n").encode()
+
+    def run(self, job: dict) -> dict:
+        """Run a single job and return the response without "id" and "ok".
+
+        :raises ValueError: Is raised for unknown actions.
+        """
+        action = job.get("action")
+        if action == "load":
+            from . import io
+            from .utils import expand_repetitions
+
+            # share the cache entries with the compact dicts of the other actions
+            latticejson = io.load(
+                job["input"],
+                job.get("from"),
+                job.get("validate", True),
+                self.cache,
+                compact=True,
+            )
+            return dict(result=expand_repetitions(latticejson))
+        elif action == "ping":
+            return dict(message=f"latticejson {__version__}")
+        elif action == "stop":
+            self.shutdown()
+            return dict(message="stopping server")
+        elif action is not None and action not in ACTIONS:
+            raise ValueError(f"Unknown action '{action}', expected one of {ACTIONS}.")
+
+        from .batch import run_job
+
+        return dict(message=run_job(job, self.cache))
+
+    def _handle(self, connection):
+        lock = threading.Lock()
+        futures = []
+        with connection, connection.makefile("rb") as reader:
+            for line in reader:
+                if not line.strip():
+                    continue
+                try:
+                    futures.append(
+                        self.executor.submit(self._reply, connection, lock, line)
+                    )
+                except RuntimeError:  # the executor was shut down
+                    break
+            wait(futures)
+
+    def _reply(self, connection, lock, line):
+        response = self.respond(line)
+        with lock:
+            try:
+                connection.sendall(response)
+            except OSError:  # the client went away
+                pass
+
+
+class Client:
+    """Connection to a running server.
+
+    :param path: Path of the socket, defaults to `socket_path()`.
+    :raises OSError: Is raised if no server listens on `path`.
+    """
+
+    def __init__(self, path=None):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._socket.connect(str(path or socket_path()))
+        except OSError:
+            self._socket.close()
+            raise
+        self._reader = self._socket.makefile("rb")
+        self._next_id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._reader.close()
+        self._socket.close()
+
+    def request(self, job: dict) -> dict:
+        """Send a single job and return the response."""
+        return next(self.map([job]))[1]
+
+    def map(self, jobs: Iterable[dict]) -> Iterator[Tuple[dict, dict]]:
+        """Send all `jobs` at once and yield each job with its response.
+
+        The pairs are yielded in the order in which the server finished the jobs.
+        Relative paths of "input" and "output" are made absolute before sending.
+        """
+        pending = {}
+        for job in jobs:
+            self._next_id += 1
+            pending[self._next_id] = job
+            request = dict(_absolute_paths(job), id=self._next_id)
+            self._socket.sendall((json.dumps(request) + "\n").encode())
+
+        while pending:
+            line = self._reader.readline()
+            if not line:
+                raise ConnectionError("The server closed the connection.")
+            response = json.loads(line)
+            yield pending.pop(response["id"]), response
+
+
+def connect(path=None) -> Optional[Client]:
+    """Return a `Client` of the server listening on `path` or None if none is running.
+
+    :param path: Path of the socket, defaults to `socket_path()`.
+    """
+    path = Path(path or socket_path())
+    if not hasattr(socket, "AF_UNIX") or not path.exists():
+        return None
+    try:
+        return Client(path)
+    except OSError:  # e.g. a socket left over by a killed server
+        return None
+
+
+def _listen(path):
+    client = connect(path)
+    if client is not None:
+        client.close()
+        raise RuntimeError(f"A server is already listening on {path}.")
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        path.unlink()  # left over by a server which was killed
+    except FileNotFoundError:
+        pass
+    # jobs write files, so only the owner may connect: bind within a private directory
+    # and move the socket to `path` once it is restricted, so that no other user can
+    # connect in between
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    directory = tempfile.mkdtemp(prefix=".", dir=path.parent)  # short, see AF_UNIX
+    try:
+        private_path = os.path.join(directory, "s")
+        listener.bind(private_path)
+        os.chmod(private_path, 0o600)
+        os.replace(private_path, path)
+    except BaseException:
+        listener.close()
+        raise
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    listener.listen()
+    return listener, os.stat(path).st_ino
+
+
+def _absolute_paths(job):
+    job = dict(job)
+    for key in "input", "output":
+        value = job.get(key)
+        if value is not None and urlparse(str(value)).scheme == "":
+            job[key] = os.path.abspath(value)
+    return job
@@ -0,0 +1,255 @@
+"""Statement-at-a-time reader for elegant and MADX lattice files.
+
+The file is consumed in chunks and split at statement boundaries. Every statement is
+parsed on its own, so that huge lattice files can be processed with bounded memory
+before they have been read completely.
+"""
+
+import re
+from types import MappingProxyType
+from typing import IO, Iterable, Iterator, Tuple
+
+from .parse import (
+    ArithmeticTransformer,
+    ElegantTransformer,
+    MADXTransformer,
+    _build_parser,
+)
+
+CHUNK_SIZE = 2**16
+_MADX_TOKEN = re.compile(
+    r'"(?:[^"\\]|\\.)*"|(?:!|//)[^\n]*\n|/\*.*?\*/|;|"|!|//|/\*', re.DOTALL
+)
+_MADX_COMMENT = re.compile(r"(?:!|//)[^\n]*|/\*.*?\*/", re.DOTALL)
+_MADX_SEQUENCE = re.compile(r"\s*[\w.]+\s*:\s*sequence\b", re.IGNORECASE)
+_MADX_ENDSEQUENCE = re.compile(r"\s*endsequence\s*;", re.IGNORECASE)
+
+
+def iter_events(file: IO[str], input_format: str, chunk_size=CHUNK_SIZE):
+    """Parse an elegant or MADX lattice file statement by statement.
+
+    The yielded events are tuples of the form ("element", name, (type, attributes)),
+    ("lattice", name, children), ("assignment", name, value) or ("command", items).
+    Objects which are generated implicitly (e.g. reversed lattices) are yielded as
+    separate events.
+
+    The memory does not grow with the attributes of the elements: the parser only
+    keeps the name and type of each element, plus the attributes of bends with
+    different edge angles, which are needed to reverse them. Commands are not kept at
+    all. The lattices and variables are kept in full, because later statements may
+    reverse lattices or refer to variables.
+
+    :param file: Text file object of the lattice file.
+    :param str input_format: Either "lte" or "madx".
+    :param int chunk_size: Number of characters which are read at once.
+    :return: Iterator over the events.
+    """
+    if input_format == "lte":
+        grammar_file, transformer = "elegant.lark", ElegantTransformer()
+        statements = iter_elegant_statements(_read_chunks(file, chunk_size))
+    elif input_format == "madx":
+        grammar_file, transformer = "madx.lark", MADXTransformer()
+        statements = iter_madx_statements(_read_chunks(file, chunk_size))
+    else:
+        raise NotImplementedError(f"Unknown lattice file format: {input_format}.")
+
+    parser = _build_parser(grammar_file, transformer, maybe_placeholders=True)
+    events = []
+    transformer.reset()
+    _record(transformer, events)
+    for statement in statements:
+        if statement.strip():
+            parser.parse(statement)
+            yield from events
+            events.clear()
+
+
+def fold(events: Iterable[Tuple]) -> dict:
+    """Fold events into a dict like the one returned by `parse.parse_elegant`."""
+    result = dict(
+        elements={},
+        lattices={},
+        commands=[],
+        variables=ArithmeticTransformer.CONSTANTS.copy(),
+    )
+    containers = dict(
+        element=result["elements"],
+        lattice=result["lattices"],
+        assignment=result["variables"],
+    )
+    for kind, *args in events:
+        if kind == "command":
+            result["commands"].append(args[0])
+        else:
+            name, value = args
+            containers[kind][name] = value
+    return result
+
+
+def load(file: IO[str], input_format: str, validate=True) -> dict:
+    """Deserialize an elegant or MADX lattice file statement by statement.
+
+    :param file: Text file object of the lattice file.
+    :param str input_format: Either "lte" or "madx".
+    :param bool validate: Whether to validate the result.
+    :return dict: LatticeJSON-compliant dictionary.
+    """
+    from .convert import FROM_ELEGANT, FROM_MADX, _map_names
+    from .validate import validate as _validate
+
+    name_map = FROM_ELEGANT if input_format == "lte" else FROM_MADX
+    latticejson = _map_names(fold(iter_events(file, input_format)), name_map)
+    if validate:
+        _validate(latticejson)
+    return latticejson
+
+
+def iter_elegant_statements(chunks: Iterable[str]) -> Iterator[str]:
+    """Split the content of an elegant lattice file into statements.
+
+    Statements are terminated by newlines unless the line ends with the continuation
+    character "&". Every yielded statement ends with a newline.
+    """
+    lines = []
+    for line in _iter_lines(chunks):
+        lines.append(line)
+        code = line.rstrip(" \t\f\r\n")
+        if not code.endswith("&") or _elegant_comment_start(code) != -1:
+            yield "".join(lines)
+            lines.clear()
+
+    if lines:
+        yield "".join(lines)
+
+
+def iter_madx_statements(chunks: Iterable[str]) -> Iterator[str]:
+    """Split the content of a MADX lattice file into statements.
+
+    Statements are terminated by ";", which is ignored within strings and comments. A
+    sequence including all of its elements and the ENDSEQUENCE is a single statement.
+    """
+    sequence = []
+    for statement in _iter_madx_raw_statements(chunks):
+        if not sequence:
+            if "sequence" in statement.lower() and _MADX_SEQUENCE.match(
+                _MADX_COMMENT.sub("", statement)
+            ):
+                sequence.append(statement)
+            else:
+                yield statement
+        else:
+            sequence.append(statement)
+            if _MADX_ENDSEQUENCE.match(_MADX_COMMENT.sub("", statement)):
+                yield "".join(sequence)
+                sequence.clear()
+
+    if sequence:
+        yield "".join(sequence)
+
+
+def _iter_madx_raw_statements(chunks):
+    buffer = ""
+    start = position = 0
+    for chunk in chunks:
+        buffer = buffer[start:] + chunk
+        position -= start
+        start = 0
+        while True:
+            match = _MADX_TOKEN.search(buffer, position)
+            if match is None:  # a trailing "/" may be the start of a comment
+                position = len(buffer) - buffer.endswith("/")
+                break
+
+            token = match.group()
+            if token == ";":
+                yield buffer[start : match.end()]
+                start = position = match.end()
+            elif token in ('"', "!", "//", "/*"):  # incomplete, need more input
+                position = match.start()
+                break
+            else:
+                position = match.end()
+
+    if buffer[start:].strip():
+        yield buffer[start:]
+
+
+def _elegant_comment_start(line):
+    if '"' not in line:
+        return line.find("!")
+
+    in_string = False
+    for i, char in enumerate(line):
+        if char == '"':
+            in_string = not in_string
+        elif char == "!" and not in_string:
+            return i
+    return -1
+
+
+def _iter_lines(chunks):
+    rest = ""
+    for chunk in chunks:
+        *lines, rest = (rest + chunk).split("\n")
+        for line in lines:
+            yield line + "\n"
+    if rest:
+        yield rest + "\n"
+
+
+def _read_chunks(file, chunk_size):
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+class _RecordingDict(dict):
+    def __init__(self, kind, events, *args):
+        super().__init__(*args)
+        self.kind = kind
+        self.events = events
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.events.append((self.kind, key, value))
+
+
+class _ElementIndex(_RecordingDict):
+    """Records the element definitions, but only keeps what `reverse_object` needs."""
+
+    def __init__(self, events, asymmetric_types):
+        super().__init__("element", events)
+        self.asymmetric_types = asymmetric_types
+        self._stubs = {}  # one shared (type, no attributes) tuple per type
+
+    def __setitem__(self, key, value):
+        self.events.append((self.kind, key, value))
+        type_, attributes = value
+        e1, e2 = attributes.get("e1"), attributes.get("e2")
+        if type_ not in self.asymmetric_types or e1 == e2:
+            value = self._stubs.setdefault(type_, (type_, MappingProxyType({})))
+        dict.__setitem__(self, key, value)
+
+
+class _RecordingList(list):
+    """Records the appended items without keeping them, the transformers never read
+    their commands back."""
+
+    def __init__(self, kind, events):
+        super().__init__()
+        self.kind = kind
+        self.events = events
+
+    def append(self, item):
+        self.events.append((self.kind, item))
+
+
+def _record(transformer, events):
+    """Let `transformer` append an event to `events` whenever it stores an object."""
+    transformer.elements = _ElementIndex(events, transformer.ASYMMETRIC_TYPES)
+    transformer.lattices = _RecordingDict("lattice", events)
+    transformer.commands = _RecordingList("command", events)
+    variables = _RecordingDict("assignment", events, transformer.variables)
+    transformer._variables = variables
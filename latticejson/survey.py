@@ -0,0 +1,108 @@
+"""Floor coordinates (survey) of a lattice.
+
+The survey is planar: x is the horizontal and z the longitudinal floor coordinate,
+theta the heading measured from the z axis. As in MAD-X, a positive bending angle
+decreases theta, so a ring of positive bends ends with theta = -2 pi. Tilts are
+ignored.
+
+NumPy is an optional dependency: `pip install latticejson[numpy]`.
+"""
+
+import numpy as np
+
+from .compiled import TYPE_CODES, CompiledLattice, compile_lattice
+
+
+class Survey:
+    """Floor coordinates at the element boundaries of a lattice.
+
+    All arrays have one entry more than the lattice has elements: the entrance of
+    each element followed by the exit of the last element.
+
+    :param s: Longitudinal positions along the beam path.
+    :param x: Horizontal floor coordinates.
+    :param z: Longitudinal floor coordinates.
+    :param theta: Headings.
+    """
+
+    def __init__(self, s: np.ndarray, x: np.ndarray, z: np.ndarray, theta: np.ndarray):
+        self.s = s
+        self.x = x
+        self.z = z
+        self.theta = theta
+
+    def __len__(self):
+        return len(self.s) - 1
+
+    def __repr__(self):
+        return f"<{type(self).__name__}: {len(self)} elements, length {self.s[-1]}>"
+
+    @property
+    def closure(self) -> np.ndarray:
+        """Deviations (x, z, theta) of the exit from the entrance of a closed ring.
+
+        The heading deviation is taken modulo 2 pi.
+        """
+        d_theta = self.theta[-1] - self.theta[0]
+        d_theta = (d_theta + np.pi) % (2 * np.pi) - np.pi
+        return np.array([self.x[-1] - self.x[0], self.z[-1] - self.z[0], d_theta])
+
+
+def survey(
+    latticejson: dict, root: str = None, x0=0.0, z0=0.0, theta0=0.0, cache=True
+) -> Survey:
+    """Compute the floor coordinates of the lattice `root`.
+
+    The lattice is flattened with `compile_lattice`, whose result is cached per
+    LatticeJSON dict. Pass `cache=False` when the dict was modified in place, e.g.
+    by `ElementTable.write_back`.
+
+    :param dict latticejson: LatticeJSON dict
+    :param str root: Name of the lattice, defaults to the root lattice.
+    :param float x0: Horizontal floor coordinate of the entrance.
+    :param float z0: Longitudinal floor coordinate of the entrance.
+    :param float theta0: Heading at the entrance.
+    :param bool cache: Whether to use the cache of `compile_lattice`.
+    """
+    compiled = compile_lattice(latticejson, root, cache)
+    return survey_compiled(compiled, x0, z0, theta0)
+
+
+def survey_compiled(compiled: CompiledLattice, x0=0.0, z0=0.0, theta0=0.0) -> Survey:
+    """Compute the floor coordinates of a compiled lattice, see `survey`."""
+    length = compiled.columns.get("length")
+    lengths = np.zeros(len(compiled.names)) if length is None else np.nan_to_num(length)
+    angles = bending_angles(compiled, lengths)[compiled.indices]
+    lengths = lengths[compiled.indices]
+
+    theta = np.empty(len(compiled) + 1)
+    theta[0] = theta0
+    np.cumsum(-angles, out=theta[1:])
+    theta[1:] += theta0
+
+    # a bend is a circular arc, its chord points along the mean heading
+    chords = lengths * np.sinc(angles / (2 * np.pi))
+    headings = theta[:-1] - angles / 2
+    x, z, s = np.empty_like(theta), np.empty_like(theta), np.empty_like(theta)
+    x[0], z[0], s[0] = x0, z0, 0
+    np.cumsum(chords * np.sin(headings), out=x[1:])
+    np.cumsum(chords * np.cos(headings), out=z[1:])
+    np.cumsum(lengths, out=s[1:])
+    x[1:] += x0
+    z[1:] += z0
+    return Survey(s, x, z, theta)
+
+
+def bending_angles(compiled: CompiledLattice, lengths: np.ndarray) -> np.ndarray:
+    """Return the bending angle of each element definition of a compiled lattice.
+
+    Dipoles without an angle use length / radius, all other elements do not bend.
+    """
+    dipoles = compiled.type_codes == TYPE_CODES["Dipole"]
+    no_angle = np.full(len(compiled.names), np.nan)
+    angles = np.where(dipoles, compiled.columns.get("angle", no_angle), np.nan)
+    radius = compiled.columns.get("radius")
+    if radius is not None:
+        use_radius = dipoles & np.isnan(angles) & ~np.isnan(radius) & (radius != 0)
+        angles[use_radius] = lengths[use_radius] / radius[use_radius]
+    return np.nan_to_num(angles)
@@ -0,0 +1,145 @@
+"""Columnar view of the elements of a LatticeJSON dict.
+
+NumPy is an optional dependency: `pip install latticejson[numpy]`.
+"""
+
+from collections.abc import Mapping
+from typing import Callable, Dict, List
+
+import numpy as np
+
+
+class ElementTable(Mapping):
+    """Elements of a LatticeJSON dict grouped by type into NumPy columns.
+
+    Edits are made on the columns and written to the LatticeJSON dict with
+    `write_back`, which only touches the values that actually changed.
+
+    :param dict latticejson: LatticeJSON dict
+    """
+
+    def __init__(self, latticejson: dict):
+        self.latticejson = latticejson
+        names_by_type = {}
+        for name, (type_, _) in latticejson["elements"].items():
+            names_by_type.setdefault(type_, []).append(name)
+        elements = latticejson["elements"]
+        self.groups: Dict[str, ElementGroup] = {
+            type_: ElementGroup(type_, names, [elements[x][1] for x in names])
+            for type_, names in names_by_type.items()
+        }
+
+    def __getitem__(self, element_type: str) -> "ElementGroup":
+        return self.groups[element_type]
+
+    def __iter__(self):
+        return iter(self.groups)
+
+    def __len__(self):
+        return len(self.groups)
+
+    def write_back(self) -> int:
+        """Write changed values to the LatticeJSON dict.
+
+        :return: Number of changed attribute values.
+        """
+        elements = self.latticejson["elements"]
+        return sum(group.write_back(elements) for group in self.groups.values())
+
+
+class ElementGroup:
+    """Numeric attributes of all elements of one type.
+
+    Each attribute is a float64 column with NaN for elements which do not define it.
+
+    :param str element_type: LatticeJSON element type
+    :param names: Element names
+    :type names: List[str]
+    :param attributes: Attribute dicts of the elements
+    :type attributes: List[dict]
+    """
+
+    def __init__(self, element_type: str, names: List[str], attributes: List[dict]):
+        self.type = element_type
+        self.names = names
+        self.index = {name: row for row, name in enumerate(names)}
+        self.columns: Dict[str, np.ndarray] = {}
+        self.present: Dict[str, np.ndarray] = {}
+        for row, attrs in enumerate(attributes):
+            for key, value in attrs.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    if key not in self.columns:
+                        self._add_column(key)
+                    self.columns[key][row] = value
+                    self.present[key][row] = True
+        self._snapshot()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.type}: {len(self)} elements>"
+
+    def __getitem__(self, attribute: str) -> np.ndarray:
+        return self.columns[attribute]
+
+    def __setitem__(self, attribute: str, values):
+        self.update(attribute, values)
+
+    def select(self, mask) -> List[str]:
+        """Return the names of the elements where `mask` is true."""
+        return [self.names[row] for row in np.flatnonzero(mask)]
+
+    def update(self, attribute: str, values, where=None):
+        """Set `attribute` to `values` for the elements where `where` is true.
+
+        :param str attribute: Attribute name, which is added if it is new.
+        :param values: Scalar or array, which is broadcast to the column.
+        :param where: Boolean mask of the elements to update, defaults to all.
+        """
+        if attribute not in self.columns:
+            self._add_column(attribute)
+        where = True if where is None else np.asarray(where, dtype=bool)
+        np.copyto(self.columns[attribute], values, where=where)
+        self.present[attribute] |= where
+
+    def scale(self, attribute: str, factor, where=None):
+        """Multiply the defined values of `attribute` by `factor`."""
+        present = self.present[attribute]
+        where = present if where is None else present & where
+        self.update(attribute, self.columns[attribute] * factor, where)
+
+    def aggregate(self, attribute: str, function: Callable = np.sum, where=None):
+        """Apply `function` to the defined values of `attribute`, e.g. `np.max`."""
+        present = self.present[attribute]
+        where = present if where is None else present & where
+        return function(self.columns[attribute][where])
+
+    def write_back(self, elements: dict) -> int:
+        """Write changed values to the `elements` of a LatticeJSON dict."""
+        n_changed = 0
+        for key, column in self.columns.items():
+            original, original_present = self._original.get(key, (None, None))
+            present = self.present[key]
+            if original is None:
+                changed = present
+            else:
+                same = (column == original) | np.isnan(column) & np.isnan(original)
+                changed = present & ~(same & original_present)
+
+            rows = np.flatnonzero(changed)
+            for row, value in zip(rows.tolist(), column[rows].tolist()):
+                elements[self.names[row]][1][key] = value
+            n_changed += len(rows)
+        self._snapshot()
+        return n_changed
+
+    def _add_column(self, key):
+        self.columns[key] = np.full(len(self.names), np.nan)
+        self.present[key] = np.zeros(len(self.names), dtype=bool)
+
+    def _snapshot(self):
+        self._original = {
+            key: (column.copy(), self.present[key].copy())
+            for key, column in self.columns.items()
+        }
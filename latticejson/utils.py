@@ -1,42 +1,217 @@
-from itertools import chain
+from itertools import chain, repeat
+from typing import Iterable, Iterator, List, Set
 from warnings import warn
 
 
-def tree(latticejson, name=None):
+class Repeat:
+    """Repetition of lattice items, e.g. `500*(cell)`, which is kept compact.
+
+    Lattices loaded with `compact=True`, e.g. `io.load(path, compact=True)`, can
+    contain `Repeat` items instead of the expanded sequence. Use `iter_children` to
+    iterate the expanded names and `expand_repetitions` to get plain lists.
+
+    :param int count: Number of repetitions.
+    :param items: Names or nested `Repeat` objects.
+    """
+
+    __slots__ = "count", "items"
+
+    def __init__(self, count: int, items: Iterable):
+        self.count = count
+        self.items = tuple(items)
+
+    def __eq__(self, other):
+        if not isinstance(other, Repeat):
+            return NotImplemented
+        return self.count == other.count and self.items == other.items
+
+    def __hash__(self):
+        return hash((self.count, self.items))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.count}, {self.items})"
+
+    def __getstate__(self):
+        return self.count, self.items
+
+    def __setstate__(self, state):
+        self.count, self.items = state
+
+
+def iter_children(children: Iterable) -> Iterator[str]:
+    """Yield the names of `children` with all repetitions expanded."""
+    return _flatten(children)
+
+
+def unique_children(children: Iterable) -> Iterator[str]:
+    """Yield the names of `children` without expanding repetitions."""
+    stack = [iter(children)]
+    while stack:
+        for child in stack[-1]:
+            if isinstance(child, Repeat):
+                stack.append(iter(child.items))
+                break
+            yield child
+        else:
+            stack.pop()
+
+
+def traverse(lattices: dict, roots: Iterable[str], visited: set = None, elements=True):
+    """Yield every object reachable from `roots` once, lattices after their children.
+
+    The traversal uses an explicit stack, so the depth of the lattice hierarchy is not
+    limited by the recursion limit. Elements are yielded in order of their first
+    occurrence.
+
+    :param dict lattices: Lattices of a LatticeJSON dict.
+    :param roots: Names of the objects to start from.
+    :param set visited: Names which are skipped, is updated in place.
+    :param bool elements: Whether to yield elements or only lattices.
+    :raises ValueError: If a lattice contains itself.
+    """
+    visited = set() if visited is None else visited
+    for root in roots:
+        if root in visited:
+            continue
+
+        if root not in lattices:
+            if elements:
+                visited.add(root)
+                yield root
+            continue
+
+        visited.add(root)
+        path = {root}
+        stack = [(root, unique_children(lattices[root]))]
+        while stack:
+            name, children = stack[-1]
+            for child in children:
+                if child not in lattices:
+                    if elements and child not in visited:
+                        visited.add(child)
+                        yield child
+                elif child not in visited:
+                    visited.add(child)
+                    path.add(child)
+                    stack.append((child, unique_children(lattices[child])))
+                    break
+                elif child in path:
+                    raise ValueError(f"Lattice '{child}' contains itself.")
+            else:
+                stack.pop()
+                path.remove(name)
+                yield name
+
+
+def topological_order(latticejson, root=None) -> List[str]:
+    """Return the lattices reachable from `root`, each after all its sub-lattices."""
     lattices = latticejson["lattices"]
+    root = latticejson["root"] if root is None else root
+    return list(traverse(lattices, [root], elements=False))
 
-    def _tree(name, prefix=""):
-        string = f"{name}\n"
-        if name in lattices:
-            *other, last = lattices[name]
-            for child in other:
-                string += f"{prefix}├─── {_tree(child, prefix + '│   ')}"
-            string += f"{prefix}└─── {_tree(last, prefix + '    ')}"
-        return string
 
-    return _tree(latticejson["root"] if name is None else name)
+def reachable(latticejson, root=None) -> Set[str]:
+    """Return the names of all objects reachable from `root`."""
+    root = latticejson["root"] if root is None else root
+    visited = set()
+    for _ in traverse(latticejson["lattices"], [root], visited):
+        pass
+    return visited
 
 
-def sort_lattices(latticejson, root=None, keep_unused=False):
-    """Returns a sorted dict of lattice objects."""
+def has_repetitions(latticejson) -> bool:
+    """Whether any lattice of `latticejson` contains `Repeat` items."""
+    return any(
+        isinstance(child, Repeat)
+        for children in latticejson["lattices"].values()
+        for child in children
+    )
+
+
+def expand_repetitions(latticejson, sublattices=False):
+    """Return a copy of `latticejson` with plain lists of names as lattices.
+
+    :param bool sublattices: Instead of repeating the items of a repetition,
+        generate a sub-lattice for them which is repeated.
+    """
+    if not has_repetitions(latticejson):
+        return latticejson
+
+    lattices = {}
+    generated = {}
+    taken = set(latticejson["elements"]).union(latticejson["lattices"])
+
+    def _expand(name, children):
+        expanded = []
+        for child in children:
+            if not isinstance(child, Repeat):
+                expanded.append(child)
+            elif sublattices and len(child.items) > 1:
+                sublattice_name = f"{name}_{len(generated)}"
+                while sublattice_name in taken:
+                    sublattice_name += "_"
+                taken.add(sublattice_name)
+                generated[sublattice_name] = _expand(sublattice_name, child.items)
+                expanded.extend(child.count * [sublattice_name])
+            else:
+                for _ in range(child.count):
+                    expanded.extend(_expand(name, child.items))
+        return expanded
+
+    for name, children in latticejson["lattices"].items():
+        lattices[name] = _expand(name, children)
+    lattices.update(generated)
+    latticejson_new = latticejson.copy()
+    latticejson_new["lattices"] = lattices
+    return latticejson_new
+
+
+def format_children(children) -> str:
+    """Format the children of a lattice in the arrangement syntax of elegant/MADX."""
+    return ", ".join(
+        (
+            f"{child.count}*({format_children(child.items)})"
+            if isinstance(child, Repeat)
+            else child
+        )
+        for child in children
+    )
+
+
+def tree(latticejson, name=None):
     lattices = latticejson["lattices"]
-    lattices_set = set(lattices)
-    lattices_sorted = {}
+    lines = []
+    stack = [(latticejson["root"] if name is None else name, "", "")]
+    while stack:
+        node, prefix, line_prefix = stack.pop()
+        if isinstance(node, Repeat):
+            lines.append(f"{line_prefix}{node.count}*\n")
+            children = node.items
+        else:
+            lines.append(f"{line_prefix}{node}\n")
+            children = lattices.get(node)
+        if children:
+            *other, last = children
+            stack.append((last, prefix + "    ", prefix + "└─── "))
+            for child in reversed(other):
+                stack.append((child, prefix + "│   ", prefix + "├─── "))
+    return "".join(lines)
 
-    def _sort_lattices(name):
-        lattices_set.remove(name)
-        for child in lattices[name]:
-            if child in lattices_set:
-                _sort_lattices(child)
-        lattices_sorted[name] = lattices[name]
 
-    _sort_lattices(root if root is not None else latticejson["root"])
+def sort_lattices(latticejson, root=None, keep_unused=False):
+    """Returns a sorted dict of lattice objects."""
+    lattices = latticejson["lattices"]
+    roots = [root if root is not None else latticejson["root"]]
     if keep_unused:
-        while len(lattices_set) > 0:
-            _sort_lattices(lattices_set.pop())
-    else:
-        for lattice in lattices_set:
-            warn(f"Discard unused lattice '{lattice}'.")
+        roots.extend(lattices)
+    visited = set()
+    lattices_sorted = {
+        name: lattices[name] for name in traverse(lattices, roots, visited, False)
+    }
+    if not keep_unused:
+        for lattice in lattices:
+            if lattice not in visited:
+                warn(f"Discard unused lattice '{lattice}'.")
     return lattices_sorted
 
 
@@ -46,49 +221,51 @@ def remove_unused(latticejson, root=None, warn_unused=False):
         root = latticejson["root"]
     elements = latticejson["elements"]
     lattices = latticejson["lattices"]
-    elements_set = set(elements)
-    lattices_set = set(lattices)
     elements_new = {}
     lattices_new = {}
-
-    def _remove_unused(name):
-        try:
-            elements_set.remove(name)
-        except KeyError:
-            pass
-        else:
-            elements_new[name] = elements[name]
-            return
-
-        try:
-            lattices_set.remove(name)
-        except KeyError:
-            pass
-        else:
-            lattice = lattices[name]
-            for child in lattice:
-                _remove_unused(child)
+    for name in traverse(lattices, [root]):
+        if name in lattices:
             lattices_new[name] = lattices[name]
+        elif name in elements:
+            elements_new[name] = elements[name]
 
-    _remove_unused(root)
     latticejson_new = latticejson.copy()
     latticejson_new["root"] = root
     latticejson_new["elements"] = elements_new
     latticejson_new["lattices"] = lattices_new
     if warn_unused:
-        for obj in chain(elements_set, lattices_set):
-            warn(f"Discard unused object '{obj}'.")
+        for obj in chain(elements, lattices):
+            if obj not in elements_new and obj not in lattices_new:
+                warn(f"Discard unused object '{obj}'.")
     return latticejson_new
 
 
 def flattened_element_sequence(latticejson, start_lattice=None):
     "Returns a flattened generator of the element names in the physical order."
+    lattices = latticejson["lattices"]
+    start = start_lattice if start_lattice is not None else latticejson["root"]
+    return _flatten(lattices[start], lattices)
 
-    def _helper(lattice_name, lattices=latticejson["lattices"]):
-        for child in lattices[lattice_name]:
-            if child in lattices:
-                yield from _helper(child)
-            else:
-                yield child
 
-    return _helper(start_lattice if start_lattice is not None else latticejson["root"])
+def _flatten(children, lattices=None):
+    # explicit stack of iterators: yielding an element costs O(1), not O(depth)
+    stack = [iter(children)]
+    path = [None]  # lattice names of the stack entries, None for repetitions
+    expanded = set()
+    while stack:
+        for child in stack[-1]:
+            if isinstance(child, Repeat):
+                stack.append(chain.from_iterable(repeat(child.items, child.count)))
+                path.append(None)
+                break
+            if lattices is not None and child in lattices:
+                if child in expanded:
+                    raise ValueError(f"Lattice '{child}' contains itself.")
+                stack.append(iter(lattices[child]))
+                path.append(child)
+                expanded.add(child)
+                break
+            yield child
+        else:
+            stack.pop()
+            expanded.discard(path.pop())
@@ -1,10 +1,11 @@
 import json
+from functools import lru_cache
 from pathlib import Path
 
-import fastjsonschema
 from packaging import version as _version
 
 from .exceptions import IncompatibleVersionError, UndefinedObjectError
+from .utils import has_repetitions, unique_children
 
 parse_version = _version.parse
 schema_path = Path(__file__).resolve().parent / "schema.json"
@@ -18,6 +19,13 @@ def validate_file(path: str):
 
 
 def validate(data):
+    validate_version(data)
+    validate_syntax(data)
+    validate_defined_objects(data)
+
+
+def validate_version(data):
+    """Validate whether the version of `data` is compatible with the schema."""
     if not "version" in data:
         raise Exception("Unknown LatticeJSON version.")
 
@@ -28,11 +36,22 @@ def validate(data):
     if version.major < schema_version.major:
         raise IncompatibleVersionError("Use 'latticejson migrate' to update file.")
 
-    validate_syntax(data)
-    validate_defined_objects(data)
 
+def validate_syntax(data):
+    """Validate `data` against the LatticeJSON schema."""
+    if has_repetitions(data):  # the schema only checks the names
+        lattices = data["lattices"]
+        data = data.copy()
+        data["lattices"] = {k: list(unique_children(v)) for k, v in lattices.items()}
+    return _compiled_schema()(data)
+
+
+@lru_cache(maxsize=None)
+def _compiled_schema():
+    # compiling the schema is expensive, so it is deferred until first use
+    import fastjsonschema
 
-validate_syntax = fastjsonschema.compile(schema)
+    return fastjsonschema.compile(schema)
 
 
 # TODO: use this if validation fails... maybe it is better to use jsonschema instead:
@@ -50,6 +69,6 @@ def validate_defined_objects(data):
     lattices = data["lattices"]
 
     for lattice_name, lattice_tree in lattices.items():
-        for object_name in lattice_tree:
+        for object_name in unique_children(lattice_tree):
             if object_name not in elements and object_name not in lattices:
                 raise UndefinedObjectError(object_name, lattice_name)
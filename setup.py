@@ -19,6 +19,7 @@ setup(
     license=about["__license__"],
     packages=find_packages(),
     install_requires=["click>=7.0", "fastjsonschema", "lark-parser", "packaging"],
+    extras_require={"numpy": ["numpy"]},
     test_requires=["pytest"],
     python_requires=">=3.6",
     include_package_data=True,
@@ -0,0 +1,30 @@
+import json
+
+
+def test_batch(base_dir, tmp_path):
+    from click.testing import CliRunner
+
+    from latticejson.cli import cli
+
+    jobs = [
+        {"input": str(base_dir / "fodo.lte"), "output": str(tmp_path / "fodo.json")},
+        {"input": str(base_dir / "fodo.json"), "output": str(tmp_path / "fodo.madx")},
+        {"input": str(tmp_path / "fodo.json")},
+        {"input": str(tmp_path / "fodo.json"), "action": "format"},
+    ]
+    manifest = "\n".join(map(json.dumps, jobs))
+    result = CliRunner().invoke(cli, ["batch"], input=manifest)
+    assert 0 == result.exit_code, result.output
+    assert 4 == len(result.output.splitlines())
+    assert "ring" == json.loads((tmp_path / "fodo.json").read_text())["root"]
+    assert (tmp_path / "fodo.madx").read_text().startswith("TITLE")
+
+
+def test_batch_failed_job(tmp_path):
+    from click.testing import CliRunner
+
+    from latticejson.cli import cli
+
+    manifest = json.dumps({"input": str(tmp_path / "fodo.json"), "action": "unknown"})
+    result = CliRunner().invoke(cli, ["batch"], input=manifest)
+    assert 1 == result.exit_code
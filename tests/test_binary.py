@@ -0,0 +1,54 @@
+import pytest
+
+
+def test_round_trip(base_dir, fodo_json):
+    from latticejson import binary
+    from latticejson.convert import from_elegant
+    from latticejson.utils import Repeat
+
+    latticejson = from_elegant((base_dir / "fodo.lte").read_text(), compact=True)
+    latticejson["elements"]["d1"][1]["info"] = "drift"
+    for data in fodo_json, latticejson:
+        decoded = binary.loads(binary.dumps(data))
+        assert decoded == data
+        assert list(decoded) == list(data)
+        assert list(decoded["elements"]) == list(data["elements"])
+    assert isinstance(decoded["lattices"]["ring"][0], Repeat)
+
+
+def test_round_trip_big_integers(fodo_json, tmp_path):
+    import copy
+
+    from latticejson import io
+
+    latticejson = copy.deepcopy(fodo_json)
+    latticejson["elements"]["d1"][1]["length"] = 2**70
+    latticejson["elements"]["q1"][1]["k1"] = -(2**63)
+    path = tmp_path / "fodo.ljb"
+    io.save(latticejson, path)
+    decoded = io.load(path)
+    assert decoded == latticejson
+    assert type(decoded["elements"]["d1"][1]["length"]) is int
+
+
+def test_open_and_validate(fodo_json, tmp_path):
+    from latticejson import binary, io
+    from latticejson.exceptions import UndefinedObjectError
+
+    path = tmp_path / "fodo.ljb"
+    io.save(fodo_json, path)
+    assert io.load(path) == fodo_json
+
+    lattice = binary.open(path)
+    assert lattice["root"] == "ring"
+    assert "elements" not in lattice._decoded
+    assert lattice["lattices"]["cell"][:2] == ["q1", "d1"]
+    lattice.validate()
+
+    fodo_json["lattices"]["cell"].append("undefined")
+    with pytest.raises(UndefinedObjectError):
+        io.load_string(binary.dumps(fodo_json), "ljb")
+    fodo_json["lattices"]["cell"].pop()
+
+    with pytest.raises(ValueError):
+        binary.loads(b"{}")
@@ -0,0 +1,59 @@
+def test_conversion_cache(fodo_lte, tmp_path):
+    from latticejson.cache import ConversionCache
+    from latticejson.io import load_string
+
+    cache = ConversionCache(tmp_path)
+    latticejson = load_string(fodo_lte, "lte", cache=cache)
+    assert latticejson == load_string(fodo_lte, "lte", cache=cache)
+    assert latticejson == load_string(fodo_lte, "lte")
+    load_string(fodo_lte, "lte", validate=False, cache=cache)
+    stats = cache.stats()
+    assert (1, 2, 2) == (stats["hits"], stats["misses"], stats["entries"])
+
+    cache.clear()
+    assert 0 == cache.stats()["entries"]
+
+
+def test_conversion_cache_corrupt_entry(fodo_lte, tmp_path):
+    from latticejson.cache import ConversionCache
+    from latticejson.io import load_string
+
+    cache = ConversionCache(tmp_path)
+    path = tmp_path / f"{cache.key(fodo_lte, 'lte', True)}.pickle"
+    path.write_bytes(b"clatticejson.cache\nmissing\n.")  # raises AttributeError
+    assert "ring" == load_string(fodo_lte, "lte", cache=cache)["root"]
+    assert 1 == cache.misses
+    assert "ring" == cache.get(path.stem)["root"]  # replaced by the new entry
+
+
+def test_conversion_cache_eviction(fodo_lte, tmp_path):
+    import os
+
+    from latticejson.cache import ConversionCache
+    from latticejson.io import load_string
+
+    cache = ConversionCache(tmp_path)
+    first = cache.key(fodo_lte, "lte", True)
+    load_string(fodo_lte, "lte", cache=cache)
+    os.utime(tmp_path / f"{first}.pickle", (0, 0))  # make it the oldest entry
+    cache.max_size = int(1.5 * cache.stats()["size"])
+    load_string(fodo_lte + "\n", "lte", cache=cache)
+    assert 1 == cache.stats()["entries"]
+    assert cache.get(first) is None
+
+    cache.max_size = 10 * cache.max_size
+    cache.evict = None  # writes below the maximum size must not scan the directory
+    load_string(fodo_lte + "\n\n", "lte", cache=cache)
+    assert 2 == cache.stats()["entries"]
+
+
+def test_memory_cache(fodo_lte):
+    from latticejson.cache import MemoryCache
+    from latticejson.io import load_string
+
+    cache = MemoryCache(max_entries=1)
+    latticejson = load_string(fodo_lte, "lte", cache=cache)
+    assert latticejson is load_string(fodo_lte, "lte", cache=cache)
+    load_string(fodo_lte, "lte", validate=False, cache=cache)
+    stats = cache.stats()
+    assert (1, 2, 1) == (stats["hits"], stats["misses"], stats["entries"])
@@ -0,0 +1,43 @@
+import json
+import shutil
+
+from click.testing import CliRunner
+
+from latticejson.cli import cli
+
+
+def test_convert_directory(base_dir, tmp_path):
+    source = tmp_path / "source"
+    (source / "nested").mkdir(parents=True)
+    shutil.copy(base_dir / "fodo.lte", source)
+    shutil.copy(base_dir / "fodo.madx", source / "nested")
+    output = tmp_path / "output"
+
+    args = ["convert", str(source), "--to", "json", "-o", str(output), "--jobs", "2"]
+    result = CliRunner().invoke(cli, args)
+    assert 0 == result.exit_code, result.output
+    assert ["fodo.lte", "nested/fodo.madx"] == [
+        line.split()[1][len(str(source)) + 1 :] for line in result.output.splitlines()
+    ]
+    for path in output / "fodo.json", output / "nested" / "fodo.json":
+        assert "elements" in json.loads(path.read_text())
+
+    result = CliRunner().invoke(cli, ["convert", str(source), "--to", "json"])
+    assert 2 == result.exit_code
+
+    shutil.copy(base_dir / "fodo.madx", source)  # fodo.lte and fodo.madx collide
+    result = CliRunner().invoke(cli, args)
+    assert 2 == result.exit_code
+    assert "fodo.lte' and '" in result.output and "fodo.madx' would" in result.output
+
+
+def test_autoformat_parallel(base_dir, tmp_path):
+    for i in range(4):
+        shutil.copy(base_dir / "fodo.json", tmp_path / f"fodo_{i}.json")
+
+    result = CliRunner().invoke(cli, ["autoformat", str(tmp_path), "--jobs", "2"])
+    assert 0 == result.exit_code, result.output
+    assert [f"reformatted {tmp_path / f'fodo_{i}.json'}" for i in range(4)] == (
+        result.output.splitlines()
+    )
+    assert [] == list(tmp_path.glob(".*"))  # no leftover temporary files
@@ -0,0 +1,35 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+
+def test_compile_lattice(fodo_json):
+    from latticejson.compiled import clear_cache, compile_lattice
+    from latticejson.utils import flattened_element_sequence
+
+    compiled = compile_lattice(fodo_json)
+    assert compiled.element_names() == list(flattened_element_sequence(fodo_json))
+    assert compiled.indices.dtype == np.int32
+    assert compiled.length == pytest.approx(48.0)
+    assert compiled.positions[-1] == pytest.approx(48.0)
+    assert compiled.mask("Dipole").sum() == 16
+    assert np.isnan(compiled.column("k1")[1])
+    assert compiled.column("k1", 0)[:2].tolist() == [1.2, 0]
+    assert compile_lattice(fodo_json) is compiled
+    clear_cache()
+    assert compile_lattice(fodo_json) is not compiled
+
+    cell = compile_lattice(fodo_json, "cell", cache=False)
+    assert len(cell) == 9
+
+
+def test_compile_cyclic_lattice():
+    from latticejson.compiled import compile_lattice
+
+    latticejson = {
+        "root": "a",
+        "elements": {"d": ["Drift", {"length": 1}]},
+        "lattices": {"a": ["d", "b"], "b": ["d", "a"]},
+    }
+    with pytest.raises(ValueError):
+        compile_lattice(latticejson, cache=False)
@@ -0,0 +1,90 @@
+"""Stress tests which compare concurrent loads and conversions against serial runs."""
+
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+N_VARIANTS = 100
+N_THREADS = 16
+
+
+def _variants(base_dir, tmp_path):
+    lte = (base_dir / "fodo.lte").read_text()
+    madx = (base_dir / "fodo.madx").read_text()
+    madx = re.sub(r",\s*UNKNOWN_ATTR=\w+;", ";", madx)
+    paths = []
+    for i in range(N_VARIANTS):
+        path = tmp_path / f"variant_{i}.lte"  # variables differ between the variants
+        path.write_text(
+            lte.replace("K1=1.2", f"K1={1 + i / 1000}").replace(" 8 /", f" {8 + i} /")
+        )
+        paths.append(path)
+        path = tmp_path / f"variant_{i}.madx"
+        path.write_text(
+            madx.replace("QuadLength := 0.4", f"QuadLength := {0.4 + i / 1000}")
+        )
+        paths.append(path)
+    return paths
+
+
+def test_load_all(base_dir, tmp_path):
+    from latticejson.io import load, load_all, save_string
+
+    variants = _variants(base_dir, tmp_path)
+    expected = {path: load(path) for path in variants}
+    paths = variants * 5  # 1000 loads and 2000 conversions
+    with ThreadPoolExecutor(N_THREADS) as executor:
+        results = load_all(paths, executor=executor)
+        assert [expected[path] for path in paths] == results
+
+        # the conversions back to lattice files run concurrently, too
+        for output_format in "lte", "madx":
+            strings = {p: save_string(x, output_format) for p, x in expected.items()}
+            formats = [output_format] * len(paths)
+            assert [strings[p] for p in paths] == list(
+                executor.map(save_string, results, formats)
+            )
+
+
+def test_parsers_first_use(fodo_lte):
+    from latticejson.parse import ElegantTransformer, InlineParser, LazyParser
+
+    inline_parser = InlineParser(
+        "elegant.lark", ElegantTransformer, maybe_placeholders=True
+    )
+    tree_parser = LazyParser("elegant.lark", maybe_placeholders=True)
+    barrier = threading.Barrier(N_THREADS)
+
+    def parse(i):
+        barrier.wait()  # all threads build the parsers at the same time
+        text = fodo_lte.replace("K1=1.2", f"K1={i}") + "\n"
+        tree = ElegantTransformer().transform(tree_parser.parse(text))
+        return inline_parser.parse(text), tree
+
+    with ThreadPoolExecutor(N_THREADS) as executor:
+        results = list(executor.map(parse, range(N_THREADS)))
+    for i, (inline, tree) in enumerate(results):
+        assert inline == tree
+        assert i == inline["elements"]["q1"][1]["k1"]
+
+
+def test_shared_deck_parser(base_dir, tmp_path):
+    from latticejson.include import DeckParser
+    from latticejson.io import load
+
+    lines = (base_dir / "fodo.lte").read_text().splitlines(keepends=True)
+    (tmp_path / "quadrupoles.lte").write_text("".join(lines[1:4]))
+    decks = []
+    for i in range(N_THREADS):
+        deck = tmp_path / f"deck_{i}.lte"
+        deck.write_text(
+            "".join(lines[6:9]).replace(" 8 /", f" {8 + i} /")
+            + "#include: quadrupoles.lte\n"
+            + "".join(lines[9:])
+        )
+        decks.append(deck)
+
+    parser = DeckParser(cache_size=4)  # entries are evicted while others are parsed
+    with ThreadPoolExecutor(N_THREADS) as executor:
+        results = list(executor.map(parser.load, decks * 20))
+    assert [load(deck) for deck in decks] * 20 == results
@@ -12,6 +12,19 @@ def test_from_elegant(fodo_lte):
     print(latticejson)
 
 
+def test_repetitions_are_expanded():
+    import json
+
+    from latticejson.convert import from_elegant, from_madx
+
+    elegant = "d: drift, l=1\nq: quad, l=1\nc: line=(3*(d, q), 2*d)\n"
+    latticejson = from_elegant(elegant)
+    assert ["d", "q", "d", "q", "d", "q", "d", "d"] == latticejson["lattices"]["c"]
+    json.dumps(latticejson)
+    madx = "d: drift, l=1; q: quadrupole, l=1; c: line=(3*(d, q), 2*d);"
+    assert latticejson["lattices"] == from_madx(madx)["lattices"]
+
+
 def test_elegant_nested_reversed(base_dir):
     """If a lattices is reversed, its sublattices must be reversed too."""
     from latticejson.convert import from_elegant
@@ -30,6 +43,28 @@ def test_elegant_nested_reversed(base_dir):
     assert ["b" + rev, "d", "b" + rev, "d", "b", "d"] == l3
 
 
+def test_streaming_writers(fodo_json, tmp_path):
+    import io as _io
+
+    from latticejson import io
+    from latticejson.format import format_json, write_chunks
+
+    for output_format in "json", "lte", "madx":
+        chunks = list(io.iter_string(fodo_json, output_format))
+        assert len(chunks) > 1
+        file = _io.StringIO()
+        io.dump(fodo_json, file, output_format)
+        assert file.getvalue() == "".join(chunks)
+        path = tmp_path / f"fodo.{output_format}"
+        io.save(fodo_json, path)
+        assert path.read_text() == "".join(chunks)
+
+    assert "".join(io.iter_string(fodo_json, "json")) == format_json(fodo_json)
+    file = _io.StringIO()
+    write_chunks(["a", "b", "c"], file, buffer_size=2)
+    assert file.getvalue() == "abc"
+
+
 # Uncomment to test for elegant examples
 # def test_all_elegant_examples():
 #     elegant_examples = Path.home() / "Git/elegant/examples"
@@ -0,0 +1,54 @@
+import pytest
+
+
+def test_madx_deferred_expressions():
+    from latticejson.deferred import from_madx
+
+    graph = from_madx("""
+        kf := kbase * 1.1;
+        q1: quadrupole, l=0.2, k1 := kf;
+        kbase = 2;
+        q2: quadrupole, l=0.2, k1 = 2 * kbase;
+        b: sbend, l=1, angle := ang, e1 := ang / 2, e2 = 0;
+        ang = 0.1;
+        ring: line=(q1, -b, q2);
+        """)
+    elements = graph.latticejson["elements"]
+    assert elements["q1"][1]["k1"] == pytest.approx(2.2)
+    assert elements["b_reversed"][1]["e2"] == pytest.approx(0.05)
+
+    changed = graph.update(kbase=3)
+    assert changed == {("q1", "k1"): pytest.approx(3.3)}
+    assert elements["q1"][1]["k1"] == pytest.approx(3.3)
+    assert graph.variables["kf"] == pytest.approx(3.3)
+
+    assert set(graph.update({"ANG": 0.2})) == {
+        ("b", "angle"),
+        ("b", "e1"),
+        ("b_reversed", "angle"),
+        ("b_reversed", "e2"),
+    }
+    assert elements["b"][1]["e1"] == pytest.approx(0.1)
+
+    graph.update(kf=1)  # setting a deferred variable replaces its expression
+    assert graph.update(kbase=4) == {}
+    assert elements["q1"][1]["k1"] == 1
+
+
+def test_elegant_deferred_expressions(fodo_lte):
+    from latticejson.convert import from_elegant
+    from latticejson.deferred import from_elegant as deferred_from_elegant
+
+    graph = deferred_from_elegant(fodo_lte)
+    assert graph.latticejson == from_elegant(fodo_lte)
+    assert graph.update(pi=2) == {
+        ("b1", "e1"): 0.125,
+        ("b1", "angle"): 0.25,
+    }
+
+
+def test_cyclic_dependency():
+    from latticejson.deferred import from_madx
+
+    with pytest.raises(ValueError):
+        from_madx("a := b + 1; b := a + 1; d: drift, l=1; ring: line=(d);")
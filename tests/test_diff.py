@@ -0,0 +1,59 @@
+import copy
+import json
+
+from click.testing import CliRunner
+
+
+def test_diff(fodo_json):
+    from latticejson.diff import diff
+    from latticejson.utils import Repeat
+
+    b = copy.deepcopy(fodo_json)
+    assert not diff(fodo_json, b)
+    b["lattices"]["ring"] = [Repeat(6, ["cell"]), "cell", "cell"]  # same as expanded
+    assert not diff(fodo_json, b)
+
+    del b["elements"]["q2"]
+    b["elements"]["q3"] = ["Quadrupole", {"length": 0.4, "k1": -1.3}]
+    b["elements"]["q1"][1]["k1"] = 1.5
+    b["elements"]["d1"] = ["Marker", {}]
+    cell = b["lattices"]["cell"]
+    cell[4] = "q3"
+    cell.append("d1")
+    b["lattices"]["arc"] = [Repeat(2, ["cell"])]
+
+    differences = diff(fodo_json, b)
+    assert ["q3"] == differences.added_elements
+    assert ["q2"] == differences.removed_elements
+    assert {"q1", "d1"} == set(differences.changed_elements)
+    assert {"k1": (1.2, 1.5)} == differences.changed_elements["q1"]["attributes"]
+    assert ("Drift", "Marker") == differences.changed_elements["d1"]["type"]
+    assert ["arc"] == differences.added_lattices
+    assert ["cell"] == list(differences.changed_lattices)  # ring only changes content
+    assert [("replace", 4, ["q2"], ["q3"]), ("insert", 9, [], ["d1"])] == (
+        differences.changed_lattices["cell"]
+    )
+    lines = differences.format().splitlines()
+    assert "~ element q1: k1 1.2 -> 1.5 (+0.3)" in lines
+    assert "    + [9] d1" in lines
+    assert json.loads(json.dumps(differences.to_dict()))["added_lattices"] == ["arc"]
+
+
+def test_diff_cli(base_dir):
+    from latticejson.cli import cli
+
+    args = ["diff", str(base_dir / "fodo.json"), str(base_dir / "fodo.json")]
+    result = CliRunner().invoke(cli, args)
+    assert 0 == result.exit_code, result.output
+    assert "" == result.output
+
+    args = ["diff", str(base_dir / "fodo.json"), str(base_dir / "fodo.lte")]
+    result = CliRunner().invoke(cli, args)
+    assert 1 == result.exit_code
+    assert all(line.startswith("~ element b1:") for line in result.output.splitlines())
+
+    result = CliRunner().invoke(cli, [*args, "--json"])
+    assert 1 == result.exit_code
+    differences = json.loads(result.output)
+    assert {"b1"} == set(differences["changed_elements"])
+    assert {} == differences["changed_lattices"]  # a Repeat in fodo.lte is no change
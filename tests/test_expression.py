@@ -0,0 +1,58 @@
+import pytest
+
+RPN_EXPRESSIONS = (
+    "15 7 1 1 + - / 3 * 2 1 1 + + -",
+    "3 -2 +",
+    "2 10/",
+    "1 atan 4 *",
+    "x 2 * sin",
+    "1.e-3",
+    "+1",
+)
+ARITHMETIC_EXPRESSIONS = (
+    "1 + 2 * 3",
+    "4 ** 3 ** 2 + 1",
+    "-+-4 / (-2 + -3)",
+    "-.02e+2 / +4e1 ** 2.2e-1",
+    "x ^ 2 + arctan(x)",
+)
+
+
+@pytest.mark.parametrize("rpn", [True, False])
+def test_compiled_expressions(rpn):
+    from latticejson.expression import compile_arithmetic, compile_rpn
+    from latticejson.parse import (
+        ARITHMETIC_PARSER,
+        RPN_PARSER,
+        ArithmeticTransformer,
+        RPNTransformer,
+    )
+
+    compile_ = compile_rpn if rpn else compile_arithmetic
+    parser = RPN_PARSER if rpn else ARITHMETIC_PARSER
+    transformer = RPNTransformer() if rpn else ArithmeticTransformer()
+    transformer.variables["x"] = 0.3
+    for string in RPN_EXPRESSIONS if rpn else ARITHMETIC_EXPRESSIONS:
+        expected = transformer.transform(parser.parse(string))
+        assert expected == compile_(string)(transformer.variables)
+
+
+def test_plain_strings():
+    from latticejson.expression import compile_rpn
+
+    for string in "", "2x", "a b", "1 2 3", "file.sdds", "1 +":
+        assert compile_rpn(string) is None
+
+    assert "undefined" == compile_rpn("undefined")({})
+
+
+def test_memoization():
+    from latticejson.expression import compile_rpn
+
+    variables = {"a": 1.0}
+    expression = compile_rpn("a 2 * sto b")
+    assert expression is compile_rpn("a 2 * sto b")
+    assert ("a",) == expression.names
+    assert 2 == expression(variables) == variables["b"]
+    variables["a"] = 2.0
+    assert 4 == expression(variables) == variables["b"]
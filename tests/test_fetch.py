@@ -0,0 +1,88 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import pytest
+
+
+@pytest.fixture
+def registry(base_dir):
+    """Local stand-in of a lattice registry which answers with ETags."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def setup(self):
+            super().setup()
+            server.connections += 1
+
+        def do_GET(self):
+            path = base_dir / self.path.lstrip("/")
+            if not path.is_file():
+                self.send_error(404)
+                return
+
+            body = path.read_bytes()
+            etag = f'"{hashlib.sha256(body).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    server = Server(("127.0.0.1", 0), Handler)
+    server.connections = 0
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_load_many(registry, base_dir, tmp_path):
+    from latticejson.cache import ConversionCache
+    from latticejson.io import load, load_many
+
+    url = f"http://127.0.0.1:{registry.server_port}"
+    names = ["fodo.lte", "fodo.madx", "fodo.json"] * 10
+    locations = [f"{url}/{name}" for name in names] + [base_dir / "fodo.lte"]
+    cache = ConversionCache(tmp_path)
+    results = load_many(locations, max_concurrency=4, cache=cache)
+    expected = {name: load(base_dir / name) for name in names}
+    assert [expected[name] for name in names] == results[:-1]
+    assert expected["fodo.lte"] == results[-1]
+    assert registry.connections <= 4  # connections are reused
+
+    with pytest.raises(Exception, match="404"):
+        load_many([f"{url}/missing.lte"], cache=cache)
+
+
+def test_aload_revalidates(registry, base_dir, tmp_path):
+    import asyncio
+
+    from latticejson.cache import ConversionCache
+    from latticejson.fetch import Session
+    from latticejson.io import aload, load
+
+    url = f"http://127.0.0.1:{registry.server_port}/fodo.lte"
+    with Session(cache=ConversionCache(tmp_path)) as session:
+        loop = asyncio.new_event_loop()
+        for _ in range(2):
+            latticejson = loop.run_until_complete(aload(url, session=session))
+            assert load(base_dir / "fodo.lte") == latticejson
+        loop.close()
+    assert dict(requests=2, revalidated=1) == session.stats
@@ -0,0 +1,59 @@
+import copy
+
+
+def test_lattice_hashes(fodo_json):
+    from latticejson.hashing import deduplicate, lattice_hash, lattice_hashes
+    from latticejson.utils import Repeat
+    from latticejson.validate import validate
+
+    latticejson = copy.deepcopy(fodo_json)
+    elements, lattices = latticejson["elements"], latticejson["lattices"]
+    elements["q1_copy"] = ["Quadrupole", {"k1": 1.2, "length": 0.2}]
+    elements["d1_int"] = ["Drift", {"length": 1}]
+    elements["d1_float"] = ["Drift", {"length": 1.0}]
+    lattices["cell_reversed"] = lattices["cell"][::-1]
+    lattices["cell_copy"] = ["q1_copy", *lattices["cell"][1:]]
+    lattices["arc"] = [Repeat(2, ["cell"])]
+    lattices["arc_expanded"] = ["cell", "cell"]
+
+    hashes = lattice_hashes(latticejson)
+    assert hashes is lattice_hashes(latticejson)
+    assert hashes is not lattice_hashes(latticejson, cache=False)
+    assert 64 == len(hashes["q1"])
+    assert hashes.equal("q1", "q1_copy")
+    assert hashes.equal("d1_int", "d1_float")
+    assert hashes.equal("cell", "cell_reversed")
+    assert hashes.equal("cell", "cell_copy")
+    assert not hashes.equal("arc", "arc_expanded")
+    assert not hashes.equal("q1", "q2")
+    assert lattice_hash(fodo_json) == lattice_hash(copy.deepcopy(fodo_json))
+    assert lattice_hash(latticejson) == hashes[latticejson["root"]]
+    assert {
+        "q1": ["q1_copy"],
+        "d1_int": ["d1_float"],
+        "cell": ["cell_reversed", "cell_copy"],
+    } == hashes.duplicates()
+
+    deduplicated = deduplicate(latticejson)
+    validate(deduplicated)
+    assert {"q1", "q2", "d1", "b1", "d1_int"} == set(deduplicated["elements"])
+    assert {"cell", "ring", "arc", "arc_expanded"} == set(deduplicated["lattices"])
+    assert lattice_hash(latticejson) == lattice_hash(deduplicated)
+
+
+def test_update_hashes(fodo_json):
+    from latticejson.hashing import LatticeHashes
+
+    latticejson = copy.deepcopy(fodo_json)
+    hashes = LatticeHashes(latticejson)
+    ring = hashes["ring"]
+    latticejson["elements"]["d1"][1]["length"] = 1
+    latticejson["lattices"]["arc"] = ["cell"]
+    assert ["d1", "cell", "ring", "arc"] == hashes.update(["d1", "q1", "arc"])
+    assert ring != hashes["ring"]
+    assert hashes.equal("arc", "cell") is False
+
+    latticejson["elements"]["d1"][1]["length"] = 0.55
+    del latticejson["lattices"]["arc"]
+    assert ["d1", "arc", "cell", "ring"] == hashes.update(["d1", "arc"])
+    assert ring == hashes["ring"]
@@ -0,0 +1,48 @@
+import pytest
+
+
+def test_elegant_includes(base_dir, tmp_path):
+    from latticejson.include import DeckParser
+    from latticejson.io import load
+
+    lines = (base_dir / "fodo.lte").read_text().splitlines(keepends=True)
+    (tmp_path / "optics").mkdir()
+    (tmp_path / "optics" / "variables.lte").write_text("".join(lines[6:9]))
+    (tmp_path / "optics" / "quadrupoles.lte").write_text("".join(lines[1:4]))
+    (tmp_path / "optics" / "all.lte").write_text(
+        "#include: variables.lte\n#include: quadrupoles.lte ! comment\n"
+    )
+    main = tmp_path / "main.lte"
+    main.write_text('#include: "optics/all.lte"\n' + "".join(lines[9:]))
+
+    expected = load(base_dir / "fodo.lte")
+    assert expected == load(main)
+
+    parser = DeckParser()
+    assert expected == parser.load(main, jobs=2)
+    assert dict(parsed=4, cached=0) == parser.stats
+    assert [tmp_path / "optics" / "all.lte"] == parser.graph[main]
+
+    quadrupoles = tmp_path / "optics" / "quadrupoles.lte"
+    quadrupoles.write_text(quadrupoles.read_text().replace("K1=1.2", "K1=1.3"))
+    assert 1.3 == parser.load(main)["elements"]["q1"][1]["k1"]
+    assert dict(parsed=1, cached=3) == parser.stats
+
+    (tmp_path / "optics" / "variables.lte").write_text("#include: all.lte\n")
+    with pytest.raises(ValueError, match="includes itself"):
+        parser.load(main)
+
+
+def test_madx_calls(base_dir, tmp_path):
+    from latticejson.io import load
+
+    (tmp_path / "strengths.madx").write_text("k1 = 1.2;\nk2 := -k1; ! comment\n")
+    main = tmp_path / "main.madx"
+    main.write_text(
+        'CALL, FILE="strengths.madx";\n'
+        "q1: quadrupole, l=0.2, k1=k1;\n"
+        "q2: quadrupole, l=0.4, k1=k2;\n"
+        "ring: line=(q1, q2);\n"
+    )
+    latticejson = load(main)
+    assert -1.2 == latticejson["elements"]["q2"][1]["k1"]
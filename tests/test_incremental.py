@@ -0,0 +1,78 @@
+import json
+
+from click.testing import CliRunner
+
+
+def test_incremental_parser(base_dir):
+    from latticejson.incremental import IncrementalParser
+    from latticejson.parse import parse_elegant, parse_madx
+
+    cases = (base_dir / "fodo.lte", parse_elegant), (base_dir / "fodo.madx", parse_madx)
+    for path, parse in cases:
+        parser = IncrementalParser(path.suffix[1:])
+        text = path.read_text()
+        assert parse(text) == parser.parse(text)
+        assert 0 == parser.stats["replayed"]
+        assert parse(text) == parser.parse(text)
+        assert 0 == parser.stats["parsed"] + parser.stats["transformed"]
+
+    lines = [
+        "% 1.2 sto k",
+        'Q1: KQUAD, L=0.2, K1="k"',
+        'Q2: KQUAD, L=0.4, K1="k -1 *"',
+        "D1: DRIFT, L=0.5",
+        "B1: CSBEND, L=1, ANGLE=0.1, E1=0.1, E2=0",
+        "CELL: LINE=(Q1, D1, B1, D1, Q2, -B1)",
+    ]
+    parser = IncrementalParser("lte")
+    parser.parse("\n".join(lines))
+
+    lines[3] = "D1: DRIFT, L=0.6  ! comment"
+    result = parser.parse("\n".join(lines))
+    assert dict(parsed=1, transformed=0, replayed=5) == parser.stats
+    assert parse_elegant("\n".join(lines)) == result
+
+    lines[0] = "% 1.3 sto k"
+    result = parser.parse("\n".join(lines))
+    assert dict(parsed=3, transformed=2, replayed=3) == parser.stats
+    assert parse_elegant("\n".join(lines)) == result
+    assert -1.3 == result["elements"]["q2"][1]["k1"]
+
+    lines[4] = (
+        "B1: CSBEND, L=1, ANGLE=0.1, E1=0.2, E2=0"  # the reversed bend changes too
+    )
+    result = parser.parse("\n".join(lines))
+    assert dict(parsed=2, transformed=1, replayed=4) == parser.stats
+    assert parse_elegant("\n".join(lines)) == result
+    assert 0.2 == result["elements"]["b1_reversed"][1]["e2"]
+
+
+def test_watch(base_dir, tmp_path, monkeypatch):
+    import latticejson.incremental
+    from latticejson.cli import cli
+
+    source = tmp_path / "fodo.lte"
+    source.write_text((base_dir / "fodo.lte").read_text())
+    output = tmp_path / "output" / "fodo.json"
+
+    def watch_files(paths, interval=0.1):
+        assert [source] == list(paths)
+        yield [source]
+        assert "q1" in json.loads(output.read_text())["elements"]
+        source.write_text(source.read_text().replace("Q1 :KQUAD", "Q3 :KQUAD"))
+        yield [source]
+        yield []
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(latticejson.incremental, "watch_files", watch_files)
+    args = ["convert", str(source), "--to", "json", "-o", str(output.parent)]
+    result = CliRunner().invoke(cli, [*args, "--watch"])
+    assert 0 == result.exit_code, result.output
+    assert 3 == len(result.output.splitlines())
+    assert "failed" in result.output.splitlines()[-1]  # q1 is undefined now
+    assert "q1" in json.loads(output.read_text())["elements"]
+
+    result = CliRunner().invoke(
+        cli, ["convert", str(source), "--to", "json", "--watch"]
+    )
+    assert 2 == result.exit_code
@@ -0,0 +1,60 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+
+def test_element_matrices():
+    from latticejson.optics import element_matrices
+    from latticejson.table import ElementGroup
+
+    drift = element_matrices(ElementGroup("Drift", ["d"], [{"length": 2}]))[0]
+    assert drift[0, 1] == drift[2, 3] == 2
+    assert np.trace(drift) == 6
+
+    quadrupole = ElementGroup("Quadrupole", ["q"], [{"length": 0.5, "k1": 4}])
+    matrix = element_matrices(quadrupole)[0]
+    assert matrix[0, 0] == pytest.approx(np.cos(1))
+    assert matrix[1, 0] == pytest.approx(-2 * np.sin(1))
+    assert matrix[2, 2] == pytest.approx(np.cosh(1))
+
+    radius, angle = 2, 0.3
+    dipole = ElementGroup("Dipole", ["b"], [{"length": radius * angle, "angle": angle}])
+    matrix = element_matrices(dipole)[0]
+    assert matrix[0, 1] == pytest.approx(radius * np.sin(angle))
+    assert matrix[0, 5] == pytest.approx(radius * (1 - np.cos(angle)))
+    assert matrix[4, 5] == pytest.approx(radius * (angle - np.sin(angle)))
+    assert matrix[2, 3] == pytest.approx(radius * angle)
+
+
+def test_transfer_matrices(fodo_json, base_dir):
+    import copy
+    from functools import reduce
+
+    from latticejson.io import load
+    from latticejson.optics import TransferMatrices, product, transfer_matrix
+
+    latticejson = copy.deepcopy(fodo_json)
+    matrices = TransferMatrices(latticejson)
+    ring, cell = matrices.matrix(), matrices.matrix("cell")
+    assert np.allclose(ring, np.linalg.matrix_power(cell, 8))
+    assert abs(np.trace(cell[:2, :2])) < 2 and abs(np.trace(cell[2:4, 2:4])) < 2
+    symplectic = np.kron(np.eye(3), [[0, 1], [-1, 0]]) * [1, 1, 1, 1, -1, -1]
+    assert np.allclose(ring.T @ symplectic @ ring, symplectic)
+
+    elements = [matrices.matrix(name) for name in latticejson["lattices"]["cell"]]
+    assert np.allclose(cell, reduce(lambda a, b: b @ a, elements))
+    assert np.allclose(product(elements[:5]), reduce(lambda a, b: b @ a, elements[:5]))
+
+    # the lte file uses repetitions and has slightly different dipole angles
+    assert np.allclose(ring, transfer_matrix(load(base_dir / "fodo.lte")), atol=1e-4)
+
+    n_cached = len(matrices.cache)
+    latticejson["elements"]["q1"][1]["k1"] = 1.3
+    assert ["q1", "cell", "ring"] == matrices.update(["q1", "q2"])
+    assert len(matrices.cache) == n_cached + 3
+    assert np.allclose(matrices.matrix(), transfer_matrix(latticejson))
+
+    latticejson["elements"]["q1"][1]["k1"] = 1.2
+    assert ["q1", "cell", "ring"] == matrices.update(["q1"])
+    assert len(matrices.cache) == n_cached + 3
+    assert np.allclose(matrices.matrix(), ring)
@@ -77,3 +77,42 @@ def test_madx_parser():
     # print(tree.pretty())
     # pprint(madx_dict)
     # pprint(latticejson)
+
+
+def test_lazy_parser(tmp_path, monkeypatch):
+    from latticejson import parse
+
+    monkeypatch.setattr(parse, "CACHE_DIR", tmp_path)
+    parser = parse.LazyParser("elegant.lark", start="start_rpn")
+    assert parser._parser is None
+    assert "add" == parser.parse("1 2 +").data
+    assert 1 == len(list((tmp_path / "grammars").glob("elegant-*.pickle")))
+
+    warm_parser = parse.LazyParser("elegant.lark", start="start_rpn")
+    assert warm_parser.parse("1 2 +") == parser.parse("1 2 +")
+
+
+def test_inline_transformation():
+    from latticejson.parse import parse_elegant, parse_madx
+
+    for path in "fodo.lte", "scratch.lte", "nested_reversed_lattice.lte":
+        string = (data_path / path).read_text()
+        assert parse_elegant(string, build_tree=True) == parse_elegant(string)
+
+    string = (data_path / "fodo.madx").read_text()
+    first = parse_madx(string)
+    assert parse_madx(string, build_tree=True) == first == parse_madx(string)
+    assert first["variables"] is not parse_madx(string)["variables"]
+
+
+def test_reversed_arrangement():
+    from latticejson.parse import parse_elegant
+    from latticejson.utils import iter_children
+
+    string = (
+        "a: DRIFT, L=1\nb: DRIFT, L=2\nc: DRIFT, L=3\n"
+        "l1: LINE=(-(a, 2*(b, c)))\nl2: LINE=(-(a, (b, c)))\n"
+    )
+    lattices = parse_elegant(string)["lattices"]
+    assert ["b", "c", "b", "c", "a"] == list(iter_children(lattices["l1"]))
+    assert ["b", "c", "a"] == list(iter_children(lattices["l2"]))
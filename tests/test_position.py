@@ -0,0 +1,29 @@
+import pytest
+
+
+def test_position_index(fodo_json):
+    from latticejson.position import PositionIndex
+
+    index = PositionIndex(fodo_json)
+    assert len(index) == 72
+    assert index.length == pytest.approx(48.0)
+    assert index.element_at(0.1) == (0, "q1")
+    assert index.element_at(0.2) == (1, "d1")
+    assert index.element_at(index.length) == (71, "q1")
+    assert index.elements_between(0.1, 1.0) == [(0, "q1"), (1, "d1"), (2, "b1")]
+    assert index.starts("q2")[:2] == pytest.approx([2.8, 8.8])
+    assert index.lattice_length("cell") == pytest.approx(6.0)
+    assert index.lattice_length("b1") == 1.5
+    with pytest.raises(IndexError):
+        index.element_at(-1)
+
+
+def test_lattice_lengths():
+    from latticejson.position import lattice_lengths
+
+    latticejson = {
+        "root": "ring",
+        "elements": {"d": ["Drift", {"length": 0.5}], "m": ["Drift", {}]},
+        "lattices": {"cell": ["d", "m", "d"], "ring": ["cell"] * 1000},
+    }
+    assert lattice_lengths(latticejson) == {"ring": 1000, "cell": 1, "d": 0.5, "m": 0}
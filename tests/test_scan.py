@@ -0,0 +1,61 @@
+import copy
+import io
+
+from click.testing import CliRunner
+
+
+def test_write_variants(fodo_json, tmp_path):
+    from latticejson.convert import to_elegant, to_madx
+    from latticejson.scan import read_csv, write_variants
+
+    latticejson = fodo_json
+    table = (
+        "q2.k1,name,q1.k1,q1.length\n-1.1,a,1.1,0.2\n-1.3,b,1.3,0.25\n\n-1.5,c,1.5,1\n"
+    )
+    columns, rows, names = read_csv(io.StringIO(table))
+    assert ["q2.k1", "q1.k1", "q1.length"] == columns
+    assert ["a", "b", "c"] == names
+    assert [-1.5, 1.5, 1] == rows[2]
+
+    for output_format, to_string in ("lte", to_elegant), ("madx", to_madx):
+        for jobs in 1, 2:
+            output = tmp_path / f"{output_format}_{jobs}"
+            paths = write_variants(
+                latticejson, columns, rows, output, output_format, names, jobs
+            )
+            assert [f"{x}.{output_format}" for x in names] == [p.name for p in paths]
+            for path, (q2_k1, q1_k1, q1_length) in zip(paths, rows):
+                variant = copy.deepcopy(latticejson)
+                variant["elements"]["q2"][1]["k1"] = q2_k1
+                variant["elements"]["q1"][1].update(k1=q1_k1, length=q1_length)
+                assert to_string(variant) == path.read_text()
+
+    paths = write_variants(latticejson, ["q1.k1"], [[1]] * 11, tmp_path / "default")
+    assert "variant_00.lte" == paths[0].name
+    assert "variant_10.lte" == paths[-1].name
+
+
+def test_scan_cli(base_dir, tmp_path):
+    from latticejson.cli import cli
+
+    overrides = tmp_path / "overrides.csv"
+    overrides.write_text("b1.angle,d1.length\n0.4,0.5\n0.3,0.6\n")
+    args = ["scan", str(base_dir / "fodo.json"), str(overrides), "-o", str(tmp_path)]
+    result = CliRunner().invoke(cli, [*args, "--to", "madx"])
+    assert 0 == result.exit_code, result.output
+    assert "b1: sbend, l=1.5, angle=0.3" in (tmp_path / "variant_1.madx").read_text()
+
+    overrides.write_text("x1.length\n1\n")
+    result = CliRunner().invoke(cli, args)
+    assert 1 == result.exit_code
+    assert "Unknown element 'x1'" in result.output
+
+    overrides.write_text("q1.K1\n1\n")
+    result = CliRunner().invoke(cli, args)
+    assert 1 == result.exit_code
+    assert "Unknown attribute 'K1'" in result.output
+
+    overrides.write_text("q1.k1,d1.length\n1,0.5\n1.2,x\n")
+    result = CliRunner().invoke(cli, args)
+    assert 1 == result.exit_code
+    assert "Line 3, column 'd1.length': 'x' is not a number." in result.output
@@ -0,0 +1,96 @@
+import json
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    from latticejson.server import Server
+
+    monkeypatch.setenv("LATTICEJSON_SOCKET", str(tmp_path / "server.sock"))
+    server = Server(workers=2)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+
+
+def test_server(server, base_dir, tmp_path):
+    from latticejson.server import Client, connect
+
+    assert ["server.sock"] == [path.name for path in tmp_path.iterdir()]
+    assert 0o600 == server.path.stat().st_mode & 0o777
+
+    with Client() as client:
+        assert client.request({"action": "ping"})["ok"]
+        response = client.request(
+            {"action": "load", "input": str(base_dir / "fodo.lte")}
+        )
+        assert "ring" == response["result"]["root"]
+
+        jobs = [
+            {
+                "input": str(base_dir / "fodo.lte"),
+                "output": str(tmp_path / "fodo.json"),
+            },
+            {"input": str(base_dir / "fodo.json"), "action": "validate"},
+            {"input": str(tmp_path / "missing.lte")},
+            {"input": str(base_dir / "fodo.json"), "action": "unknown"},
+        ]
+        pairs = sorted(client.map(jobs), key=lambda pair: jobs.index(pair[0]))
+    assert [True, True, False, False] == [response["ok"] for _, response in pairs]
+    assert "ring" == json.loads((tmp_path / "fodo.json").read_text())["root"]
+    assert 1 == server.cache.stats()["hits"]  # fodo.lte was loaded twice
+
+    with connect() as client:
+        assert "stopping server" == client.request({"action": "stop"})["message"]
+
+
+def test_cli_forwards_to_server(server, base_dir, tmp_path):
+    from click.testing import CliRunner
+
+    from latticejson.cli import cli
+
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        ["convert", str(base_dir / "fodo.lte"), "--to", "json", "-o", str(tmp_path)],
+    )
+    assert 0 == result.exit_code, result.output
+    assert "ring" == json.loads((tmp_path / "fodo.json").read_text())["root"]
+
+    manifest = json.dumps({"input": str(tmp_path / "fodo.json"), "action": "format"})
+    result = runner.invoke(cli, ["batch"], input=manifest)
+    assert 0 == result.exit_code, result.output
+    result = runner.invoke(cli, ["validate", str(tmp_path / "fodo.json")])
+    assert 0 == result.exit_code, result.output
+    assert 2 == server.cache.stats()["misses"]  # the jobs ran on the server
+
+    result = runner.invoke(cli, ["validate", str(base_dir / "fodo.lte")])
+    assert 1 == result.exit_code
+
+
+def test_cli_runs_locally(server, base_dir, tmp_path, monkeypatch):
+    from click.testing import CliRunner
+
+    from latticejson.cli import cli
+
+    runner = CliRunner()
+    path = str(base_dir / "fodo.json")
+    result = runner.invoke(cli, ["--no-server", "validate", path])
+    assert 0 == result.exit_code, result.output
+    result = runner.invoke(cli, ["validate", path], env={"LATTICEJSON_NO_SERVER": "1"})
+    assert 0 == result.exit_code, result.output
+    args = ["convert", path, "--to", "lte", "-o", str(tmp_path), "--jobs", "2"]
+    result = runner.invoke(cli, args)
+    assert 0 == result.exit_code, result.output
+    assert (tmp_path / "fodo.lte").exists()
+    assert 0 == server.cache.stats()["misses"]  # no job ran on the server
+
+    monkeypatch.setattr("latticejson.server.__version__", "0.0.0")
+    result = runner.invoke(cli, ["validate", path])
+    assert 0 == result.exit_code, result.output
+    assert "it runs latticejson 0.0.0" in result.output
+    assert 0 == server.cache.stats()["misses"]
@@ -0,0 +1,37 @@
+import io
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "file_name", ["fodo.lte", "scratch.lte", "nested_reversed_lattice.lte", "fodo.madx"]
+)
+def test_iter_events(base_dir, file_name):
+    from latticejson.parse import parse_elegant, parse_madx
+    from latticejson.stream import fold, iter_events
+
+    string = (base_dir / file_name).read_text()
+    input_format = file_name.split(".")[1]
+    expected = (parse_elegant if input_format == "lte" else parse_madx)(string)
+    for chunk_size in 1, 2, 7, 2**16:
+        events = iter_events(io.StringIO(string), input_format, chunk_size)
+        assert expected == fold(events)
+
+
+def test_madx_statements():
+    from latticejson.stream import iter_madx_statements
+
+    string = 'a = 1; /* ; */ s: SEQUENCE; q, at=1; ENDSEQUENCE; // ;\nTITLE, ";";'
+    assert [
+        "a = 1;",
+        " /* ; */ s: SEQUENCE; q, at=1; ENDSEQUENCE;",
+        ' // ;\nTITLE, ";";',
+    ] == list(iter_madx_statements(string))
+
+
+def test_load(base_dir, fodo_lte):
+    from latticejson.convert import from_elegant
+    from latticejson.stream import load
+
+    with (base_dir / "fodo.lte").open() as file:
+        assert from_elegant(fodo_lte) == load(file, "lte")
@@ -0,0 +1,46 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+
+def test_survey(fodo_json, base_dir):
+    import math
+
+    from latticejson.io import load
+    from latticejson.survey import survey
+    from latticejson.utils import flattened_element_sequence
+
+    latticejson = load(base_dir / "fodo.lte")
+    result = survey(latticejson)
+    assert len(result) == 72
+    assert result.s[-1] == pytest.approx(8 * 6)
+    assert result.theta[-1] == pytest.approx(-2 * math.pi)
+    assert np.allclose(result.closure, 0)
+    assert result.x.max() == pytest.approx(0, abs=1e-12)  # bends to the right
+    assert result.x.min() < -10
+
+    # compare with a walk over the elements
+    x, z, theta = 0.0, 0.0, 0.0
+    for name in flattened_element_sequence(latticejson):
+        type_, attributes = latticejson["elements"][name]
+        length, angle = attributes["length"], attributes.get("angle", 0)
+        if type_ == "Dipole":
+            radius = length / angle
+            x += radius * (math.cos(theta - angle) - math.cos(theta))
+            z += radius * (math.sin(theta) - math.sin(theta - angle))
+            theta -= angle
+        else:
+            x += length * math.sin(theta)
+            z += length * math.cos(theta)
+    assert [x, z, theta] == pytest.approx(
+        [result.x[-1], result.z[-1], result.theta[-1]], abs=1e-12
+    )
+
+    shifted = survey(fodo_json, "cell", x0=1, z0=2, theta0=0.5)
+    assert [shifted.x[0], shifted.z[0], shifted.theta[0]] == [1, 2, 0.5]
+    assert shifted.theta[-1] == pytest.approx(0.5 - 2 * 0.392701)
+
+    # in-place modifications are only seen without the cache
+    latticejson["elements"]["d1"][1]["length"] += 1
+    assert survey(latticejson).s[-1] == pytest.approx(8 * 6)
+    assert survey(latticejson, cache=False).s[-1] == pytest.approx(8 * 6 + 4 * 8)
@@ -0,0 +1,28 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+
+def test_element_table(fodo_json):
+    import copy
+
+    from latticejson.table import ElementTable
+
+    latticejson = copy.deepcopy(fodo_json)
+    latticejson["elements"]["d2"] = ["Drift", {"length": 1}]
+    table = ElementTable(latticejson)
+    assert set(table) == {"Drift", "Quadrupole", "Dipole"}
+    assert table.write_back() == 0
+    assert latticejson == {**fodo_json, "elements": latticejson["elements"]}
+    assert type(latticejson["elements"]["d2"][1]["length"]) is int
+
+    quadrupoles = table["Quadrupole"]
+    quadrupoles.scale("k1", 2, where=quadrupoles["k1"] > 0)
+    quadrupoles.update("k2", 0.5, where=quadrupoles["k1"] < 0)
+    assert table.write_back() == 2
+    assert latticejson["elements"]["q1"][1] == {"length": 0.2, "k1": 2.4}
+    assert latticejson["elements"]["q2"][1] == {"length": 0.4, "k1": -1.2, "k2": 0.5}
+
+    dipoles = table["Dipole"]
+    assert dipoles.select(dipoles["angle"] > 0.3) == ["b1"]
+    assert table["Drift"].aggregate("length") == pytest.approx(1.55)
@@ -3,3 +3,74 @@ def test_flattened_element_sequence(fodo_json):
 
     sequence = list(flattened_element_sequence(fodo_json, start_lattice="cell"))
     assert ["q1", "d1", "b1", "d1", "q2", "d1", "b1", "d1", "q1"] == sequence
+
+
+def test_repetitions():
+    from latticejson.convert import from_elegant, to_elegant
+    from latticejson.format import format_json
+    from latticejson.utils import (
+        Repeat,
+        expand_repetitions,
+        flattened_element_sequence,
+    )
+
+    string = (
+        "d: drift, l=1\nq: quad, l=1\nc: line=(d, q)\nr: line=(500*(c), -2*(d, q))\n"
+    )
+    latticejson = from_elegant(string, compact=True)
+    assert latticejson["lattices"]["r"] == [Repeat(500, ["c"]), Repeat(2, ["q", "d"])]
+    assert from_elegant(string) == expand_repetitions(latticejson)
+    sequence = list(flattened_element_sequence(latticejson))
+    assert len(sequence) == 1004
+    assert sequence[-4:] == ["q", "d", "q", "d"]
+    assert latticejson["lattices"] == (
+        from_elegant(to_elegant(latticejson), compact=True)["lattices"]
+    )
+    assert '"r": ["c", "c"' in format_json(latticejson)
+
+    lattices = expand_repetitions(latticejson, sublattices=True)["lattices"]
+    assert lattices["r"][-2:] == ["r_0", "r_0"]
+    assert lattices["r_0"] == ["q", "d"]
+
+
+def test_deep_hierarchy():
+    from latticejson.utils import (
+        flattened_element_sequence,
+        remove_unused,
+        sort_lattices,
+        topological_order,
+        tree,
+    )
+
+    depth = 5000  # deeper than the recursion limit
+    lattices = {"l0": ["d", "d"]}
+    lattices.update({f"l{i}": [f"l{i - 1}", "d"] for i in range(1, depth)})
+    latticejson = {
+        "root": f"l{depth - 1}",
+        "elements": {"d": ["Drift", {"length": 1}], "unused": ["Drift", {}]},
+        "lattices": lattices,
+    }
+    assert len(list(flattened_element_sequence(latticejson))) == depth + 1
+    assert topological_order(latticejson)[:2] == ["l0", "l1"]
+    assert list(sort_lattices(latticejson)) == list(lattices)
+    assert list(remove_unused(latticejson)["elements"]) == ["d"]
+    assert (
+        tree(latticejson, "l2")
+        == "l2\n├─── l1\n│   ├─── l0\n│   │   ├─── d\n│   │   └─── d\n│   └─── d\n└─── d\n"
+    )
+
+
+def test_cyclic_lattices():
+    import pytest
+
+    from latticejson.utils import flattened_element_sequence, sort_lattices
+
+    latticejson = {
+        "root": "a",
+        "elements": {"d": ["Drift", {}]},
+        "lattices": {"a": ["d", "b"], "b": ["a"]},
+    }
+    with pytest.raises(ValueError):
+        sort_lattices(latticejson)
+    with pytest.raises(ValueError):
+        list(flattened_element_sequence(latticejson))